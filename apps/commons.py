@@ -6,11 +6,180 @@
 # from rest_framework.generics import CreateAPIView, UpdateAPIView, RetrieveAPIView
 # from rest_framework.permissions import IsAdminUser
 # from rest_framework import status, viewsets
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import (
+    LimitOffsetPagination, PageNumberPagination)
 
+# Apps
+from apps.monitoring.timing import get_timing
+from core.renderers import FastJSONRenderer
 
-class ListModelMixin:
+# placeholder of the rows in the rendered envelope of a streamed page
+ROWS_MARKER = '\x00rows\x00'
+
+
+def json_response(data, status=200):
+    """
+    JSON response of the views that do not go through DRF (the async views).
+    """
+    return HttpResponse(FastJSONRenderer().render(data), status=status,
+                        content_type='application/json')
+
+
+async def aiterate(iterator):
+    """
+    Async iterator over the items of the sync ``iterator``, each one read in
+    the thread of the sync code of the request (the database connection of
+    a chunked queryset iterator stays the same).
+    """
+    iterator = iter(iterator)
+    end = object()
+    next_item = sync_to_async(next, thread_sensitive=True)
+    while True:
+        item = await next_item(iterator, end)
+        if item is end:
+            return
+        yield item
+
+
+def streaming_content(request, iterator):
+    """
+    Content of a StreamingHttpResponse of ``request`` (an HttpRequest or a
+    DRF Request) from the sync ``iterator``.
+
+    Under ASGI, Django consumes a sync streaming content with
+    ``sync_to_async(list)``: the whole body is built in memory before the
+    first byte is sent. The iterator is then wrapped in an async one that
+    reads a chunk at a time.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return aiterate(iterator)
+    return iterator
+
+
+class StreamingListMixin:
+    """
+    Mixin that streams the JSON of big list responses instead of building
+    ``serializer.data`` and the whole body in memory.
+
+    Lists of ``stream_threshold`` rows or more (the page size asked with
+    ``?limit=``, or the whole queryset when it is not paginated) are read
+    from the database with a chunked iterator and each chunk is serialized
+    and sent before the next one is read, so the memory used does not grow
+    with the size of the list. The body is the same JSON as the one of the
+    normal response. Views enable it setting ``stream_threshold``.
+    """
+
+    stream_threshold = None
+    stream_chunk_size = 500
+
+    def should_stream(self, request):
+        """
+        Returns if the list must be streamed.
+        """
+        if self.stream_threshold is None:
+            return False
+
+        # only the JSON renderer without options (indent...)
+        renderer = getattr(request, 'accepted_renderer', None)
+        if not isinstance(renderer, JSONRenderer) or (
+                request.accepted_media_type != renderer.media_type):
+            return False
+
+        paginator = self.paginator
+        if paginator is None:
+            return True
+        if isinstance(paginator, LimitOffsetPagination):
+            page_size = paginator.get_limit(request)
+        elif isinstance(paginator, PageNumberPagination):
+            page_size = paginator.get_page_size(request)
+        else:
+            return False
+        return page_size is None or page_size >= self.stream_threshold
+
+    def paginate_queryset_lazily(self, queryset, request):
+        """
+        Same as ``paginate_queryset`` but the page is returned as a queryset
+        slice, it is not evaluated.
+        """
+        paginator = self.paginator
+        if paginator is None:
+            return None
+
+        if isinstance(paginator, LimitOffsetPagination):
+            paginator.request = request
+            paginator.limit = paginator.get_limit(request)
+            if paginator.limit is None:
+                return None
+            paginator.count = paginator.get_count(queryset)
+            paginator.offset = paginator.get_offset(request)
+            if paginator.count == 0 or paginator.offset > paginator.count:
+                return queryset.none()
+            return queryset[paginator.offset:paginator.offset + paginator.limit]
+
+        page_size = paginator.get_page_size(request)
+        if not page_size:
+            return None
+        django_paginator = paginator.django_paginator_class(
+            queryset, page_size)
+        page_number = paginator.get_page_number(request, django_paginator)
+        try:
+            paginator.page = django_paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(paginator.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        paginator.request = request
+        return paginator.page.object_list
+
+    def get_streaming_response(self, queryset, serializer, request):
+        """
+        Returns a StreamingHttpResponse with the (paginated) list of the
+        queryset serialized by the list ``serializer``.
+        """
+        renderer = request.accepted_renderer
+        rows = self.paginate_queryset_lazily(queryset, request)
+        if rows is None:
+            rows = queryset
+            prefix, suffix = b'', b''
+        else:
+            envelope = renderer.render(
+                self.get_paginated_response(ROWS_MARKER).data)
+            prefix, suffix = envelope.split(renderer.render(ROWS_MARKER))
+
+        return StreamingHttpResponse(
+            streaming_content(request, self.stream_rows(
+                rows, serializer.child, renderer, prefix, suffix)),
+            content_type=renderer.media_type)
+
+    def stream_rows(self, rows, serializer, renderer, prefix=b'', suffix=b''):
+        """
+        Yields the JSON array of the rows, a chunk of rows each time.
+        """
+        if hasattr(rows, 'iterator'):
+            rows = rows.iterator(chunk_size=self.stream_chunk_size)
+
+        yield prefix + b'['
+        separator = b''
+        chunk = []
+        for instance in rows:
+            chunk.append(serializer.to_representation(instance))
+            if len(chunk) == self.stream_chunk_size:
+                # the rendered chunk without its brackets
+                yield separator + renderer.render(chunk)[1:-1]
+                separator = b','
+                chunk = []
+        if chunk:
+            yield separator + renderer.render(chunk)[1:-1]
+        yield b']' + suffix
+
+
+class ListModelMixin(StreamingListMixin):
     """
     Mixin for listing a queryset with pagination for GenericViewSet.
     """
@@ -23,17 +192,26 @@ class ListModelMixin:
         # Get the queryset based on the view's defined get_queryset method
         queryset = self.get_queryset()
 
+        # Big lists are streamed
+        if self.should_stream(request):
+            return self.get_streaming_response(
+                queryset, self.get_serializer(many=True), request)
+
         # Attempt to paginate the queryset
         page = self.paginate_queryset(queryset)
 
         # If pagination is applied, serialize and return paginated data
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            with get_timing(request).measure('serialize'):
+                data = serializer.data
+            return self.get_paginated_response(data)
 
         # If no pagination is applied, serialize and return the entire queryset
         serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        with get_timing(request).measure('serialize'):
+            data = serializer.data
+        return Response(data)
 
 class BasicPagination(PageNumberPagination):
     """
@@ -43,7 +221,7 @@ class BasicPagination(PageNumberPagination):
     page_size_query_param = 'limit'
 
 
-class PaginationHandlerMixin(object):
+class PaginationHandlerMixin(StreamingListMixin):
     """
     Mixin to handle pagination of queryset results.
     """
@@ -89,12 +267,21 @@ class PaginationHandlerMixin(object):
         if request is None:
             request = self.request
 
+        if self.should_stream(request):
+            serializer = serializer_class(
+                many=True, context={'request': request})
+            return self.get_streaming_response(queryset, serializer, request)
+
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = serializer_class(
                 page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
+            with get_timing(request).measure('serialize'):
+                data = serializer.data
+            return self.get_paginated_response(data)
 
         serializer = serializer_class(
             queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        with get_timing(request).measure('serialize'):
+            data = serializer.data
+        return Response(data)
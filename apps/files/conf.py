@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+from django.conf import settings
+
+# Default values for every configuration group of the files app. Each group
+# can be partially overridden from the project settings with a dict of the
+# same name, e.g. ``MEDIA_SERVING = {'BACKEND': 'x-accel-redirect'}``.
+DEFAULTS = {
+    'RESUMABLE_UPLOADS': {
+        # the chunks are appended to a file of this directory, it must be
+        # shared by the web and the worker processes
+        'DIRECTORY': os.path.join(tempfile.gettempdir(), 'resumable-uploads'),
+        # bytes, the Upload-Length of bigger uploads is refused
+        'MAX_SIZE': 1024 ** 3,
+        # seconds without chunks after which an upload is dropped
+        'EXPIRATION': 24 * 60 * 60,
+        # bytes read from the request at a time
+        'CHUNK_SIZE': 64 * 1024,
+    },
+    'MEDIA_SERVING': {
+        # who sends the files of MEDIA_ROOT once the view allowed them:
+        # 'django' (the view itself), 'x-accel-redirect' (nginx) or
+        # 'x-sendfile' (apache mod_xsendfile, lighttpd)
+        'BACKEND': 'django',
+        # internal location of nginx that maps to MEDIA_ROOT
+        'INTERNAL_URL': '/protected-media/',
+        # bytes read at a time by the 'django' backend
+        'CHUNK_SIZE': 64 * 1024,
+    },
+}
+
+
+def get_config(name):
+    """
+    Return the configuration group ``name`` merged over its defaults.
+    """
+    return {**DEFAULTS[name], **getattr(settings, name, {})}
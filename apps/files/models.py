@@ -0,0 +1,64 @@
+import datetime
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from apps.files.conf import get_config
+
+
+class Upload(models.Model):
+    """
+    Resumable upload (apps.files.views): the chunks are appended to a file
+    of ``RESUMABLE_UPLOADS['DIRECTORY']`` until ``offset`` reaches
+    ``length``, then finalize_upload stores it in the media storage.
+    """
+
+    class Status(models.TextChoices):
+        UPLOADING = 'uploading', _('Uploading')
+        PROCESSING = 'processing', _('Processing')
+        DONE = 'done', _('Done')
+        FAILED = 'failed', _('Failed')
+
+    class Purpose(models.TextChoices):
+        FILE = 'file', _('File')
+        # the photo of the user, processed by process_user_photo
+        USER_PHOTO = 'user_photo', _('User photo')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, models.CASCADE,
+                             related_name='uploads')
+    filename = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    purpose = models.CharField(max_length=20, choices=Purpose.choices,
+                               default=Purpose.FILE)
+    # bytes, announced by the client (Upload-Length)
+    length = models.PositiveBigIntegerField()
+    # bytes received
+    offset = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=Status.choices,
+                              default=Status.UPLOADING)
+    file = models.FileField(upload_to='uploads/', max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        db_table = 'uploads'
+
+    def __str__(self):
+        return f'{self.filename or self.pk} ({self.offset}/{self.length})'
+
+    @property
+    def path(self):
+        """
+        Temporary file with the chunks received.
+        """
+        directory = get_config('RESUMABLE_UPLOADS')['DIRECTORY']
+        return os.path.join(directory, str(self.pk))
+
+    @property
+    def expires_at(self):
+        return self.updated_at + datetime.timedelta(
+            seconds=get_config('RESUMABLE_UPLOADS')['EXPIRATION'])
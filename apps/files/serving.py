@@ -0,0 +1,128 @@
+"""
+Delivery of the media files allowed by MediaView.
+
+With ``MEDIA_SERVING['BACKEND']`` 'x-accel-redirect' or 'x-sendfile' the
+response has no body, only a header that tells the front proxy which file
+to send: the proxy does the copy (and the Range requests), the worker is
+free as soon as the permission is checked. nginx needs an internal
+location for ``MEDIA_SERVING['INTERNAL_URL']``::
+
+    location /protected-media/ {
+        internal;
+        alias /app/core/media/;
+    }
+
+The 'django' backend streams the file from the view, with Range support,
+for the development server and proxies without internal redirects (under
+ASGI with an async iterator, the file is not read whole in memory).
+"""
+
+import mimetypes
+import os
+import re
+from stat import S_ISREG
+from urllib.parse import quote
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from apps.commons import streaming_content
+from apps.files.conf import get_config
+from core.storage_backends import is_content_addressed
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Return the ``(start, end)`` (inclusive) of the single byte range of the
+    Range ``header``, None to send the whole file (no header, several
+    ranges or a syntax error) or raise ValueError when it is not
+    satisfiable.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # the last ``end`` bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end or size - 1), size - 1)
+    if start > end or start >= size:
+        raise ValueError
+    return start, end
+
+
+def read_file(path, start, length, chunk_size):
+    with open(path, 'rb') as media_file:
+        media_file.seek(start)
+        while length > 0:
+            chunk = media_file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def stream_file(request, path, size, config):
+    try:
+        byte_range = parse_range(request.headers.get('Range', ''), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+    # a chunk at a time under ASGI too
+    response = StreamingHttpResponse(streaming_content(request, read_file(
+        path, start, end - start + 1, config['CHUNK_SIZE'])), status=status)
+    response['Content-Length'] = str(end - start + 1)
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def serve_file(request, storage, name):
+    """
+    Response that sends the file ``name`` of the local ``storage`` with the
+    configured backend.
+    """
+    config = get_config('MEDIA_SERVING')
+    path = storage.path(name)
+    stat = os.stat(path)
+    if not S_ISREG(stat.st_mode):
+        raise FileNotFoundError(path)
+    if not was_modified_since(request.headers.get('If-Modified-Since'),
+                              stat.st_mtime):
+        return HttpResponse(status=304)
+
+    backend = config['BACKEND']
+    if backend == 'x-accel-redirect':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = (
+            config['INTERNAL_URL'] + quote(name.replace(os.sep, '/')))
+    elif backend == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+    else:
+        response = stream_file(request, path, stat.st_size, config)
+
+    content_type, encoding = mimetypes.guess_type(name)
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    # only for the user who asked, the content of a blob never changes
+    if is_content_addressed(name):
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,183 @@
+"""
+Work of the resumable uploads done by the worker: the finished uploads
+are stored in the media storage, the abandoned ones are dropped. And the
+purge of the blobs of the media storage no row uses anymore.
+"""
+
+import datetime
+import logging
+import os
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from apps.files.conf import get_config
+from apps.files.models import Upload
+from apps.user.models import ArchivedUser, User
+from apps.user.signals import user_updated
+from apps.user.tasks import process_user_photo
+from core.maintenance import maintenance_task
+from core.storage_backends import BLOB_DIRECTORY, get_blob_digest
+from core.taskapp import app
+
+logger = logging.getLogger(__name__)
+
+
+class UploadedFile(File):
+    """
+    Temporary file of an upload: FileSystemStorage moves it (a rename on
+    the same filesystem) instead of copying it.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        # moved by the storage
+        pass
+
+
+@app.task
+def finalize_upload(upload_id):
+    """
+    Store the finished upload in the media storage and send it down its
+    pipeline: a user photo becomes the photo of the user and is processed
+    by process_user_photo.
+    """
+    upload = Upload.objects.filter(
+        pk=upload_id, status=Upload.Status.PROCESSING).first()
+    if upload is None:
+        return
+    try:
+        with open(upload.path, 'rb') as upload_file:
+            upload.file.save(
+                upload.filename or str(upload.pk),
+                UploadedFile(upload_file, upload.filename), save=False)
+    except OSError:
+        logger.exception('The upload %s could not be stored.', upload_id)
+        upload.status = Upload.Status.FAILED
+        upload.save(update_fields=['status', 'updated_at'])
+        return
+    remove_file(upload.path)
+    upload.status = Upload.Status.DONE
+    upload.save(update_fields=['file', 'status', 'updated_at'])
+
+    if upload.purpose == Upload.Purpose.USER_PHOTO:
+        User.objects.filter(pk=upload.user_id).update(
+            photo=upload.file.name, has_photo_thumbnails=False)
+        user_updated(upload.user_id)
+        process_user_photo.delay(upload.user_id)
+
+
+def remove_files(pks):
+    for upload in Upload.objects.filter(pk__in=pks).only('pk'):
+        remove_file(upload.path)
+
+
+@maintenance_task
+def purge_expired_uploads(run):
+    """
+    Delete the uploads that did not receive chunks for
+    ``RESUMABLE_UPLOADS['EXPIRATION']`` seconds and the failed ones, with
+    their temporary files.
+    """
+    since = timezone.now() - datetime.timedelta(
+        seconds=get_config('RESUMABLE_UPLOADS')['EXPIRATION'])
+    return run.delete(
+        Upload.objects.filter(
+            status__in=[Upload.Status.UPLOADING, Upload.Status.FAILED],
+            updated_at__lt=since),
+        remove_files)
+
+
+
+def list_blob_directories(storage):
+    """
+    Yield the blob directories of ``storage`` (``blobs/ab/cd``) with the
+    names of their files, the blobs and the names derived from them.
+    """
+    try:
+        directories, _ = storage.listdir(BLOB_DIRECTORY)
+    except FileNotFoundError:
+        return
+    for first in sorted(directories):
+        for second in sorted(storage.listdir(f'{BLOB_DIRECTORY}/{first}')[0]):
+            directory = f'{BLOB_DIRECTORY}/{first}/{second}'
+            files = storage.listdir(directory)[1]
+            yield directory, [f'{directory}/{name}' for name in sorted(files)]
+
+
+def get_used_names(names):
+    """
+    The ``names`` of blobs used by a row: the photo of a user (deleted or
+    archived too) or the file of an upload.
+    """
+    used = set()
+    for queryset, field in ((User.all_objects, 'photo'),
+                            (ArchivedUser.objects, 'photo'),
+                            (Upload.objects, 'file')):
+        used.update(queryset.filter(**{f'{field}__in': names})
+                    .values_list(field, flat=True))
+    return used
+
+
+def delete_unused_blobs(storage, names, since):
+    """
+    Delete the files of ``names`` whose blob no row uses and that were not
+    modified since ``since``, return how many were deleted.
+    """
+    # the rows name the blobs, the derived names follow their blob
+    blobs = [name for name in names
+             if not os.path.basename(name)[64:].startswith('_')]
+    used = {get_blob_digest(name) for name in get_used_names(blobs)}
+    deleted = 0
+    for name in names:
+        if get_blob_digest(name) in used:
+            continue
+        # stored by a task or a request that has not saved its row yet
+        if storage.get_modified_time(name) >= since:
+            continue
+        storage.delete_blob(name)
+        deleted += 1
+    return deleted
+
+
+@maintenance_task
+def purge_unused_blobs(run):
+    """
+    Delete the blobs of the media storage (core.storage_backends) that no
+    row uses anymore, with the names derived from them (the thumbnails).
+    A blob may be shared, ``storage.delete`` keeps it: the photos replaced
+    or of the purged accounts, and the files of the deleted uploads, are
+    removed here. The files modified in the last
+    ``MAINTENANCE['UNUSED_BLOB_RETENTION_HOURS']`` are kept, their row may
+    not be saved yet.
+    """
+    storage = default_storage
+    # the other storages delete the files with their row
+    if not hasattr(storage, 'delete_blob'):
+        return 0
+    since = timezone.now() - datetime.timedelta(
+        hours=run.config['UNUSED_BLOB_RETENTION_HOURS'])
+    batch_size = run.config['BATCH_SIZE']
+
+    total = 0
+    batch = []
+    for _, names in list_blob_directories(storage):
+        # the files of a blob stay in the same batch
+        batch.extend(names)
+        if len(batch) < batch_size:
+            continue
+        total += delete_unused_blobs(storage, batch, since)
+        batch = []
+        if run.expired:
+            return total
+        run.pause()
+    if batch:
+        total += delete_unused_blobs(storage, batch, since)
+    return total
@@ -0,0 +1,233 @@
+import base64
+import io
+import os
+import tempfile
+import time
+import warnings
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.files.models import Upload
+from apps.files.tasks import purge_unused_blobs
+from apps.jwt_custom_auth.async_authentication import get_user_cache_key
+from apps.user.models import User, get_photo_thumbnail_name
+from core.testing import asgi_request
+
+TUS = {'HTTP_TUS_RESUMABLE': '1.0.0'}
+
+
+def encode_metadata(**metadata):
+    return ','.join(f'{key} {base64.b64encode(value.encode()).decode()}'
+                    for key, value in metadata.items())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(),
+                   RESUMABLE_UPLOADS={'DIRECTORY': tempfile.mkdtemp()})
+class ResumableUploadTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='user@gmail.com',
+                                        username='user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, content, **metadata):
+        response = self.client.post(
+            '/files/uploads/', HTTP_UPLOAD_LENGTH=str(len(content)),
+            HTTP_UPLOAD_METADATA=encode_metadata(**metadata), **TUS)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['Upload-Offset'], '0')
+        return response['Location']
+
+    def send(self, url, offset, chunk):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(
+                url, chunk, content_type='application/offset+octet-stream',
+                HTTP_UPLOAD_OFFSET=str(offset), **TUS)
+
+    def test_upload(self):
+        content = os.urandom(1000)
+        url = self.create(content, filename='data.bin')
+
+        response = self.send(url, 0, content[:600])
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response['Upload-Offset'], '600')
+
+        # a chunk sent again after a dropped connection
+        response = self.send(url, 0, content[:600])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Upload-Offset'], '600')
+
+        response = self.client.head(url, **TUS)
+        self.assertEqual(response['Upload-Offset'], '600')
+        self.assertEqual(response['Upload-Length'], '1000')
+        self.assertEqual(response['Tus-Resumable'], '1.0.0')
+
+        response = self.send(url, 600, content[600:])
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        upload = Upload.objects.get()
+        self.assertEqual(upload.status, Upload.Status.DONE)
+        self.assertFalse(os.path.exists(upload.path))
+        with upload.file.open('rb') as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_user_photo(self):
+        photo = io.BytesIO()
+        Image.new('RGB', (100, 100)).save(photo, format='PNG')
+        url = self.create(photo.getvalue(), filename='me.png',
+                          purpose='user_photo')
+        cache.set(get_user_cache_key(self.user.pk), self.user)
+
+        self.send(url, 0, photo.getvalue())
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo.name, Upload.objects.get().file.name)
+        self.assertTrue(self.user.has_photo_thumbnails)
+        # the async authentication reads the new photo
+        self.assertIsNone(cache.get(get_user_cache_key(self.user.pk)))
+
+    def test_delete(self):
+        url = self.create(b'abcdef')
+        self.send(url, 0, b'abc')
+        path = Upload.objects.get().path
+        self.assertTrue(os.path.exists(path))
+
+        response = self.client.delete(url, **TUS)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Upload.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_protocol_errors(self):
+        response = self.client.post('/files/uploads/', HTTP_UPLOAD_LENGTH='1')
+        self.assertEqual(response.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(response['Tus-Version'], '1.0.0')
+
+        url = self.create(b'abc')
+        response = self.send(url, 0, b'abcd')
+        self.assertEqual(response.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create(
+            email='other@gmail.com', username='other'))
+        self.assertEqual(other.head(url, **TUS).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class MediaViewTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='user@gmail.com',
+                                        username='user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.content = os.urandom(1000)
+        self.name = default_storage.save('data.bin',
+                                         ContentFile(self.content))
+
+    def test_range(self):
+        response = self.client.get(f'/media/{self.name}',
+                                   HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code,
+                         status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1000')
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.content[100:200])
+
+        response = self.client.get(f'/media/{self.name}',
+                                   HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response.status_code,
+                         status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], 'bytes */1000')
+
+    @override_settings(MEDIA_SERVING={'BACKEND': 'x-accel-redirect'})
+    def test_x_accel_redirect(self):
+        response = self.client.get(f'/media/{self.name}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_private_upload(self):
+        Upload.objects.create(user=self.user, length=1000, file=self.name,
+                              status=Upload.Status.DONE)
+        self.assertEqual(self.client.get(f'/media/{self.name}').status_code,
+                         status.HTTP_200_OK)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create(
+            email='other@gmail.com', username='other'))
+        self.assertEqual(other.get(f'/media/{self.name}').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(APIClient().get(f'/media/{self.name}').status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(),
+                   MEDIA_SERVING={'CHUNK_SIZE': 256})
+class MediaViewAsgiTestCase(TransactionTestCase):
+    """The file is sent a chunk at a time through the ASGI handler"""
+
+    def setUp(self):
+        user = User.objects.create(email='user@gmail.com', username='user')
+        token = RefreshToken.for_user(user).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.content = os.urandom(1000)
+        self.name = default_storage.save('data.bin',
+                                         ContentFile(self.content))
+
+    async def test_range(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            status_code, headers, chunks = await asgi_request(
+                'GET', f'/media/{self.name}',
+                headers={**self.headers, 'Range': 'bytes=100-899'})
+
+        self.assertEqual(status_code, status.HTTP_206_PARTIAL_CONTENT)
+        # Django warns when it has to buffer a sync iterator
+        self.assertEqual(
+            [str(warning.message) for warning in caught
+             if 'synchronous iterators' in str(warning.message)], [])
+        self.assertEqual([len(chunk) for chunk in chunks if chunk],
+                         [256, 256, 256, 32])
+        self.assertEqual(b''.join(chunks), self.content[100:900])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PurgeUnusedBlobsTestCase(TestCase):
+
+    def save(self, name, content, age=48 * 60 * 60):
+        name = default_storage.save(name, ContentFile(content))
+        mtime = time.time() - age
+        os.utime(default_storage.path(name), (mtime, mtime))
+        return name
+
+    def test_purge(self):
+        photo = self.save('photo.jpg', b'photo')
+        thumbnail = self.save(
+            get_photo_thumbnail_name(photo, 'small', 'webp'), b'thumbnail')
+        User.objects.create(email='user@gmail.com', username='user',
+                            photo=photo)
+        upload = self.save('upload.bin', b'upload')
+        Upload.objects.create(user=User.objects.get(), length=6, file=upload,
+                              status=Upload.Status.DONE)
+        unused = self.save('old.jpg', b'old photo')
+        unused_thumbnail = self.save(
+            get_photo_thumbnail_name(unused, 'small', 'webp'), b'old')
+        recent = self.save('new.jpg', b'new photo', age=0)
+
+        self.assertEqual(purge_unused_blobs(), 2)
+        for name in (photo, thumbnail, upload, recent):
+            self.assertTrue(default_storage.exists(name))
+        for name in (unused, unused_thumbnail):
+            self.assertFalse(default_storage.exists(name))
@@ -0,0 +1,10 @@
+from django.urls import path, re_path
+
+from apps.files.views import MediaView, UploadDetailView, UploadListView
+
+urlpatterns = [
+    path('files/uploads/', UploadListView.as_view(), name='upload-list'),
+    path('files/uploads/<uuid:pk>/', UploadDetailView.as_view(),
+         name='upload-detail'),
+    re_path(r'^media/(?P<name>.+)$', MediaView.as_view(), name='media'),
+]
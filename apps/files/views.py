@@ -0,0 +1,320 @@
+"""
+Resumable uploads with the tus protocol 1.0 (core protocol and the
+creation, expiration and termination extensions, see
+https://tus.io/protocols/resumable-upload).
+
+A client creates an upload with a POST of its length, sends it in chunks
+with PATCH requests at the offset the server has, and after a dropped
+connection asks that offset with HEAD and continues from there. The
+chunks go straight to the end of a temporary file, the finished upload is
+stored in the media storage by the worker (finalize_upload).
+"""
+
+import base64
+import fcntl
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponseRedirect, UnreadablePostError
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.files.conf import get_config
+from apps.files.models import Upload
+from apps.files.serving import serve_file
+from apps.files.tasks import finalize_upload
+from apps.monitoring.timing import ServerTimingMixin
+from core.taskapp import delay_on_commit
+
+logger = logging.getLogger(__name__)
+
+TUS_VERSION = '1.0.0'
+TUS_EXTENSIONS = 'creation,expiration,termination'
+CHUNK_CONTENT_TYPE = 'application/offset+octet-stream'
+
+
+class TusError(APIException):
+    """
+    Error of the protocol, with the headers the client needs to recover
+    (``Upload-Offset`` on a conflict, ``Tus-Version`` on a wrong version).
+    """
+
+    def __init__(self, detail, status_code, headers=None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def get_int_header(request, name):
+    value = request.headers.get(name, '')
+    if not value.isdigit():
+        raise ParseError(f'Invalid or missing {name} header.')
+    return int(value)
+
+
+def parse_metadata(header):
+    """
+    Return the ``Upload-Metadata`` header, comma separated ``key value``
+    pairs with the values in base64, as a dict.
+    """
+    metadata = {}
+    for pair in filter(None, (pair.strip() for pair in header.split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode()
+        except (ValueError, UnicodeDecodeError):
+            raise ParseError(f'Invalid Upload-Metadata value of {key}.')
+    return metadata
+
+
+@contextmanager
+def open_chunks(upload):
+    """
+    Open the temporary file of ``upload`` for writing, locked: a client
+    that retries a chunk while the first attempt is still being received
+    gets a conflict instead of interleaving the two.
+    """
+    fd = os.open(upload.path, os.O_WRONLY)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise TusError('Another request is writing to this upload.',
+                           status.HTTP_409_CONFLICT)
+        yield fd
+    finally:
+        os.close(fd)
+
+
+def append_body(request, fd, count):
+    """
+    Append up to ``count`` bytes of the body of ``request`` (an
+    HttpRequest) to ``fd``, return the number of bytes written.
+
+    Under ASGI Django has already spooled a big body to a temporary file:
+    it is copied by the kernel (sendfile), without going through Python.
+    Otherwise the body is streamed by chunks of
+    ``RESUMABLE_UPLOADS['CHUNK_SIZE']``, never read whole in memory.
+    """
+    body = request._stream
+    if isinstance(body, tempfile.SpooledTemporaryFile) and body._rolled:
+        try:
+            return copy_file(body, fd, count)
+        except OSError:
+            # sendfile may not support these files on this platform
+            pass
+
+    chunk_size = get_config('RESUMABLE_UPLOADS')['CHUNK_SIZE']
+    written = 0
+    while written < count:
+        chunk = request.read(min(chunk_size, count - written))
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(fd, view):]
+        written += len(chunk)
+    return written
+
+
+def copy_file(body, fd, count):
+    position = body.tell()
+    written = 0
+    while written < count:
+        sent = os.sendfile(fd, body.fileno(), position + written,
+                           count - written)
+        if not sent:
+            break
+        written += sent
+    body.seek(position + written)
+    return written
+
+
+class TusMixin(ServerTimingMixin):
+    """
+    Protocol headers and checks shared by the upload views. The body of
+    the requests is never parsed by DRF.
+    """
+
+    parser_classes = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (request.method != 'OPTIONS'
+                and request.headers.get('Tus-Resumable') != TUS_VERSION):
+            raise TusError('Unsupported Tus-Resumable version.',
+                           status.HTTP_412_PRECONDITION_FAILED,
+                           {'Tus-Version': TUS_VERSION})
+
+    def handle_exception(self, exc):
+        response = super().handle_exception(exc)
+        for name, value in getattr(exc, 'headers', {}).items():
+            response[name] = value
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        response['Tus-Resumable'] = TUS_VERSION
+        return response
+
+    def finish(self, upload):
+        """
+        Send the complete ``upload`` to the worker.
+        """
+        upload.status = Upload.Status.PROCESSING
+        upload.save(update_fields=['status', 'updated_at'])
+        delay_on_commit(finalize_upload, upload.pk)
+
+    def get_upload_headers(self, upload):
+        return {
+            'Upload-Offset': str(upload.offset),
+            'Upload-Length': str(upload.length),
+            'Upload-Expires': http_date(upload.expires_at.timestamp()),
+            'Cache-Control': 'no-store',
+        }
+
+
+class UploadListView(TusMixin, APIView):
+    """
+    Create an upload: POST with the ``Upload-Length`` header, and the
+    ``filename``, ``filetype`` and ``purpose`` (file or user_photo) in
+    ``Upload-Metadata``. The url of the upload is in ``Location``.
+    """
+
+    def options(self, request, *args, **kwargs):
+        return Response(status=status.HTTP_204_NO_CONTENT, headers={
+            'Tus-Version': TUS_VERSION,
+            'Tus-Extension': TUS_EXTENSIONS,
+            'Tus-Max-Size': str(
+                get_config('RESUMABLE_UPLOADS')['MAX_SIZE']),
+        })
+
+    def post(self, request):
+        length = get_int_header(request, 'Upload-Length')
+        if length > get_config('RESUMABLE_UPLOADS')['MAX_SIZE']:
+            raise TusError('Upload-Length is over Tus-Max-Size.',
+                           status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        metadata = parse_metadata(request.headers.get('Upload-Metadata', ''))
+        purpose = metadata.get('purpose', Upload.Purpose.FILE)
+        if purpose not in Upload.Purpose.values:
+            raise ParseError(f'Invalid purpose {purpose}.')
+
+        upload = Upload.objects.create(
+            user=request.user, length=length, purpose=purpose,
+            filename=os.path.basename(metadata.get('filename', ''))[:255],
+            content_type=metadata.get('filetype', '')[:100])
+        os.makedirs(os.path.dirname(upload.path), exist_ok=True)
+        open(upload.path, 'xb').close()
+        if length == 0:
+            self.finish(upload)
+
+        headers = self.get_upload_headers(upload)
+        headers['Location'] = request.build_absolute_uri(
+            reverse('upload-detail', kwargs={'pk': upload.pk}))
+        return Response(status=status.HTTP_201_CREATED, headers=headers)
+
+
+class UploadDetailView(TusMixin, APIView):
+    """
+    HEAD: offset of the upload. PATCH: append a chunk (content type
+    ``application/offset+octet-stream``) at ``Upload-Offset``, which must be
+    the offset of the upload. DELETE: drop an unfinished upload.
+    """
+
+    def get_object(self):
+        upload = get_object_or_404(Upload, pk=self.kwargs['pk'],
+                                   user=self.request.user)
+        if (upload.status == Upload.Status.UPLOADING
+                and upload.expires_at <= timezone.now()):
+            raise TusError('The upload expired.', status.HTTP_410_GONE)
+        return upload
+
+    def head(self, request, pk):
+        upload = self.get_object()
+        return Response(headers=self.get_upload_headers(upload))
+
+    def patch(self, request, pk):
+        if request._request.content_type != CHUNK_CONTENT_TYPE:
+            raise TusError(f'The content type must be {CHUNK_CONTENT_TYPE}.',
+                           status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        offset = get_int_header(request, 'Upload-Offset')
+        upload = self.get_object()
+        if upload.status != Upload.Status.UPLOADING:
+            raise TusError('The upload is complete.',
+                           status.HTTP_403_FORBIDDEN)
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if offset + content_length > upload.length:
+            raise TusError('The chunk goes past Upload-Length.',
+                           status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        with open_chunks(upload) as fd:
+            # the file is the truth, the row may be behind after a crash
+            size = os.lseek(fd, 0, os.SEEK_END)
+            if offset != size:
+                raise TusError('Upload-Offset is not the upload offset.',
+                               status.HTTP_409_CONFLICT,
+                               {'Upload-Offset': str(size)})
+            try:
+                append_body(request._request, fd, upload.length - offset)
+            except UnreadablePostError:
+                # the connection dropped, the client resumes from the bytes
+                # received
+                logger.info('Chunk of the upload %s interrupted.', upload.pk)
+            upload.offset = os.lseek(fd, 0, os.SEEK_END)
+            upload.save(update_fields=['offset', 'updated_at'])
+
+        if upload.offset == upload.length:
+            self.finish(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT,
+                        headers=self.get_upload_headers(upload))
+
+    def delete(self, request, pk):
+        upload = self.get_object()
+        if upload.status != Upload.Status.UPLOADING:
+            raise TusError('The upload is complete.',
+                           status.HTTP_403_FORBIDDEN)
+        # the path is made from the pk, that delete() sets to None
+        path = upload.path
+        upload.delete()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MediaView(ServerTimingMixin, APIView):
+    """
+    GET a media file, for authenticated users. The files uploaded with the
+    purpose file are only for their owner. Once allowed the file is sent by
+    the ``MEDIA_SERVING['BACKEND']`` (see apps.files.serving); a storage
+    without local files (S3) gets a redirect to the url of the file.
+    """
+
+    def get(self, request, name):
+        uploads = Upload.objects.filter(file=name,
+                                        purpose=Upload.Purpose.FILE)
+        if (uploads.exists()
+                and not uploads.filter(user=request.user).exists()):
+            raise Http404
+        try:
+            default_storage.path(name)
+        except NotImplementedError:
+            return HttpResponseRedirect(default_storage.url(name))
+        except SuspiciousFileOperation:
+            raise Http404
+        try:
+            return serve_file(request._request, default_storage, name)
+        except FileNotFoundError:
+            raise Http404
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class JwtCustomAuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.jwt_custom_auth'
+
+    def ready(self):
+        # connects the receivers that forget the cached users
+        from . import async_authentication  # noqa: F401
@@ -0,0 +1,143 @@
+"""
+Authentication of the async views (apps.user.async_views and the async
+login) and of the websockets (apps.jwt_custom_auth.websocket), without DRF.
+
+The token is validated like rest_framework_simplejwt's JWTAuthentication
+(the same settings, headers and errors), the user is read with the async
+cache and ORM APIs. Users are cached ``JWT_USER_CACHE_TIMEOUT`` seconds, the
+cached entry is deleted when the user is saved or deleted (once committed).
+Only ``CACHED_USER_FIELDS`` are read and cached, not the password hash: the
+other fields are deferred, read from the database if a view uses them.
+"""
+
+import functools
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from apps.commons import json_response
+
+User = get_user_model()
+
+USER_CACHE_KEY = 'jwt-user:{}'
+
+
+def get_user_cache_key(user_id):
+    return USER_CACHE_KEY.format(user_id)
+
+
+# what the async views, the websockets and the throttles read of the user
+CACHED_USER_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name',
+                      'status', 'is_active', 'is_staff', 'is_superuser')
+
+
+def to_cached_user(user):
+    return {name: getattr(user, name) for name in CACHED_USER_FIELDS}
+
+
+def from_cached_user(data):
+    # in the order of the model, the others deferred
+    names = [field.attname for field in User._meta.concrete_fields
+             if field.attname in data]
+    return User.from_db(DEFAULT_DB_ALIAS, names,
+                        [data[name] for name in names])
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """
+    simplejwt's JWTAuthentication with an async ``aauthenticate``, the
+    checks of the token are CPU only and are reused as they are.
+    """
+
+    async def aauthenticate(self, request):
+        """
+        Return ``(user, validated_token)``, or None when the request has no
+        token. Raises InvalidToken or AuthenticationFailed.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return await self.aauthenticate_token(raw_token)
+
+    async def aauthenticate_token(self, raw_token):
+        """
+        Return ``(user, validated_token)`` of a raw access token (the
+        websocket connections send it without the Authorization header).
+        """
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                'Token contained no recognizable user identification')
+
+        key = get_user_cache_key(user_id)
+        data = await cache.aget(key)
+        if data is not None:
+            user = from_cached_user(data)
+        else:
+            try:
+                user = await User.objects.only(*CACHED_USER_FIELDS).aget(
+                    **{jwt_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed('User not found',
+                                           code='user_not_found')
+            await cache.aset(key, to_cached_user(user),
+                             settings.JWT_USER_CACHE_TIMEOUT)
+
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive',
+                                       code='user_inactive')
+        return user
+
+
+authentication = AsyncJWTAuthentication()
+
+
+def authenticated(view):
+    """
+    Decorator of async views that requires a valid access token, sets
+    ``request.user`` and ``request.auth`` or returns a 401 like DRF does.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await authentication.aauthenticate(request)
+            if result is None:
+                raise NotAuthenticated()
+        except (AuthenticationFailed, InvalidToken, NotAuthenticated) as exc:
+            # the body of rest_framework.views.exception_handler
+            data = exc.detail if isinstance(exc.detail, dict) else {
+                'detail': exc.detail}
+            response = json_response(data, status.HTTP_401_UNAUTHORIZED)
+            response['WWW-Authenticate'] = authentication.authenticate_header(
+                request)
+            return response
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # once committed: a request between the delete and the commit would
+    # cache the user as it was
+    transaction.on_commit(functools.partial(cache.delete, get_user_cache_key(
+        getattr(instance, jwt_settings.USER_ID_FIELD))))
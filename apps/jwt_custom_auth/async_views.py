@@ -0,0 +1,96 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.http import HttpResponseNotAllowed
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.commons import json_response
+from apps.monitoring.metrics import PASSWORD_CHECK_TIME
+from apps.monitoring.timing import get_timing
+from apps.user.serializers import ListUserSerializer
+from core.parsers import FastJSONParser
+from core.throttling import LOGIN_THROTTLES, athrottle
+
+from .serializers import ObtainTokenSerializer
+
+User = get_user_model()
+
+
+async def aget_user(request, email_or_phone, password):
+    """
+    Async version of ObtainUserLoginMiddleware.get_user.
+    """
+    user = await User.objects.filter(email=email_or_phone).afirst()
+    if user is None:
+        user = await User.objects.filter(phone=email_or_phone).afirst()
+    if user is None:
+        return None
+
+    # the password hash is the most expensive part of the login, it runs in
+    # a thread (check_password may also save an upgraded hash)
+    start = time.perf_counter()
+    is_valid_password = await sync_to_async(user.check_password)(password)
+    duration = time.perf_counter() - start
+    # logged only, the header would tell whether the account exists
+    get_timing(request).add('password', duration, private=True)
+    PASSWORD_CHECK_TIME.observe(duration)
+    if not is_valid_password:
+        return None
+    return user
+
+
+def get_tokens_for_user(user):
+    refresh = RefreshToken.for_user(user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+async def obtain_token(request):
+    """
+    Async version of TokenObtainExtraDetailsView: POST an email (or phone)
+    and a password in JSON or as a form, returns the refresh and access
+    tokens and the user.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    if request.content_type == 'application/json':
+        try:
+            data = FastJSONParser().parse(request)
+        except ParseError as exc:
+            return json_response({'detail': exc.detail},
+                                 status.HTTP_400_BAD_REQUEST)
+    else:
+        data = request.POST
+    # the limits of TokenObtainExtraDetailsView, per IP and per account
+    response = await athrottle(request, LOGIN_THROTTLES, 'login', data)
+    if response is not None:
+        return response
+    serializer = ObtainTokenSerializer(data=data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    user = await aget_user(request, serializer.validated_data['email'],
+                           serializer.validated_data['password'])
+    if user is None:
+        return json_response({'message': 'Invalid credentials'},
+                             status.HTTP_400_BAD_REQUEST)
+
+    if apps.is_installed('rest_framework_simplejwt.token_blacklist'):
+        # the refresh token is saved as an OutstandingToken
+        response = await sync_to_async(get_tokens_for_user)(user)
+    else:
+        response = get_tokens_for_user(user)
+    with get_timing(request).measure('serialize'):
+        response['user'] = ListUserSerializer(user).data
+    return json_response(response)
+
+
+# token API, there is no session to protect
+obtain_token.csrf_exempt = True
@@ -0,0 +1,24 @@
+"""
+Maintenance tasks of the tokens.
+"""
+
+from django.apps import apps
+from django.utils import timezone
+
+from core.maintenance import maintenance_task
+
+
+@maintenance_task
+def purge_expired_tokens(run):
+    """
+    Delete the outstanding refresh tokens (and their blacklist entries)
+    that expired, they can not be used anymore. Like simplejwt's
+    flushexpiredtokens, in batches. Nothing to do without the blacklist app.
+    """
+    if not apps.is_installed('rest_framework_simplejwt.token_blacklist'):
+        return 0
+    from rest_framework_simplejwt.token_blacklist.models import (
+        OutstandingToken)
+
+    return run.delete(
+        OutstandingToken.objects.filter(expires_at__lt=timezone.now()))
@@ -1,19 +1,21 @@
 from django.urls import path
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView
 )
 
-from .views import TokenObtainExtraDetailsView
+from .async_views import obtain_token
+from .views import TokenObtainExtraDetailsView, TokenObtainSimpleView
 
 urlpatterns = [
     path('api/token/', TokenObtainExtraDetailsView.as_view(),
          name='token_obtain_pair-extra'),
-    path('api/token-simple/', TokenObtainPairView.as_view(),
+    path('api/token-simple/', TokenObtainSimpleView.as_view(),
          name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(),
          name='token_refresh'),
     path('api/token/verify/', TokenVerifyView.as_view(),
          name='token_verify'),
+    path('api/async/token/', obtain_token,
+         name='async_token_obtain_pair'),
 ]
@@ -1,3 +1,5 @@
+import time
+
 from apps.user.serializers import ListUserSerializer
 from django.contrib.auth import get_user_model
 from rest_framework import views, permissions, status
@@ -6,6 +8,11 @@ from rest_framework.response import Response
 
 # from drf_yasg.utils import swagger_auto_schema
 
+from apps.monitoring.metrics import PASSWORD_CHECK_TIME
+from apps.monitoring.timing import ServerTimingMixin, get_timing
+from core.idempotency import IdempotencyMixin
+from core.throttling import LOGIN_THROTTLES
+
 from .serializers import ObtainTokenSerializer
 from .authentication import JWTAuthentication
 
@@ -21,7 +28,7 @@ from rest_framework_simplejwt.views import (
 User = get_user_model()
 
 
-class ObtainUserLoginMiddleware():
+class ObtainUserLoginMiddleware(ServerTimingMixin):
     """
     Middleware class for user login using email or phone number.
 
@@ -36,6 +43,9 @@ class ObtainUserLoginMiddleware():
         serializer_class (class): The serializer class used to validate and deserialize the login data.
             By default, it uses 'ObtainTokenSerializer' for token-based authentication.
 
+        throttle_scope (str): The scope of the rate limits of the login ('login' per IP and 'login_identifier'
+            per email/phone number, see 'core.throttling').
+
     Methods:
         get_user():
             Authenticate the user using the provided email/phone number and password.
@@ -47,6 +57,9 @@ class ObtainUserLoginMiddleware():
 
     permission_classes = [permissions.AllowAny]
     serializer_class = ObtainTokenSerializer
+    # per IP and per account (core.throttling)
+    throttle_scope = 'login'
+    throttle_classes = LOGIN_THROTTLES
 
     def get_user(self):
         """
@@ -72,7 +85,17 @@ class ObtainUserLoginMiddleware():
             user = User.objects.filter(
                 phone=username_or_phone_number).first()
 
-        if user is None or not user.check_password(password):
+        if user is None:
+            return False
+
+        # the password hash is the most expensive part of the login
+        start = time.perf_counter()
+        is_valid_password = user.check_password(password)
+        duration = time.perf_counter() - start
+        # logged only, the header would tell whether the account exists
+        get_timing(request).add('password', duration, private=True)
+        PASSWORD_CHECK_TIME.observe(duration)
+        if not is_valid_password:
             return False
 
         return user
@@ -155,7 +178,16 @@ class ObtainTokenView(ObtainUserLoginMiddleware, views.APIView):
         return Response({'token': jwt_token})
 
 
-class TokenObtainExtraDetailsView(ObtainUserLoginMiddleware,
+class TokenObtainSimpleView(TokenObtainPairView):
+    """
+    The 'TokenObtainPairView' of 'rest_framework_simplejwt', with the rate limits of the login.
+    """
+
+    throttle_scope = 'login'
+    throttle_classes = LOGIN_THROTTLES
+
+
+class TokenObtainExtraDetailsView(IdempotencyMixin, ObtainUserLoginMiddleware,
                                   TokenObtainPairView):
     """
     API View to obtain JWT tokens for user authentication with extra details and using simple jwt library.
@@ -172,6 +204,9 @@ class TokenObtainExtraDetailsView(ObtainUserLoginMiddleware,
             for user authentication using username and password.
 
     Note:
+        A retry sent with the same 'Idempotency-Key' header within 'idempotency_ttl' seconds gets the
+        tokens of the first request (core.idempotency), the password is not checked again.
+
         The 'ObtainUserLoginMiddleware' class should be placed before the 'TokenObtainPairView' class in the
         class inheritance list to ensure that user authentication is performed before token generation.
 
@@ -200,6 +235,10 @@ class TokenObtainExtraDetailsView(ObtainUserLoginMiddleware,
         to request a new access token once it expires.
     """
 
+    # the tokens are replayed only for the retries of a timeout: they stay
+    # valid after a password change or a deleted account
+    idempotency_ttl = 60
+
     def get_tokens_for_user(self, user):
         """
         Get JWT tokens (refresh and access tokens) for the specified user.
@@ -256,5 +295,6 @@ class TokenObtainExtraDetailsView(ObtainUserLoginMiddleware,
                             status=status.HTTP_400_BAD_REQUEST)
 
         respose = self.get_tokens_for_user(user)
-        respose['user'] = ListUserSerializer(user).data
+        with get_timing(request).measure('serialize'):
+            respose['user'] = ListUserSerializer(user).data
         return Response(respose, status=status.HTTP_200_OK)
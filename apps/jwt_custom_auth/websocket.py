@@ -0,0 +1,45 @@
+"""
+Authentication of the websocket connections (core.asgi) with the access
+tokens of the API.
+"""
+
+from urllib.parse import parse_qs
+
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .async_authentication import authentication
+
+
+def get_raw_token(scope):
+    """
+    Return the access token of a websocket connection: from the
+    Authorization header (``Bearer <token>``) or, for the browsers that
+    cannot set headers on a websocket, from the ``token`` query parameter.
+    """
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            return authentication.get_raw_token(value)
+    tokens = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    return tokens[0].encode() if tokens else None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Channels middleware that sets ``scope['user']`` (AnonymousUser without a
+    valid token) and ``scope['auth']`` (the validated token) of the
+    connection, the consumers decide whether they accept anonymous users.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope, user=AnonymousUser(), auth=None)
+        raw_token = get_raw_token(scope)
+        if raw_token is not None:
+            try:
+                scope['user'], scope['auth'] = (
+                    await authentication.aauthenticate_token(raw_token))
+            except (AuthenticationFailed, InvalidToken):
+                pass
+        return await super().__call__(scope, receive, send)
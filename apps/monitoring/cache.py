@@ -0,0 +1,46 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django_redis.cache import RedisCache
+
+from apps.monitoring.metrics import record_cache_lookup
+
+_MISSING = object()
+
+
+class MetricsCacheMixin:
+    """
+    Cache backend mixin that counts the hits and misses of ``get`` and
+    ``get_many`` for the ``django_cache_requests_total`` metric.
+
+    The ``cache`` label is taken from the ``ALIAS`` key of the cache
+    settings (``'default'`` if it is not set).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.metrics_alias = params.get('ALIAS', 'default')
+
+    def get(self, key, default=None, version=None, **kwargs):
+        if default is self._missing_key:
+            # called by BaseCache.get_many, already counted there
+            return super().get(key, default, version, **kwargs)
+        value = super().get(key, _MISSING, version, **kwargs)
+        if value is _MISSING:
+            record_cache_lookup(self.metrics_alias, 0, 1)
+            return default
+        record_cache_lookup(self.metrics_alias, 1, 0)
+        return value
+
+    def get_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        values = super().get_many(keys, version, **kwargs)
+        record_cache_lookup(
+            self.metrics_alias, len(values), len(keys) - len(values))
+        return values
+
+
+class InstrumentedLocMemCache(MetricsCacheMixin, LocMemCache):
+    pass
+
+
+class InstrumentedRedisCache(MetricsCacheMixin, RedisCache):
+    pass
@@ -0,0 +1,89 @@
+from django.conf import settings
+
+# Default values for every configuration group of the monitoring app. Each
+# group can be partially overridden from the project settings with a dict of
+# the same name, e.g. ``QUERY_BUDGET = {'ACTION': 'raise'}``.
+DEFAULTS = {
+    'QUERY_BUDGET': {
+        # turn the middleware on/off (it is removed from the chain when off)
+        'ENABLED': False,
+        # budget applied to views that do not declare their own
+        'DEFAULT_MAX_QUERIES': None,
+        # 'log' or 'raise' when a request goes over its budget
+        'ACTION': 'log',
+        # number of stack frames kept for each duplicated query
+        'STACK_DEPTH': 8,
+        # queries containing any of these strings are not counted: the ones
+        # issued by the profiler to store and analyze its own data, and
+        # transaction control statements
+        'IGNORED_SQL': ('"silk_', 'EXPLAIN ', 'SAVEPOINT '),
+    },
+    'PROFILING': {
+        # turn the middleware on/off (it is removed from the chain when off)
+        'ENABLED': False,
+        # fraction of the requests that are profiled, between 0 and 1
+        'SAMPLE_RATE': 0.0,
+        # path prefixes that can be sampled, an empty list allows every path
+        'PATHS': [],
+        # header with a signed token that forces the profile of a request
+        'HEADER': 'HTTP_X_PROFILE_REQUEST',
+        # seconds a token created by `manage.py profiling_token` is valid
+        'TOKEN_MAX_AGE': 60 * 60,
+        # the queries of a profile stop being recorded when the recording
+        # takes longer than this (in ms) or there are more than MAX_QUERIES
+        'OVERHEAD_BUDGET_MS': 5,
+        'MAX_QUERIES': 200,
+        # also run cProfile on the profiled requests (expensive)
+        'PYTHON_PROFILER': False,
+        # profiles are saved in batches by a background thread
+        'BACKGROUND_WRITER': True,
+        'BATCH_SIZE': 50,
+        'FLUSH_INTERVAL': 2.0,
+        # profiles are dropped when the queue is full
+        'MAX_QUEUE_SIZE': 1000,
+    },
+    'SERVER_TIMING': {
+        # turn the middleware on/off (it is removed from the chain when off)
+        'ENABLED': False,
+        # add the Server-Timing header to the responses
+        'HEADER': True,
+        # log a JSON line with the timings of every request
+        'LOG': True,
+    },
+    'METRICS': {
+        # turn the middleware on/off (it is removed from the chain when off)
+        'ENABLED': False,
+        # /metrics is only served to requests with this bearer token...
+        'TOKEN': None,
+        # ...or coming from one of these networks (e.g. '10.0.0.0/8')
+        'ALLOWED_NETWORKS': ['127.0.0.1/32'],
+    },
+    'SLOW_QUERIES': {
+        # turn the middleware on/off (it is removed from the chain when off)
+        'ENABLED': False,
+        # queries slower than this (in ms) are saved
+        'THRESHOLD_MS': 100,
+        # fraction of the slow SELECT queries that get an EXPLAIN, it runs
+        # again the query in the background thread
+        'EXPLAIN_SAMPLE_RATE': 0.0,
+        # EXPLAIN (ANALYZE, BUFFERS) in PostgreSQL, a plain EXPLAIN otherwise
+        'EXPLAIN_ANALYZE': True,
+        # statement_timeout of the EXPLAIN in PostgreSQL (ms)
+        'EXPLAIN_TIMEOUT_MS': 5000,
+        'STACK_DEPTH': 8,
+        # slow queries are saved in batches by a background thread
+        'BACKGROUND_WRITER': True,
+        'BATCH_SIZE': 50,
+        'FLUSH_INTERVAL': 5.0,
+        'MAX_QUEUE_SIZE': 1000,
+    },
+}
+
+
+def get_config(name):
+    """
+    Return the configuration group ``name`` merged over its defaults.
+    """
+    config = dict(DEFAULTS[name])
+    config.update(getattr(settings, name, {}))
+    return config
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# name, application, worker class, path
+MODES = (
+    ('WSGI, sync workers, DRF view', 'core.wsgi', 'sync', '/users/'),
+    ('ASGI, uvicorn workers, DRF view', 'core.asgi',
+     'uvicorn.workers.UvicornWorker', '/users/'),
+    ('ASGI, uvicorn workers, async view', 'core.asgi',
+     'uvicorn.workers.UvicornWorker', '/api/async/users/'),
+)
+
+
+async def fetch(reader, writer, request):
+    """
+    Send ``request`` on a connection and read the response. Return the
+    status code and whether the connection can be reused.
+    """
+    writer.write(request)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split()[1]), headers.get('connection') != 'close'
+
+
+@contextmanager
+def start_server(application, worker_class, options, timeout=60):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', application,
+         '--config', 'python:core.gunicorn',
+         '--worker-class', worker_class,
+         '--bind', f'127.0.0.1:{options["port"]}',
+         '--workers', str(options['workers']),
+         '--backlog', str(options['concurrency'] * 2)],
+        env=os.environ.copy(), stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if server.poll() is not None:
+                raise CommandError('gunicorn exited, run it by hand to see '
+                                   'the error.')
+            if time.monotonic() > deadline:
+                raise CommandError('gunicorn did not start.')
+            try:
+                socket.create_connection(
+                    ('127.0.0.1', options['port']), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.2)
+        yield server
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+class LoadGenerator:
+    """
+    ``concurrency`` clients sending ``requests`` GET requests in total, each
+    one on its own keep-alive connection (reopened when the server closes
+    it, the sync workers do after each response).
+    """
+
+    def __init__(self, port, path, host, token):
+        self.port = port
+        self.request = (
+            f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+            f'Authorization: Bearer {token}\r\n'
+            'Accept: application/json\r\nAccept-Encoding: identity\r\n\r\n'
+        ).encode()
+
+    async def client(self):
+        connection = None
+        while self.remaining > 0:
+            self.remaining -= 1
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = await asyncio.open_connection(
+                        '127.0.0.1', self.port)
+                status, keep_alive = await fetch(*connection, self.request)
+            except (OSError, asyncio.IncompleteReadError):
+                self.errors += 1
+                connection = None
+                continue
+            self.latencies.append(time.perf_counter() - start)
+            if status != 200:
+                self.errors += 1
+            if not keep_alive:
+                connection[1].close()
+                connection = None
+        if connection is not None:
+            connection[1].close()
+
+    async def run(self, requests, concurrency):
+        self.remaining = requests
+        self.latencies = []
+        self.errors = 0
+        start = time.perf_counter()
+        await asyncio.gather(*(self.client() for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = ('Start gunicorn with the WSGI application (sync workers) and '
+            'with the ASGI one (uvicorn workers) and report the throughput '
+            'and latency of the user list (DRF view, and the async view '
+            'under ASGI) at high concurrency. It uses the configured '
+            'database, it must be reachable by the workers.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Number of gunicorn workers (default: 4).')
+        parser.add_argument(
+            '--concurrency', type=int, default=200,
+            help='Concurrent connections (default: 200).')
+        parser.add_argument(
+            '--requests', type=int, default=5000,
+            help='Requests per server (default: 5000).')
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host of the requests, it must be in ALLOWED_HOSTS.')
+        parser.add_argument(
+            '--port', type=int, default=8766,
+            help='Port gunicorn listens to (default: 8766).')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(is_active=True).first()
+        if user is None:
+            raise CommandError('There is no active user to authenticate.')
+        token = str(RefreshToken.for_user(user).access_token)
+
+        self.stdout.write(
+            f'{options["requests"]} requests, {options["concurrency"]} '
+            f'connections, {options["workers"]} workers')
+        for name, application, worker_class, path in MODES:
+            load = LoadGenerator(options['port'], path, options['host'], token)
+            with start_server(application, worker_class, options):
+                # the first requests of each worker load the views
+                asyncio.run(load.run(options['workers'] * 20,
+                                     options['concurrency']))
+                duration = asyncio.run(load.run(options['requests'],
+                                                options['concurrency']))
+            self.report(name, path, load, duration)
+
+    def report(self, name, path, load, duration):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{name} ({path})'))
+        if len(load.latencies) < 2:
+            self.stdout.write(f'  {load.errors} errors, no response')
+            return
+        percentiles = statistics.quantiles(load.latencies, n=100)
+        self.stdout.write(
+            f'  {len(load.latencies) / duration:8.0f} requests/s  '
+            f'p50 {percentiles[49] * 1000:7.1f} ms  '
+            f'p95 {percentiles[94] * 1000:7.1f} ms  '
+            f'p99 {percentiles[98] * 1000:7.1f} ms  '
+            f'max {max(load.latencies) * 1000:7.1f} ms  '
+            f'{load.errors} errors')
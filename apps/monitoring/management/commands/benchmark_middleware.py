@@ -0,0 +1,57 @@
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from core.handlers import PathDispatchWSGIHandler
+
+
+class Command(BaseCommand):
+    help = ('Compare the time per request of the full middleware chain and '
+            'the lean API chain (settings.API_MIDDLEWARE).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='/users/',
+            help='Path requested (default: /users/, an anonymous request '
+                 'that DRF rejects without touching the database).')
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host of the requests, it must be in ALLOWED_HOSTS.')
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Number of requests per chain (default: 2000).')
+
+    def measure(self, get_response, path, host, requests):
+        factory = RequestFactory(SERVER_NAME=host)
+        # warm up (url resolver, lazy imports...)
+        for _ in range(50):
+            get_response(factory.get(path))
+
+        elapsed = 0
+        for _ in range(requests):
+            request = factory.get(path)
+            start = time.perf_counter()
+            get_response(request)
+            elapsed += time.perf_counter() - start
+        return elapsed / requests * 1e6
+
+    def handle(self, *args, **options):
+        handler = PathDispatchWSGIHandler()
+        path, host = options['path'], options['host']
+        requests = options['requests']
+
+        def full_chain(request):
+            return WSGIHandler.get_response(handler, request)
+
+        full = self.measure(full_chain, path, host, requests)
+        lean = self.measure(
+            handler.api_handler.get_response, path, host, requests)
+
+        self.stdout.write(f'{requests} requests to {path}')
+        self.stdout.write(f'  full middleware: {full:8.1f} us/request')
+        self.stdout.write(f'  api middleware:  {lean:8.1f} us/request')
+        self.stdout.write(self.style.SUCCESS(
+            f'  saved:           {full - lean:8.1f} us/request '
+            f'({(full - lean) / full:.0%})'))
@@ -0,0 +1,68 @@
+import io
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from apps.user.models import User
+from apps.user.serializers import ListUserSerializer
+from core.parsers import FastJSONParser, MessagePackParser
+from core.renderers import FastJSONRenderer, MessagePackRenderer
+
+FORMATS = (
+    ('json (stdlib)', JSONRenderer(), JSONParser()),
+    ('json (fast)', FastJSONRenderer(), FastJSONParser()),
+    ('msgpack', MessagePackRenderer(), MessagePackParser()),
+)
+
+
+class Command(BaseCommand):
+    help = ('Compare the size and the encode/decode time of a page of '
+            'ListUserSerializer in JSON and MessagePack.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Users in the page (default: 100). Users of the database '
+                 'are used if there are enough, unsaved ones if not.')
+        parser.add_argument(
+            '--repeat', type=int, default=200,
+            help='Times each format is encoded and decoded (default: 200).')
+
+    def get_users(self, count):
+        users = list(User.objects.all()[:count])
+        now = timezone.now()
+        for index in range(len(users), count):
+            users.append(User(
+                id=uuid.uuid4(), email=f'user{index}@example.com',
+                username=f'user{index}', first_name='Name',
+                last_name='Last Name', phone='999888777', created_at=now,
+                updated_at=now))
+        return users
+
+    def measure(self, func, repeat):
+        start = time.process_time()
+        for _ in range(repeat):
+            func()
+        return (time.process_time() - start) / repeat * 1e6
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        data = ListUserSerializer(
+            self.get_users(options['users']), many=True).data
+
+        self.stdout.write(f'{len(data)} users, {repeat} times')
+        self.stdout.write(
+            f'  {"format":<14} {"bytes":>8} {"encode us":>10} '
+            f'{"decode us":>10}')
+        for name, renderer, parser in FORMATS:
+            content = renderer.render(data)
+            encode = self.measure(lambda: renderer.render(data), repeat)
+            decode = self.measure(
+                lambda: parser.parse(io.BytesIO(content)), repeat)
+            self.stdout.write(
+                f'  {name:<14} {len(content):>8} {encode:>10.1f} '
+                f'{decode:>10.1f}')
@@ -0,0 +1,121 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+MODES = (
+    ('without preload', '0'),
+    ('with preload', '1'),
+)
+
+
+def read_memory(pid):
+    """
+    Return the RSS, PSS and USS (private pages) of a process in kB.
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as smaps:
+        for line in smaps:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                values[name] = int(value.split()[0])
+    return {
+        'rss': values['Rss'],
+        'pss': values['Pss'],
+        'uss': values['Private_Clean'] + values['Private_Dirty'],
+    }
+
+
+def get_children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as children:
+        return [int(child) for child in children.read().split()]
+
+
+class Command(BaseCommand):
+    help = ('Start gunicorn (core.gunicorn config) without and with '
+            'preload, send some requests and report the RSS and USS of each '
+            'worker. Linux only.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Number of workers (default: 4).')
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Requests sent before measuring (default: 200).')
+        parser.add_argument(
+            '--path', default='/users/',
+            help='Path requested (default: /users/).')
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host of the requests, it must be in ALLOWED_HOSTS.')
+        parser.add_argument(
+            '--port', type=int, default=8765,
+            help='Port gunicorn listens to (default: 8765).')
+
+    def handle(self, *args, **options):
+        if not os.path.exists('/proc/self/smaps_rollup'):
+            raise CommandError('/proc/<pid>/smaps_rollup is not available.')
+
+        for name, preload in MODES:
+            workers = self.measure(preload, options)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{options["workers"]} workers {name}'))
+            for pid, memory in workers:
+                self.stdout.write(
+                    f'  worker {pid:>7}  rss {memory["rss"] / 1024:7.1f} MB  '
+                    f'pss {memory["pss"] / 1024:7.1f} MB  '
+                    f'uss {memory["uss"] / 1024:7.1f} MB')
+            self.stdout.write(
+                f'  total uss {sum(m["uss"] for _, m in workers) / 1024:.1f}'
+                f' MB, total pss {sum(m["pss"] for _, m in workers) / 1024:.1f}'
+                ' MB')
+
+    def measure(self, preload, options):
+        env = {**os.environ, 'GUNICORN_PRELOAD': preload}
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'core.wsgi',
+             '--config', 'python:core.gunicorn',
+             '--bind', f'127.0.0.1:{options["port"]}',
+             '--workers', str(options['workers'])],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            self.wait_workers(server, options)
+            url = f'http://127.0.0.1:{options["port"]}{options["path"]}'
+            for _ in range(options['requests']):
+                request = urllib.request.Request(
+                    url, headers={'Host': options['host']})
+                try:
+                    urllib.request.urlopen(request).read()
+                except urllib.error.HTTPError:
+                    # 401... the request was served anyway
+                    pass
+            return [(pid, read_memory(pid))
+                    for pid in get_children(server.pid)]
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+    def wait_workers(self, server, options, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('gunicorn exited, run it by hand to see '
+                                   'the error.')
+            if len(get_children(server.pid)) == options['workers']:
+                try:
+                    urllib.request.urlopen(
+                        f'http://127.0.0.1:{options["port"]}/', timeout=1)
+                except urllib.error.HTTPError:
+                    return
+                except OSError:
+                    pass
+                else:
+                    return
+            time.sleep(0.2)
+        raise CommandError('gunicorn workers did not start.')
@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# runs in a new interpreter, the modules imported by this process do not
+# count
+BOOT_SCRIPT = '''
+import io, json, sys, time
+
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from core.wsgi import application
+loaded = time.perf_counter()
+
+def request(path, host):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': host, 'SERVER_PORT': '80', 'HTTP_HOST': host,
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False, 'wsgi.multiprocess': True,
+    }
+    status = []
+    response = application(environ, lambda s, headers: status.append(s))
+    b''.join(response)
+    response.close()
+    return status[0]
+
+status = request(sys.argv[1], sys.argv[2])
+first = time.perf_counter()
+request(sys.argv[1], sys.argv[2])
+second = time.perf_counter()
+print(json.dumps({
+    'status': status,
+    'setup': setup - start,
+    'application': loaded - setup,
+    'first_request': first - loaded,
+    'second_request': second - first,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def parse_importtime(output):
+    """
+    Return ``[(module, self_us, cumulative_us)]`` from the ``-X importtime``
+    lines of ``output``.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split(
+            '|', 2)
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+class Command(BaseCommand):
+    help = ('Start the application in a new process and report the import '
+            'cost of each module and package and the time to the first '
+            'request.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='/users/',
+            help='Path of the first request (default: /users/).')
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host of the request, it must be in ALLOWED_HOSTS.')
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Number of modules and packages to show (default: 20).')
+
+    def handle(self, *args, **options):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT,
+             options['path'], options['host']],
+            capture_output=True, text=True, env=os.environ.copy())
+        if process.returncode:
+            raise CommandError(process.stderr[-3000:])
+        boot = json.loads(process.stdout.strip().splitlines()[-1])
+        imports = parse_importtime(process.stderr)
+
+        packages = defaultdict(int)
+        for module, self_us, _ in imports:
+            packages[module.split('.')[0]] += self_us
+        total_us = sum(packages.values())
+        limit = options['limit']
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Boot'))
+        for phase in ('setup', 'application', 'first_request',
+                      'second_request'):
+            self.stdout.write(f'  {phase:<15} {boot[phase] * 1000:8.1f} ms')
+        self.stdout.write(
+            f'  {len(imports)} modules imported in {total_us / 1000:.1f} ms, '
+            f'first request to {options["path"]}: {boot["status"]}')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            'Packages (import time of all their modules)'))
+        for package, self_us in sorted(
+                packages.items(), key=lambda item: -item[1])[:limit]:
+            self.stdout.write(f'  {self_us / 1000:8.1f} ms  {package}')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            'Modules (import time without their imports)'))
+        for module, self_us, cumulative_us in sorted(
+                imports, key=lambda item: -item[1])[:limit]:
+            self.stdout.write(
+                f'  {self_us / 1000:8.1f} ms  {module} '
+                f'(cumulative {cumulative_us / 1000:.1f} ms)')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.monitoring.conf import get_config
+from apps.monitoring.sampling import create_profiling_token
+
+
+class Command(BaseCommand):
+    help = ('Create a signed token that forces the profile of the requests '
+            'sending it in the X-Profile-Request header.')
+
+    def handle(self, *args, **options):
+        config = get_config('PROFILING')
+        token = create_profiling_token()
+        self.stdout.write(token)
+        self.stderr.write(
+            f'Valid for {config["TOKEN_MAX_AGE"]} seconds, e.g.\n'
+            f'  curl -H "X-Profile-Request: {token}" ...')
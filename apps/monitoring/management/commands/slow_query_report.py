@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Sum
+from django.utils import timezone
+
+from apps.monitoring.models import SlowQuery
+
+ORDERINGS = {
+    'total': '-total_ms',
+    'avg': '-avg_ms',
+    'max': '-max_ms',
+    'count': '-count',
+}
+
+
+class Command(BaseCommand):
+    help = 'Show the slow queries grouped by fingerprint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=24,
+            help='Only queries of the last HOURS hours (default: 24).')
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Number of fingerprints to show (default: 20).')
+        parser.add_argument(
+            '--order', choices=ORDERINGS, default='total',
+            help='Order of the fingerprints (default: total time).')
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='Show the latest EXPLAIN of each fingerprint.')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['hours'])
+        queries = SlowQuery.objects.filter(created_at__gte=since)
+        groups = (
+            queries.values('fingerprint')
+            .annotate(count=Count('id'), avg_ms=Avg('duration_ms'),
+                      max_ms=Max('duration_ms'), total_ms=Sum('duration_ms'))
+            .order_by(ORDERINGS[options['order']])[:options['limit']]
+        )
+
+        if not groups:
+            self.stdout.write('No slow queries.')
+            return
+
+        for group in groups:
+            same_query = queries.filter(fingerprint=group['fingerprint'])
+            latest = same_query.latest('created_at')
+            views = (same_query.values_list('view', flat=True)
+                     .annotate(count=Count('id')).order_by('-count')[:3])
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'[{group["fingerprint"]}] {group["count"]} queries, '
+                f'total {group["total_ms"]:.0f} ms, '
+                f'avg {group["avg_ms"]:.1f} ms, max {group["max_ms"]:.1f} ms'))
+            self.stdout.write(f'  views: {", ".join(filter(None, views))}')
+            self.stdout.write(f'  sql: {latest.sql[:500]}')
+            stack = latest.stack.strip().splitlines()
+            if stack:
+                # format_list puts the frame and its code in two lines
+                self.stdout.write(f'  origin: {" ".join(stack[-2:]).strip()}')
+            if options['plans']:
+                plan = same_query.exclude(plan='').values_list(
+                    'plan', flat=True).order_by('-created_at').first()
+                if plan:
+                    self.stdout.write('  plan:')
+                    for line in plan.splitlines():
+                        self.stdout.write(f'    {line}')
+            self.stdout.write('')
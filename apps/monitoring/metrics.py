@@ -0,0 +1,122 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+    Histogram, generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+
+# When PROMETHEUS_MULTIPROC_DIR is set (see compose/production/django/start)
+# every gunicorn worker writes its samples to that directory, and the
+# /metrics view aggregates the files of all of them.
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0,
+    10.0)
+
+REQUESTS = Counter(
+    'django_http_requests_total',
+    'Requests by route, method and status code.',
+    ['route', 'method', 'status'])
+REQUEST_LATENCY = Histogram(
+    'django_http_request_duration_seconds',
+    'Request latency by route and method.',
+    ['route', 'method'], buckets=LATENCY_BUCKETS)
+REQUESTS_IN_PROGRESS = Gauge(
+    'django_http_requests_in_progress',
+    'Requests being processed.',
+    multiprocess_mode='livesum')
+REQUEST_QUERIES = Histogram(
+    'django_http_request_db_queries',
+    'Database queries executed per request by route.',
+    ['route'], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+REQUEST_QUERY_TIME = Histogram(
+    'django_http_request_db_duration_seconds',
+    'Time spent in database queries per request by route.',
+    ['route'], buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter(
+    'django_cache_requests_total',
+    'Cache lookups by cache alias and result (hit or miss).',
+    ['cache', 'result'])
+PASSWORD_CHECK_TIME = Histogram(
+    'django_auth_password_check_seconds',
+    'Time spent checking (hashing) passwords on login.',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+
+
+class EmailQueueCollector:
+    """
+    Number of messages waiting in the queue of core.mail.QueuedEmailBackend,
+    read on each scrape.
+    """
+
+    def metric(self):
+        return GaugeMetricFamily(
+            'django_email_queue_depth',
+            'Emails waiting to be sent by the worker.')
+
+    def describe(self):
+        # without it, registering the collector would read the queue
+        return [self.metric()]
+
+    def collect(self):
+        from core.mail import get_email_queue
+
+        metric = self.metric()
+        metric.add_metric([], get_email_queue().depth())
+        yield metric
+
+
+EMAIL_QUEUE_COLLECTOR = EmailQueueCollector()
+REGISTRY.register(EMAIL_QUEUE_COLLECTOR)
+
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts the queries of a request and the
+    time spent running them.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - start
+
+
+def get_route(request):
+    """
+    Return the url pattern that matched ``request`` (e.g. ``users/<pk>/``),
+    used as label instead of the path to keep the number of series bounded.
+    """
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return 'unmatched'
+    return resolver_match.route or resolver_match.view_name
+
+
+def record_cache_lookup(alias, hits, misses):
+    if hits:
+        CACHE_REQUESTS.labels(alias, 'hit').inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(alias, 'miss').inc(misses)
+
+
+def export():
+    """
+    Return the body and content type of the metrics in the Prometheus text
+    format, aggregated across processes in multiprocess mode.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(EMAIL_QUEUE_COLLECTOR)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
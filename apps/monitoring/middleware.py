@@ -0,0 +1,297 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+
+from apps.monitoring import metrics
+from apps.monitoring.conf import get_config
+from apps.monitoring.models import RequestProfile
+from apps.monitoring.profiling import (
+    ProfileRecorder, format_python_profile, get_profile_writer,
+    start_python_profiler)
+from apps.monitoring.query_budget import (
+    BudgetReport, QueryBudgetExceeded, QueryRecorder, get_view_budget)
+from apps.monitoring.sampling import has_profiling_token, is_sampled
+from apps.monitoring.slow_queries import (
+    SlowQueryRecorder, get_slow_query_writer)
+from apps.monitoring.timing import DatabaseTimer, ServerTiming
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware:
+    """
+    Middleware that checks the number of queries executed by each request
+    against the budget declared by its view.
+
+    Views declare their budget with the ``query_budget`` decorator or the
+    ``max_queries`` attribute, views without one use
+    ``QUERY_BUDGET['DEFAULT_MAX_QUERIES']``. When a request goes over its
+    budget the duplicated queries (grouped by fingerprint) and the project
+    stack that triggered them are logged, or ``QueryBudgetExceeded`` is
+    raised if ``QUERY_BUDGET['ACTION']`` is ``'raise'``.
+
+    The middleware removes itself from the chain when
+    ``QUERY_BUDGET['ENABLED']`` is False, so it has no cost in production.
+    """
+
+    def __init__(self, get_response):
+        self.config = get_config('QUERY_BUDGET')
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(stack_depth=self.config['STACK_DEPTH'],
+                                 ignored_sql=self.config['IGNORED_SQL'])
+        request._query_budget = self.config['DEFAULT_MAX_QUERIES']
+
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        budget = request._query_budget
+        if budget is not None and recorder.count > budget:
+            report = BudgetReport(request.path, budget, recorder)
+            if self.config['ACTION'] == 'raise':
+                raise QueryBudgetExceeded(report)
+            logger.warning('Query budget exceeded: %s', report.describe())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = get_view_budget(view_func)
+        if budget is not None:
+            request._query_budget = budget
+
+
+class ProfilingMiddleware:
+    """
+    Middleware that profiles a sample of the requests.
+
+    A request is profiled when it is part of the random sample
+    (``PROFILING['SAMPLE_RATE']`` of the requests whose path starts with one
+    of ``PROFILING['PATHS']``) or when it carries a token created with
+    ``manage.py profiling_token`` in the ``X-Profile-Request`` header. The
+    rest of the requests only pay for that decision.
+
+    Profiles (timings, queries and optionally the cProfile stats) are saved
+    as RequestProfile rows in batches by a background thread, never in the
+    request itself.
+    """
+
+    def __init__(self, get_response):
+        self.config = get_config('PROFILING')
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        forced = has_profiling_token(request, self.config)
+        if not forced and not is_sampled(request.path, self.config):
+            return self.get_response(request)
+
+        recorder = ProfileRecorder(
+            max_queries=self.config['MAX_QUERIES'],
+            overhead_budget_ms=self.config['OVERHEAD_BUDGET_MS'])
+        profiler = None
+        started_at = timezone.now()
+        start = time.perf_counter()
+
+        with connection.execute_wrapper(recorder):
+            if self.config['PYTHON_PROFILER']:
+                profiler = start_python_profiler()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+
+        duration = time.perf_counter() - start
+        get_profile_writer().put(RequestProfile(
+            path=request.path[:255],
+            method=request.method,
+            status_code=response.status_code,
+            started_at=started_at,
+            duration_ms=duration * 1000,
+            query_count=recorder.count,
+            query_time_ms=recorder.time * 1000,
+            queries=recorder.queries,
+            python_profile=(format_python_profile(profiler)
+                            if profiler is not None else ''),
+            truncated=recorder.truncated,
+            forced=forced,
+        ))
+        return response
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware that measures the phases of each request and returns them in
+    the ``Server-Timing`` header, and in a JSON log line of the
+    ``apps.monitoring.timing`` logger.
+
+    The middleware measures the whole request (``total``), the view, the
+    queries (``db``, with their number in the description) and the rendering
+    of the response. Views measure their own phases (``auth`` with the
+    ServerTimingMixin, ``serialize`` in apps.commons, ...) with
+    ``get_timing(request).measure(name)``, which does nothing when the
+    middleware is disabled.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.config = get_config('SERVER_TIMING')
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.logger = logging.getLogger('apps.monitoring.timing')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django runs the sync hooks of an async chain in a thread
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = ServerTiming()
+        request.server_timing = timing
+        start = time.perf_counter()
+
+        with connection.execute_wrapper(DatabaseTimer(timing)):
+            response = self.get_response(request)
+        return self.finish(request, response, start)
+
+    async def __acall__(self, request):
+        # the queries of the async views run in other threads, out of reach
+        # of the DatabaseTimer of this one: there is no db phase
+        request.server_timing = ServerTiming()
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        return self.finish(request, response, start)
+
+    def finish(self, request, response, start):
+        timing = request.server_timing
+        end = time.perf_counter()
+        view_start = getattr(request, '_timing_view_start', None)
+        if view_start is not None and 'view' not in timing.durations:
+            timing.add('view', end - view_start)
+        timing.add('total', end - start)
+
+        if self.config['HEADER']:
+            header = timing.header()
+            if response.has_header('Server-Timing'):
+                header = f'{response["Server-Timing"]}, {header}'
+            response['Server-Timing'] = header
+        if self.config['LOG']:
+            self.logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'timing': timing.as_dict(),
+            }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing_view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns and after this
+        # hook, the end of the rendering is known from a post render callback
+        timing = request.server_timing
+        render_start = time.perf_counter()
+        view_start = getattr(request, '_timing_view_start', None)
+        if view_start is not None:
+            timing.add('view', render_start - view_start)
+
+        def measure_render(rendered):
+            timing.add('render', time.perf_counter() - render_start)
+
+        response.add_post_render_callback(measure_render)
+        return response
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return type(self).process_view(
+            self, request, view_func, view_args, view_kwargs)
+
+    async def aprocess_template_response(self, request, response):
+        return type(self).process_template_response(
+            self, request, response)
+
+
+class MetricsMiddleware:
+    """
+    Middleware that records the Prometheus metrics of each request: latency,
+    status code, requests in progress and number/time of the queries, all of
+    them by route (the url pattern, not the path).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_config('METRICS')['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = metrics.QueryCounter()
+        start = time.perf_counter()
+
+        with metrics.REQUESTS_IN_PROGRESS.track_inprogress():
+            with connection.execute_wrapper(counter):
+                response = self.get_response(request)
+
+        route = self.observe(request, response, start)
+        metrics.REQUEST_QUERIES.labels(route).observe(counter.count)
+        metrics.REQUEST_QUERY_TIME.labels(route).observe(counter.time)
+        return response
+
+    async def __acall__(self, request):
+        # the queries of the async views are not counted, they run in other
+        # threads
+        start = time.perf_counter()
+        with metrics.REQUESTS_IN_PROGRESS.track_inprogress():
+            response = await self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    def observe(self, request, response, start):
+        route = metrics.get_route(request)
+        metrics.REQUEST_LATENCY.labels(route, request.method).observe(
+            time.perf_counter() - start)
+        metrics.REQUESTS.labels(
+            route, request.method, response.status_code).inc()
+        return route
+
+
+class SlowQueryMiddleware:
+    """
+    Middleware that saves the queries slower than
+    ``SLOW_QUERIES['THRESHOLD_MS']`` as SlowQuery rows, with the view, path
+    and stack that executed them. A sample of them (only SELECT) gets its
+    EXPLAIN, run out of the request by the background writer.
+
+    Use ``manage.py slow_query_report`` to see them grouped by fingerprint.
+    """
+
+    def __init__(self, get_response):
+        self.config = get_config('SLOW_QUERIES')
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = SlowQueryRecorder(
+            request, self.config, get_slow_query_writer())
+        with connection.execute_wrapper(recorder):
+            return self.get_response(request)
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField(default=0)),
+                ('query_time_ms', models.FloatField(default=0)),
+                ('queries', models.JSONField(blank=True, default=list)),
+                ('python_profile', models.TextField(blank=True)),
+                ('truncated', models.BooleanField(default=False)),
+                ('forced', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'request_profiles',
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import models
+
+
+class RequestProfile(models.Model):
+    """
+    Profile of a sampled request, saved by ProfilingMiddleware.
+    """
+    path = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    started_at = models.DateTimeField(db_index=True)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    query_time_ms = models.FloatField(default=0)
+    # [{'sql': ..., 'time_ms': ...}, ...] up to PROFILING['MAX_QUERIES']
+    queries = models.JSONField(default=list, blank=True)
+    python_profile = models.TextField(blank=True)
+    # the recording stopped because it went over the overhead budget
+    truncated = models.BooleanField(default=False)
+    # profiled because of a signed header instead of the random sample
+    forced = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'request_profiles'
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.1f} ms)'
+
+
+class SlowQuery(models.Model):
+    """
+    Query that took longer than SLOW_QUERIES['THRESHOLD_MS'], saved by
+    SlowQueryMiddleware. See `manage.py slow_query_report`.
+    """
+    # identifier of the normalized sql, used to group the same query
+    fingerprint = models.CharField(max_length=12, db_index=True)
+    # the statement with placeholders, parameters are never saved
+    sql = models.TextField()
+    duration_ms = models.FloatField()
+    view = models.CharField(max_length=255, blank=True)
+    path = models.CharField(max_length=255, blank=True)
+    # project frames that executed the query, the last one is the origin
+    stack = models.TextField(blank=True)
+    # EXPLAIN output, only for a sample of the queries
+    plan = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'slow_queries'
+
+    def __str__(self):
+        return f'[{self.fingerprint}] {self.duration_ms:.1f} ms'
@@ -0,0 +1,77 @@
+import cProfile
+import io
+import pstats
+import time
+
+from apps.monitoring.conf import get_config
+from apps.monitoring.models import RequestProfile
+from apps.monitoring.writer import BatchWriter
+
+_writer = None
+
+
+def get_profile_writer():
+    """
+    Return the BatchWriter shared by every request of the process.
+    """
+    global _writer
+    if _writer is None:
+        config = get_config('PROFILING')
+        _writer = BatchWriter(
+            RequestProfile,
+            batch_size=config['BATCH_SIZE'],
+            flush_interval=config['FLUSH_INTERVAL'],
+            max_queue_size=config['MAX_QUEUE_SIZE'],
+            background=config['BACKGROUND_WRITER'],
+        )
+    return _writer
+
+
+class ProfileRecorder:
+    """
+    Database execute wrapper that records the queries of a profiled request.
+
+    The time spent by the recorder itself is measured, and once it goes over
+    ``overhead_budget_ms`` (or ``max_queries`` are recorded) the statements
+    are no longer kept, only counted, and the profile is marked as truncated.
+    """
+
+    def __init__(self, max_queries=200, overhead_budget_ms=5):
+        self.max_queries = max_queries
+        self.overhead_budget = overhead_budget_ms / 1000
+        self.overhead = 0
+        self.count = 0
+        self.time = 0
+        self.queries = []
+        self.truncated = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.count += 1
+            self.time += end - start
+            if not self.truncated:
+                self.queries.append(
+                    {'sql': sql, 'time_ms': round((end - start) * 1000, 3)})
+                self.overhead += time.perf_counter() - end
+                self.truncated = (len(self.queries) >= self.max_queries
+                                  or self.overhead > self.overhead_budget)
+
+
+def format_python_profile(profiler, limit=40):
+    """
+    Return the ``limit`` most expensive functions of a cProfile run as text.
+    """
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+
+def start_python_profiler():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
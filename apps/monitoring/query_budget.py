@@ -0,0 +1,152 @@
+import os
+import traceback
+from collections import OrderedDict
+
+from django.conf import settings
+
+from apps.monitoring.sql import fingerprint, normalize_sql
+
+# frames from these files are never interesting when looking for the code
+# that triggered a query
+_IGNORED_PATHS = tuple(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('query_budget.py', 'slow_queries.py', 'middleware.py'))
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised when a request executes more queries than its view allows.
+    """
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(report.describe())
+
+
+def query_budget(max_queries):
+    """
+    Declare the maximum number of queries a view may run per request.
+
+    It works for function based views and for class based views (APIView,
+    ViewSet, ...), in the latter case it is the same as setting the
+    ``max_queries`` attribute in the class.
+
+    Example:
+        ```
+        @query_budget(4)
+        class UserViewSet(ListModelMixin, viewsets.GenericViewSet):
+            ...
+        ```
+    """
+    def decorator(view):
+        view.max_queries = max_queries
+        return view
+    return decorator
+
+
+def get_view_budget(view_func):
+    """
+    Return the budget declared by a resolved view, or None.
+
+    ``as_view()`` returns a new function, so the budget of class based views
+    is looked up in the class kept by Django (``view_class``) and DRF
+    (``cls``).
+    """
+    budget = getattr(view_func, 'max_queries', None)
+    if budget is not None:
+        return budget
+    view_class = getattr(view_func, 'cls', None) or getattr(
+        view_func, 'view_class', None)
+    return getattr(view_class, 'max_queries', None)
+
+
+def is_ignored(sql, ignored_sql):
+    """
+    Return True if ``sql`` must not be counted against the budget.
+    """
+    return any(pattern in sql for pattern in ignored_sql)
+
+
+def project_stack(depth):
+    """
+    Return the last ``depth`` frames of the current stack that belong to the
+    project (third party packages and this module are skipped).
+    """
+    root = str(settings.BASE_DIR.parent)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(root)
+        and not frame.filename.startswith(_IGNORED_PATHS)
+    ]
+    return traceback.format_list(frames[-depth:])
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts the queries of a request and groups
+    them by fingerprint.
+
+    Example:
+        ```
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            do_queries()
+        recorder.count
+        ```
+    """
+
+    def __init__(self, stack_depth=8, ignored_sql=()):
+        self.stack_depth = stack_depth
+        self.ignored_sql = ignored_sql
+        self.count = 0
+        self.queries = OrderedDict()
+
+    def __call__(self, execute, sql, params, many, context):
+        if is_ignored(sql, self.ignored_sql):
+            return execute(sql, params, many, context)
+
+        self.count += 1
+        key = fingerprint(sql)
+        entry = self.queries.get(key)
+        if entry is None:
+            # the stack is only captured the first time a query is seen
+            self.queries[key] = {
+                'sql': normalize_sql(sql),
+                'count': 1,
+                'stack': project_stack(self.stack_depth),
+            }
+        else:
+            entry['count'] += 1
+        return execute(sql, params, many, context)
+
+    def duplicates(self):
+        """
+        Return ``(fingerprint, entry)`` pairs of the queries executed more
+        than once, most repeated first.
+        """
+        repeated = [item for item in self.queries.items()
+                    if item[1]['count'] > 1]
+        return sorted(repeated, key=lambda item: -item[1]['count'])
+
+
+class BudgetReport:
+    """
+    Summary of a request that went over its query budget.
+    """
+
+    def __init__(self, path, budget, recorder):
+        self.path = path
+        self.budget = budget
+        self.count = recorder.count
+        self.duplicates = recorder.duplicates()
+
+    def describe(self):
+        lines = [
+            f'{self.path} executed {self.count} queries '
+            f'(budget: {self.budget})'
+        ]
+        for key, entry in self.duplicates:
+            lines.append(f'  [{key}] x{entry["count"]}: {entry["sql"]}')
+            lines.extend(
+                '    ' + line for line in ''.join(entry['stack']).splitlines())
+        return '\n'.join(lines)
@@ -0,0 +1,55 @@
+import random
+
+from django.core import signing
+
+from apps.monitoring.conf import get_config
+
+# this module does not import models, so it can be used from the settings
+# (e.g. SILKY_INTERCEPT_FUNC)
+
+SIGNING_SALT = 'apps.monitoring.profiling'
+
+
+def create_profiling_token():
+    """
+    Create a signed token that forces the profile of the requests sending it
+    in the ``X-Profile-Request`` header, until ``TOKEN_MAX_AGE`` expires.
+    """
+    return signing.dumps('profile', salt=SIGNING_SALT)
+
+
+def has_profiling_token(request, config):
+    """
+    Return True if the request carries a valid (and not expired) token.
+    """
+    token = request.META.get(config['HEADER'])
+    if not token:
+        return False
+    try:
+        signing.loads(token, salt=SIGNING_SALT,
+                      max_age=config['TOKEN_MAX_AGE'])
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def is_sampled(path, config):
+    """
+    Decide if a request to ``path`` is part of the random sample.
+    """
+    if config['SAMPLE_RATE'] <= 0:
+        return False
+    if config['PATHS'] and not path.startswith(tuple(config['PATHS'])):
+        return False
+    return random.random() < config['SAMPLE_RATE']
+
+
+def should_profile(request, config=None):
+    """
+    Return True if ``request`` must be profiled, either because it was
+    sampled or because it carries a valid profiling token.
+    """
+    if config is None:
+        config = get_config('PROFILING')
+    return (has_profiling_token(request, config)
+            or is_sampled(request.path, config))
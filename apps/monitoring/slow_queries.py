@@ -0,0 +1,137 @@
+import logging
+import random
+import time
+
+from django.db import connection, transaction
+
+from apps.monitoring.conf import get_config
+from apps.monitoring.models import SlowQuery
+from apps.monitoring.query_budget import project_stack
+from apps.monitoring.sql import fingerprint, normalize_sql
+from apps.monitoring.writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+_writer = None
+
+
+def is_explainable(sql):
+    """
+    Only SELECT statements are explained, EXPLAIN ANALYZE runs the query.
+    """
+    return sql.lstrip().upper().startswith('SELECT')
+
+
+def explain(sql, params, analyze=True, timeout_ms=5000):
+    """
+    Return the plan of a query as text.
+
+    In PostgreSQL it runs ``EXPLAIN (ANALYZE, BUFFERS)`` (or a plain EXPLAIN
+    if ``analyze`` is False) with a statement timeout, in a transaction that
+    is always rolled back.
+    """
+    options = {}
+    if connection.vendor == 'postgresql' and analyze:
+        options = {'analyze': True, 'buffers': True}
+    prefix = connection.ops.explain_query_prefix(**options)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SET LOCAL statement_timeout = %s', [int(timeout_ms)])
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+        transaction.set_rollback(True)
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+class SlowQueryWriter(BatchWriter):
+    """
+    BatchWriter that runs the EXPLAIN of the sampled slow queries before
+    saving them, in the background thread instead of the request.
+    """
+
+    def __init__(self, *args, analyze=True, timeout_ms=5000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.analyze = analyze
+        self.timeout_ms = timeout_ms
+
+    def prepare(self, batch):
+        for slow_query in batch:
+            params = getattr(slow_query, 'explain_params', None)
+            if params is None:
+                continue
+            try:
+                slow_query.plan = explain(
+                    slow_query.sql, params, analyze=self.analyze,
+                    timeout_ms=self.timeout_ms)
+            except Exception as error:
+                slow_query.plan = f'EXPLAIN failed: {error}'
+
+
+def get_slow_query_writer():
+    """
+    Return the SlowQueryWriter shared by every request of the process.
+    """
+    global _writer
+    if _writer is None:
+        config = get_config('SLOW_QUERIES')
+        _writer = SlowQueryWriter(
+            SlowQuery,
+            batch_size=config['BATCH_SIZE'],
+            flush_interval=config['FLUSH_INTERVAL'],
+            max_queue_size=config['MAX_QUEUE_SIZE'],
+            background=config['BACKGROUND_WRITER'],
+            analyze=config['EXPLAIN_ANALYZE'],
+            timeout_ms=config['EXPLAIN_TIMEOUT_MS'],
+        )
+    return _writer
+
+
+def get_view_name(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return ''
+    return resolver_match.view_name or resolver_match.route
+
+
+class SlowQueryRecorder:
+    """
+    Database execute wrapper that queues the queries of a request slower
+    than ``SLOW_QUERIES['THRESHOLD_MS']``, with the view and the stack that
+    executed them.
+    """
+
+    def __init__(self, request, config, writer):
+        self.request = request
+        self.config = config
+        self.threshold = config['THRESHOLD_MS'] / 1000
+        self.writer = writer
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold:
+                self.record(sql, params, many, duration)
+
+    def record(self, sql, params, many, duration):
+        slow_query = SlowQuery(
+            fingerprint=fingerprint(sql),
+            sql=normalize_sql(sql) if many else sql,
+            duration_ms=duration * 1000,
+            view=get_view_name(self.request)[:255],
+            path=self.request.path[:255],
+            stack=''.join(project_stack(self.config['STACK_DEPTH'])),
+        )
+        sampled = random.random() < self.config['EXPLAIN_SAMPLE_RATE']
+        if sampled and not many and is_explainable(sql):
+            # kept in memory only for the EXPLAIN, never saved
+            slow_query.explain_params = params
+        self.writer.put(slow_query)
+        logger.warning('Slow query (%.1f ms) in %s: %s',
+                       slow_query.duration_ms, slow_query.path,
+                       slow_query.sql)
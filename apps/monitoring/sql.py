@@ -0,0 +1,32 @@
+import hashlib
+import re
+
+# literals are replaced by a placeholder so that queries which only differ by
+# their parameters share the same fingerprint
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAM_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """
+    Normalize a SQL statement, removing literals and collapsing whitespace.
+
+    ``IN (...)`` lists are collapsed to a single placeholder, so the same
+    query executed with a different number of ids is still grouped together.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PARAM_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACES_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    """
+    Return a short, stable identifier for the normalized form of ``sql``.
+    """
+    normalized = normalize_sql(sql)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12]
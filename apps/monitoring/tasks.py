@@ -0,0 +1,28 @@
+"""
+Maintenance tasks of the profiling data, it grows with every sampled
+request.
+"""
+
+import datetime
+
+from django.utils import timezone
+from silk.models import Request
+
+from apps.monitoring.models import RequestProfile, SlowQuery
+from core.maintenance import maintenance_task
+
+
+@maintenance_task
+def purge_profiles(run):
+    """
+    Delete the silk requests (with their queries and profiles), the
+    request profiles and the slow queries older than
+    ``MAINTENANCE['PROFILE_RETENTION_DAYS']``.
+    """
+    since = timezone.now() - datetime.timedelta(
+        days=run.config['PROFILE_RETENTION_DAYS'])
+    return (
+        run.delete(Request.objects.filter(start_time__lt=since))
+        + run.delete(RequestProfile.objects.filter(started_at__lt=since))
+        + run.delete(SlowQuery.objects.filter(created_at__lt=since))
+    )
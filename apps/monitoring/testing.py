@@ -0,0 +1,53 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.monitoring.conf import get_config
+from apps.monitoring.query_budget import is_ignored
+
+
+class QueryCountAssertionsMixin:
+    """
+    TestCase mixin with assertions about the number of queries of a request.
+
+    Example:
+        ```
+        class UserViewSetTestCase(QueryCountAssertionsMixin, TestCase):
+
+            def test_list_queries(self):
+                self.assertQueriesConstant(
+                    lambda size: self.client.get(f'/users/?limit={size}'),
+                    sizes=(1, 5, 10))
+        ```
+    """
+
+    def count_queries(self, func, *args, **kwargs):
+        """
+        Call ``func`` and return the number of queries it executed, the
+        queries in ``QUERY_BUDGET['IGNORED_SQL']`` are not counted.
+        """
+        ignored_sql = get_config('QUERY_BUDGET')['IGNORED_SQL']
+        with CaptureQueriesContext(connection) as context:
+            func(*args, **kwargs)
+        return len([query for query in context.captured_queries
+                    if not is_ignored(query['sql'], ignored_sql)])
+
+    def assertQueriesConstant(self, func, sizes):
+        """
+        Assert that ``func(size)`` runs the same number of queries for every
+        value of ``sizes``, i.e. that there is no query per row (N+1).
+        """
+        counts = {size: self.count_queries(func, size) for size in sizes}
+        if len(set(counts.values())) > 1:
+            self.fail(
+                'Number of queries depends on the page size '
+                f'(size: queries): {counts}')
+        return counts
+
+    def assertQueriesAtMost(self, limit, func, *args, **kwargs):
+        """
+        Assert that ``func`` runs at most ``limit`` queries.
+        """
+        count = self.count_queries(func, *args, **kwargs)
+        if count > limit:
+            self.fail(f'{count} queries executed, expected at most {limit}')
+        return count
@@ -0,0 +1,263 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from apps.monitoring import profiling, slow_queries
+from apps.monitoring.cache import InstrumentedLocMemCache
+from apps.monitoring.middleware import (
+    ProfilingMiddleware, QueryBudgetMiddleware, SlowQueryMiddleware)
+from apps.monitoring.models import RequestProfile, SlowQuery
+from apps.monitoring.query_budget import QueryBudgetExceeded, query_budget
+from apps.monitoring.sampling import create_profiling_token
+from apps.monitoring.timing import NULL_TIMING, get_timing
+from apps.monitoring.sql import fingerprint, normalize_sql
+from apps.user.models import User
+from core.handlers import PathDispatchWSGIHandler
+
+
+class SqlFingerprintTests(TestCase):
+    """Test for the normalization of sql statements"""
+
+    def test_literals_are_removed(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE a = 'x'  AND b = 10"),
+            'SELECT * FROM t WHERE a = ? AND b = ?')
+
+    def test_in_lists_share_fingerprint(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'))
+
+
+@query_budget(1)
+def n_plus_one_view(request):
+    for index in range(3):
+        list(User.objects.filter(username=f'user{index}'))
+    return HttpResponse()
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    """Test for the query budget middleware"""
+
+    def call_middleware(self):
+        def get_response(request):
+            middleware.process_view(request, n_plus_one_view, (), {})
+            return n_plus_one_view(request)
+
+        middleware = QueryBudgetMiddleware(get_response)
+        return middleware(RequestFactory().get('/users/'))
+
+    @override_settings(QUERY_BUDGET={'ENABLED': True, 'ACTION': 'raise'})
+    def test_raise_when_budget_exceeded(self):
+        with self.assertRaises(QueryBudgetExceeded) as context:
+            self.call_middleware()
+        report = context.exception.report
+        self.assertEqual(report.count, 3)
+        # the three queries have the same fingerprint
+        self.assertEqual(len(report.duplicates), 1)
+        self.assertEqual(report.duplicates[0][1]['count'], 3)
+
+    @override_settings(QUERY_BUDGET={'ENABLED': True, 'ACTION': 'log'})
+    def test_log_when_budget_exceeded(self):
+        with self.assertLogs('apps.monitoring.middleware', 'WARNING'):
+            self.call_middleware()
+
+
+def list_users_view(request):
+    list(User.objects.all())
+    return HttpResponse()
+
+
+PROFILING = {'ENABLED': True, 'BACKGROUND_WRITER': False}
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Test for the sampled profiling middleware"""
+
+    def setUp(self):
+        # every test gets its own writer (and queue)
+        profiling._writer = None
+
+    def call_middleware(self, path='/users/', **headers):
+        middleware = ProfilingMiddleware(list_users_view)
+        return middleware(RequestFactory().get(path, **headers))
+
+    def saved_profiles(self):
+        profiling.get_profile_writer().flush()
+        return RequestProfile.objects.all()
+
+    @override_settings(PROFILING={**PROFILING, 'SAMPLE_RATE': 1.0})
+    def test_sampled_request_is_saved_in_batch(self):
+        self.call_middleware()
+        # nothing is written until the writer flushes its queue
+        self.assertFalse(RequestProfile.objects.exists())
+
+        profile = self.saved_profiles().get()
+        self.assertEqual(profile.path, '/users/')
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(profile.query_count, 1)
+        self.assertFalse(profile.forced)
+
+    @override_settings(PROFILING={
+        **PROFILING, 'SAMPLE_RATE': 1.0, 'PATHS': ['/api/']})
+    def test_path_not_allowed_is_not_sampled(self):
+        self.call_middleware('/users/')
+        self.assertFalse(self.saved_profiles().exists())
+
+    @override_settings(PROFILING=PROFILING)
+    def test_signed_header_forces_profile(self):
+        self.call_middleware(HTTP_X_PROFILE_REQUEST='invalid')
+        self.assertFalse(self.saved_profiles().exists())
+
+        self.call_middleware(HTTP_X_PROFILE_REQUEST=create_profiling_token())
+        self.assertTrue(self.saved_profiles().get().forced)
+
+    @override_settings(PROFILING={
+        **PROFILING, 'SAMPLE_RATE': 1.0, 'MAX_QUERIES': 1})
+    def test_recording_stops_at_budget(self):
+        def view(request):
+            list(User.objects.all())
+            list(User.objects.all())
+            return HttpResponse()
+
+        ProfilingMiddleware(view)(RequestFactory().get('/users/'))
+        profile = self.saved_profiles().get()
+        self.assertTrue(profile.truncated)
+        self.assertEqual(profile.query_count, 2)
+        self.assertEqual(len(profile.queries), 1)
+
+
+@override_settings(SERVER_TIMING={'ENABLED': True, 'LOG': True})
+class ServerTimingMiddlewareTests(TestCase):
+    """Test for the Server-Timing header"""
+
+    def test_phases_of_api_response(self):
+        user = User.objects.create(email='admin@gmail.com', username='admin')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with self.assertLogs('apps.monitoring.timing', 'INFO'):
+            response = client.get('/users/')
+
+        phases = [metric.split(';')[0]
+                  for metric in response['Server-Timing'].split(', ')]
+        for phase in ('auth', 'db', 'serialize', 'view', 'render', 'total'):
+            self.assertIn(phase, phases)
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    def test_password_phase_not_in_header(self):
+        user = User.objects.create(email='admin@gmail.com', username='admin')
+        user.set_password('F12345678@')
+        user.save()
+
+        with self.assertLogs('apps.monitoring.timing', 'INFO') as logs:
+            response = APIClient().post(
+                '/api/token/', {'email': 'admin@gmail.com',
+                                'password': 'wrong'}, format='json')
+
+        # the header would tell that the account exists
+        self.assertNotIn('password;', response['Server-Timing'])
+        self.assertIn('"password"', logs.output[0])
+
+    def test_null_timing_without_middleware(self):
+        request = RequestFactory().get('/users/')
+        self.assertIs(get_timing(request), NULL_TIMING)
+        with get_timing(request).measure('serialize'):
+            pass
+
+
+@override_settings(METRICS={
+    'ENABLED': True, 'TOKEN': 'secret', 'ALLOWED_NETWORKS': []})
+class MetricsTests(TestCase):
+    """Test for the Prometheus metrics"""
+
+    def test_metrics_are_protected(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    def test_request_metrics_by_route(self):
+        self.client.get('/users/')
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'django_http_requests_total{method="GET",route="^users/$",'
+            'status="401"}', body)
+        self.assertIn('django_http_request_duration_seconds_bucket', body)
+
+    def test_cache_hits_and_misses(self):
+        def lookups(result):
+            return REGISTRY.get_sample_value(
+                'django_cache_requests_total',
+                {'cache': 'test', 'result': result}) or 0
+
+        cache = InstrumentedLocMemCache('metrics-test', {'ALIAS': 'test'})
+        initial = lookups('hit'), lookups('miss')
+
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertIsNone(cache.get('other'))
+        self.assertEqual(cache.get_many(['key', 'other']), {'key': 'value'})
+
+        self.assertEqual(lookups('hit') - initial[0], 2)
+        self.assertEqual(lookups('miss') - initial[1], 2)
+
+
+@override_settings(SLOW_QUERIES={
+    'ENABLED': True, 'THRESHOLD_MS': 0, 'EXPLAIN_SAMPLE_RATE': 1.0,
+    'BACKGROUND_WRITER': False})
+class SlowQueryTests(TestCase):
+    """Test for the slow query log"""
+
+    def setUp(self):
+        slow_queries._writer = None
+
+    def test_slow_queries_are_saved_with_plan(self):
+        SlowQueryMiddleware(list_users_view)(RequestFactory().get('/users/'))
+        slow_queries.get_slow_query_writer().flush()
+
+        slow_query = SlowQuery.objects.get()
+        self.assertTrue(slow_query.sql.startswith('SELECT'))
+        self.assertEqual(slow_query.path, '/users/')
+        self.assertIn('list_users_view', slow_query.stack)
+        self.assertNotEqual(slow_query.plan, '')
+        self.assertNotIn('failed', slow_query.plan)
+
+    def test_report_groups_by_fingerprint(self):
+        for _ in range(2):
+            SlowQueryMiddleware(list_users_view)(
+                RequestFactory().get('/users/'))
+        slow_queries.get_slow_query_writer().flush()
+
+        output = StringIO()
+        call_command('slow_query_report', '--plans', stdout=output)
+        self.assertIn('2 queries', output.getvalue())
+        self.assertIn('plan:', output.getvalue())
+
+
+class PathDispatchHandlerTests(TestCase):
+    """Test for the lean middleware chain of the API"""
+
+    def test_api_paths_skip_browser_middleware(self):
+        handler = PathDispatchWSGIHandler()
+        factory = RequestFactory(SERVER_NAME='localhost')
+
+        api_request = factory.get('/users/')
+        response = handler.get_response(api_request)
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(hasattr(api_request, 'session'))
+
+        admin_request = factory.get('/admin/login/')
+        response = handler.get_response(admin_request)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(hasattr(admin_request, 'session'))
@@ -0,0 +1,142 @@
+import time
+from collections import OrderedDict
+
+
+class _Measure:
+    """
+    Context manager that adds the time spent inside it to a phase.
+    """
+    __slots__ = ('timing', 'name', 'start')
+
+    def __init__(self, timing, name):
+        self.timing = timing
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timing.add(self.name, time.perf_counter() - self.start)
+
+
+class ServerTiming:
+    """
+    Durations of the phases of a request (auth, db, serialize, render...).
+
+    A phase measured more than once accumulates its durations. A private
+    phase is logged but not sent in the header, its presence would tell the
+    client something (the password check only happens for an existing
+    account).
+
+    Example:
+        ```
+        timing = get_timing(request)
+        with timing.measure('serialize'):
+            data = serializer.data
+        ```
+    """
+
+    def __init__(self):
+        self.durations = OrderedDict()
+        self.descriptions = {}
+        self.private = set()
+
+    def measure(self, name):
+        return _Measure(self, name)
+
+    def add(self, name, duration, description=None, private=False):
+        """
+        Add ``duration`` seconds to the phase ``name``.
+        """
+        self.durations[name] = self.durations.get(name, 0) + duration
+        if description is not None:
+            self.descriptions[name] = description
+        if private:
+            self.private.add(name)
+
+    def as_dict(self):
+        """
+        Return the durations in milliseconds.
+        """
+        return {name: round(duration * 1000, 3)
+                for name, duration in self.durations.items()}
+
+    def header(self):
+        """
+        Return the value of the ``Server-Timing`` header.
+        """
+        metrics = []
+        for name, duration in self.durations.items():
+            if name in self.private:
+                continue
+            metric = f'{name};dur={duration * 1000:.1f}'
+            if name in self.descriptions:
+                metric += f';desc="{self.descriptions[name]}"'
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+
+class _NullMeasure:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class NullTiming:
+    """
+    ServerTiming used when the instrumentation is disabled, it does nothing.
+    """
+    _measure = _NullMeasure()
+
+    def measure(self, name):
+        return self._measure
+
+    def add(self, name, duration, description=None, private=False):
+        pass
+
+
+NULL_TIMING = NullTiming()
+
+
+def get_timing(request):
+    """
+    Return the ServerTiming of ``request`` (a Django or DRF request), or a
+    NullTiming if the request is not being measured.
+    """
+    return getattr(request, 'server_timing', NULL_TIMING)
+
+
+class DatabaseTimer:
+    """
+    Database execute wrapper that adds the time and number of the queries to
+    the ``db`` phase of a ServerTiming.
+    """
+
+    def __init__(self, timing):
+        self.timing = timing
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.timing.add('db', time.perf_counter() - start,
+                            f'{self.count} queries')
+
+
+class ServerTimingMixin:
+    """
+    APIView mixin that measures the authentication of the request in the
+    ``auth`` phase of its ServerTiming.
+    """
+
+    def perform_authentication(self, request):
+        with get_timing(request).measure('auth'):
+            super().perform_authentication(request)
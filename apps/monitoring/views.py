@@ -0,0 +1,35 @@
+import ipaddress
+import secrets
+
+from django.http import HttpResponse, HttpResponseForbidden
+
+from apps.monitoring import metrics
+from apps.monitoring.conf import get_config
+
+
+def is_metrics_client(request, config):
+    """
+    Return True if ``request`` sends the metrics token or comes from one of
+    the allowed networks.
+    """
+    token = config['TOKEN']
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and secrets.compare_digest(authorization, f'Bearer {token}'):
+        return True
+
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network)
+               for network in config['ALLOWED_NETWORKS'])
+
+
+def metrics_view(request):
+    """
+    Metrics in the Prometheus text format, for the scraper only.
+    """
+    if not is_metrics_client(request, get_config('METRICS')):
+        return HttpResponseForbidden()
+    body, content_type = metrics.export()
+    return HttpResponse(body, content_type=content_type)
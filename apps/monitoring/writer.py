@@ -0,0 +1,110 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """
+    Save model instances in batches from a background thread, so the request
+    that produced them does not wait for the database.
+
+    Instances are kept in a bounded queue, when it is full new instances are
+    dropped (and counted in ``dropped``) instead of blocking the request. The
+    thread is started with the first instance and again after a fork, so it
+    is safe to create the writer before gunicorn forks its workers.
+
+    Example:
+        ```
+        writer = BatchWriter(RequestProfile, batch_size=50)
+        writer.put(RequestProfile(path='/users/', ...))
+        ```
+    """
+
+    def __init__(self, model, batch_size=50, flush_interval=2.0,
+                 max_queue_size=1000, background=True):
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def put(self, instance):
+        """
+        Queue ``instance`` to be saved with the next batch.
+        """
+        try:
+            self.queue.put_nowait(instance)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.background:
+            self._ensure_thread()
+            if self.queue.qsize() >= self.batch_size:
+                self._wakeup.set()
+
+    def flush(self):
+        """
+        Save every queued instance in the calling thread and return how many
+        were saved.
+        """
+        saved = 0
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch:
+                return saved
+            try:
+                self.prepare(batch)
+                self.model.objects.bulk_create(batch)
+                saved += len(batch)
+            except Exception:
+                logger.exception('Could not save %d %s', len(batch),
+                                 self.model._meta.verbose_name_plural)
+
+    def prepare(self, batch):
+        """
+        Hook to complete the instances of a batch before they are saved, it
+        runs out of the request (in the background thread).
+        """
+
+    def _take(self, size):
+        batch = []
+        while len(batch) < size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name=f'{self.model.__name__}Writer',
+                daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # the thread has its own connection, do not keep it idle
+                connection.close()
@@ -0,0 +1,43 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.openapi import FORMATS, generate_schema, get_schema_path
+
+
+class Command(BaseCommand):
+    help = ('Generate the OpenAPI schema (JSON and YAML) served by '
+            'swagger.json/, swagger.yaml/ and the swagger and redoc UIs.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Do not write the files, fail if they are missing or out '
+                 'of date (the urls or serializers changed).')
+
+    def handle(self, *args, **options):
+        stale = []
+        for format in FORMATS:
+            content = generate_schema(format)
+            path = get_schema_path(format)
+            try:
+                with open(path, 'rb') as schema_file:
+                    current = schema_file.read()
+            except FileNotFoundError:
+                current = None
+
+            if content == current:
+                self.stdout.write(f'{path} is up to date.')
+                continue
+            if options['check']:
+                stale.append(path)
+                continue
+            os.makedirs(settings.OPENAPI_SCHEMA_DIR, exist_ok=True)
+            with open(path, 'wb') as schema_file:
+                schema_file.write(content)
+            self.stdout.write(self.style.SUCCESS(f'{path} written.'))
+
+        if stale:
+            raise CommandError(
+                f'Out of date: {", ".join(stale)}, run generate_openapi_schema.')
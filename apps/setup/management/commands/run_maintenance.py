@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = ('Run the maintenance tasks of CELERY_BEAT_SCHEDULE now, in this '
+            'process (or in the worker with --queue), and report the rows '
+            'each one processed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*', metavar='name',
+            help='Entries of CELERY_BEAT_SCHEDULE to run (default: all).')
+        parser.add_argument(
+            '--list', action='store_true',
+            help='List the entries and their tasks.')
+        parser.add_argument(
+            '--queue', action='store_true',
+            help='Send the tasks to the worker instead of running them.')
+
+    def handle(self, *args, **options):
+        schedule = settings.CELERY_BEAT_SCHEDULE
+        if options['list']:
+            for name, entry in schedule.items():
+                self.stdout.write(f'{name}: {entry["task"]}')
+            return
+
+        names = options['names'] or list(schedule)
+        unknown = [name for name in names if name not in schedule]
+        if unknown:
+            raise CommandError(
+                f'Unknown: {", ".join(unknown)}, see run_maintenance --list.')
+
+        for name in names:
+            task = import_string(schedule[name]['task'])
+            if options['queue']:
+                task.delay()
+                self.stdout.write(f'{name}: sent.')
+                continue
+            count = task()
+            if count is None:
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: already running, skipped.'))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name}: {count} rows processed.'))
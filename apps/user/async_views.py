@@ -0,0 +1,120 @@
+"""
+Async variants of the user views, served under ``api/async/``.
+
+They are plain Django async views: under ASGI they run on the event loop
+without the sync_to_async hop of the DRF views, the queries go through the
+async ORM. The list has the envelope of the DRF views (limit/offset
+pagination) with at most ``MAX_LIMIT`` users a page: it is built in memory,
+the big pages are for the streamed DRF list. The views have the
+DEFAULT_THROTTLE_CLASSES of the DRF ones (core.throttling.athrottle).
+
+The users are serialized with ListUserSerializer, not with the
+CreateUserSerializer of ``/users/``: the async variants have the
+``full_name`` and ``photo_thumbnails`` of the other lists (login, websocket)
+and never the password hash.
+"""
+
+from django.http import HttpResponseNotAllowed
+from rest_framework import status
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from apps.commons import json_response
+from apps.jwt_custom_auth.async_authentication import authenticated
+from apps.monitoring.timing import get_timing
+from apps.user.models import User
+from apps.user.serializers import ListUserSerializer
+from core.throttling import athrottle
+
+MAX_LIMIT = 100
+
+
+def get_queryset():
+    # the default manager only has the users with active accounts
+    return User.objects.all()
+
+
+def get_positive_int(request, name, default):
+    try:
+        value = int(request.GET[name])
+    except (KeyError, ValueError):
+        return default
+    return value if value >= 0 else default
+
+
+def get_limit_offset(request):
+    """
+    Return the limit and offset of the page asked with ``?limit=`` and
+    ``?offset=``, with the defaults of LimitOffsetPagination and the limit
+    clamped to ``MAX_LIMIT``.
+    """
+    limit = get_positive_int(request, 'limit', 0) or api_settings.PAGE_SIZE
+    return min(limit, MAX_LIMIT), get_positive_int(request, 'offset', 0)
+
+
+def get_page_links(request, count, limit, offset):
+    url = request.build_absolute_uri()
+    next_url = None
+    if offset + limit < count:
+        next_url = replace_query_param(
+            replace_query_param(url, 'limit', limit), 'offset', offset + limit)
+    previous_url = None
+    if offset > 0:
+        previous_url = replace_query_param(url, 'limit', limit)
+        if offset - limit > 0:
+            previous_url = replace_query_param(
+                previous_url, 'offset', offset - limit)
+        else:
+            previous_url = remove_query_param(previous_url, 'offset')
+    return next_url, previous_url
+
+
+@authenticated
+async def user_list(request):
+    """
+    List of users with active accounts.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    response = await athrottle(
+        request, api_settings.DEFAULT_THROTTLE_CLASSES)
+    if response is not None:
+        return response
+
+    limit, offset = get_limit_offset(request)
+    queryset = get_queryset()
+    count = await queryset.acount()
+    users = [user async for user in queryset[offset:offset + limit]]
+    next_url, previous_url = get_page_links(request, count, limit, offset)
+
+    with get_timing(request).measure('serialize'):
+        results = ListUserSerializer(users, many=True).data
+    return json_response({
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': results,
+    })
+
+
+@authenticated
+async def user_detail(request, pk):
+    """
+    One user with an active account.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    response = await athrottle(
+        request, api_settings.DEFAULT_THROTTLE_CLASSES)
+    if response is not None:
+        return response
+
+    try:
+        user = await get_queryset().aget(pk=pk)
+    except User.DoesNotExist:
+        return json_response({'detail': 'Not found.'},
+                             status.HTTP_404_NOT_FOUND)
+
+    with get_timing(request).measure('serialize'):
+        data = ListUserSerializer(user).data
+    return json_response(data)
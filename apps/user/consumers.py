@@ -0,0 +1,49 @@
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+# every change of the users listed by /users/
+USERS_GROUP = 'users'
+
+
+def get_account_group(user_id):
+    """
+    Group of the connections of one user, closed when the account is
+    deactivated or deleted.
+    """
+    return f'account.{user_id}'
+
+
+class UserUpdatesConsumer(AsyncWebsocketConsumer):
+    """
+    Websocket (``ws/users/``) that pushes the changes of the users to the
+    clients instead of them polling ``/users/`` and the account endpoints.
+
+    Only users authenticated with an access token (JWTAuthMiddleware) are
+    accepted. Each change is a JSON message::
+
+        {"event": "created" | "updated" | "deleted", "id": "<uuid>",
+         "user": {...the fields of /users/..., or null when deleted}}
+
+    The messages are rendered once by apps.user.signals and sent as they are
+    to every connection.
+    """
+
+    async def connect(self):
+        user = self.scope['user']
+        if not user.is_authenticated:
+            # before the accept, the handshake is rejected with a 403
+            await self.close()
+            return
+        self.user_groups = (USERS_GROUP, get_account_group(user.pk))
+        for group in self.user_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in getattr(self, 'user_groups', ()):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def user_changed(self, event):
+        await self.send(text_data=event['text'])
+
+    async def account_closed(self, event):
+        await self.close(code=4403)
@@ -0,0 +1,50 @@
+# Generated by Django 4.2 on 2026-10-19 17:24
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_deleted_at(apps, schema_editor):
+    # the accounts deleted before: their last change was the deletion
+    User = apps.get_model('user', 'User')
+    User.objects.filter(status=False, deleted_at__isnull=True).update(
+        deleted_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedUser',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('first_name', models.CharField(blank=True, max_length=50, null=True)),
+                ('last_name', models.CharField(blank=True, max_length=50, null=True)),
+                ('phone', models.CharField(blank=True, max_length=50, null=True)),
+                ('country_id', models.IntegerField(blank=True, null=True)),
+                ('email', models.EmailField(max_length=254, verbose_name='email address')),
+                ('username', models.CharField(blank=True, max_length=50, null=True)),
+                ('photo', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'user_auth_archive',
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_deleted_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('status', False)), fields=['deleted_at'], name='user_auth_deleted_at_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-19 17:27
+
+import apps.user.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='has_photo_thumbnails',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='archiveduser',
+            name='photo',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='photo',
+            field=models.ImageField(blank=True, max_length=255, null=True, upload_to=apps.user.models.user_profile_path),
+        ),
+    ]
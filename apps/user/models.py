@@ -87,6 +87,17 @@ class CustomUserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
+class ActiveUserManager(CustomUserManager):
+    """
+    Default manager of User: only the users with active accounts. The
+    deleted accounts (``status=False``) are in ``User.all_objects`` until
+    the purge_deleted_users task archives and deletes them.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(status=True)
+
+
 class Countries(models.Model):
     """
     Model by create and save a Country.
@@ -117,7 +128,16 @@ AbstractBaseUser: Use this option if you want to start from scratch by creating
 def user_profile_path(instance, filename):
     """función asignar la ubicación de las imagenes en la carpeta correspondiente
     """
-    return 'user_profile_photo/{0}/{1}'.format(instance.title, filename)
+    return 'user_profile_photo/{0}/{1}'.format(instance.pk, filename)
+
+
+def get_photo_thumbnail_name(name, size, extension):
+    """
+    Name in the storage of the ``size`` thumbnail (USER_PHOTO_SIZES) of the
+    photo ``name``: it changes with each upload, the urls can be cached.
+    """
+    root = name.rsplit('.', 1)[0]
+    return f'{root}_{size}.{extension}'
 
 
 class User(AbstractBaseUser, PermissionsMixin):
@@ -135,10 +155,14 @@ class User(AbstractBaseUser, PermissionsMixin):
     password = models.CharField(max_length=128)
     username = models.CharField(
         unique=True, max_length=50, blank=True, null=True)
-    photo = models.ImageField(max_length=50, blank=True, null=True)
+    photo = models.ImageField(upload_to=user_profile_path, max_length=255,
+                              blank=True, null=True)
+    # the thumbnails of the photo are made, see process_user_photo
+    has_photo_thumbnails = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     status = models.BooleanField(default=True)  # for delete account
+    deleted_at = models.DateTimeField(blank=True, null=True)
 
     # fields that to need django auth models
     is_staff = models.BooleanField(default=False)
@@ -146,15 +170,72 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
-    objects = CustomUserManager()
+    objects = ActiveUserManager()
+    # every user, the deleted accounts too
+    all_objects = CustomUserManager()
 
     class Meta:
         db_table = 'user_auth'
+        indexes = [
+            # only the deleted accounts, for their purge
+            models.Index(fields=['deleted_at'], name='user_auth_deleted_at_idx',
+                         condition=models.Q(status=False)),
+        ]
 
     def __str__(self):
         return self.email
 
-    def get_user_profile_photo(self):
-        if self.photo:
+    def soft_delete(self):
+        """
+        Delete the account: the user is not listed and can not log in
+        anymore, the row is purged after the retention window.
+        """
+        self.status = False
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['status', 'deleted_at', 'updated_at'])
+
+    def get_user_profile_photo(self, size=None, extension='webp'):
+        """
+        Url of the ``size`` thumbnail of the photo in WebP or JPEG
+        (``extension`` 'jpg'), of the photo itself while the thumbnails are
+        not made or without ``size``.
+        """
+        if not self.photo:
+            return ''
+        if size is None or not self.has_photo_thumbnails:
             return self.photo.url
-        return ''
+        return self.photo.storage.url(
+            get_photo_thumbnail_name(self.photo.name, size, extension))
+
+
+class ArchivedUser(models.Model):
+    """
+    What is kept of a deleted account once purged from ``user_auth``,
+    without its password and permissions.
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    first_name = models.CharField(max_length=50, blank=True, null=True)
+    last_name = models.CharField(max_length=50, blank=True, null=True)
+    phone = models.CharField(max_length=50, blank=True, null=True)
+    country_id = models.IntegerField(blank=True, null=True)
+    email = models.EmailField(_('email address'))
+    username = models.CharField(max_length=50, blank=True, null=True)
+    photo = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField()
+    deleted_at = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'user_auth_archive'
+
+    def __str__(self):
+        return self.email
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(
+            id=user.pk, first_name=user.first_name, last_name=user.last_name,
+            phone=user.phone, country_id=user.country_id, email=user.email,
+            username=user.username, photo=user.photo.name or '',
+            created_at=user.created_at, deleted_at=user.deleted_at)
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from apps.user.consumers import UserUpdatesConsumer
+
+websocket_urlpatterns = [
+    path('ws/users/', UserUpdatesConsumer.as_asgi()),
+]
@@ -2,11 +2,13 @@
 # import json
 
 # Django
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.hashers import make_password
 
 # Django rest
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 
 # Apps
 from apps.user.models import User
@@ -17,17 +19,29 @@ class ListUserSerializer(serializers.ModelSerializer):
     serializers for list all users
     """
     full_name = serializers.SerializerMethodField()
+    # {size: {'webp': url, 'jpg': url}}, the lists show these, not the photo
+    photo_thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         exclude = ('password', 'user_permissions', 'is_superuser',
-                   'last_login', 'is_staff', 'is_active', 'groups')
+                   'last_login', 'is_staff', 'is_active', 'groups',
+                   'deleted_at', 'has_photo_thumbnails')
 
     def get_full_name(self, obj):
         first_name = obj.first_name or ''
         last_name = obj.last_name or ''
         return f'{first_name} {last_name}'
 
+    def get_photo_thumbnails(self, obj):
+        if not obj.photo:
+            return None
+        return {
+            size: {extension: obj.get_user_profile_photo(size, extension)
+                   for extension in ('webp', 'jpg')}
+            for size in settings.USER_PHOTO_SIZES
+        }
+
 
 class CreateUserSerializer(serializers.ModelSerializer):
     """
@@ -58,7 +72,16 @@ class CreateUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         exclude = ('user_permissions', 'is_superuser',
-                   'last_login', 'is_staff', 'is_active', 'groups')
+                   'last_login', 'is_staff', 'is_active', 'groups',
+                   'deleted_at', 'has_photo_thumbnails')
+        # the deleted accounts keep their email and username until purged,
+        # the default manager does not have them
+        extra_kwargs = {
+            'email': {'validators': [
+                UniqueValidator(queryset=User.all_objects.all())]},
+            'username': {'validators': [
+                UniqueValidator(queryset=User.all_objects.all())]},
+        }
 
 
 class ChangePasswordSerializer(serializers.ModelSerializer):
@@ -0,0 +1,78 @@
+"""
+Fan-out of the changes of the users to the websockets
+(apps.user.consumers) through the channel layer.
+"""
+
+from functools import partial
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.jwt_custom_auth.async_authentication import forget_cached_user
+from apps.user.consumers import USERS_GROUP, get_account_group
+from apps.user.models import User
+from apps.user.serializers import ListUserSerializer
+from core.renderers import FastJSONRenderer
+
+
+def send_user_event(event, user):
+    """
+    Send ``event`` (created, updated or deleted) of ``user`` to the
+    connections, once the transaction is committed.
+    """
+    data = ListUserSerializer(user).data if event != 'deleted' else None
+    # rendered once here, not by each connection (the redis channel layer
+    # cannot serialize UUIDs and datetimes anyway)
+    text = FastJSONRenderer().render(
+        {'event': event, 'id': user.pk, 'user': data}).decode()
+    messages = [(USERS_GROUP, {'type': 'user.changed', 'text': text})]
+    if event == 'deleted' or not user.is_active:
+        messages.append((get_account_group(user.pk),
+                         {'type': 'account.closed'}))
+    transaction.on_commit(partial(group_send, messages))
+
+
+def user_updated(user_id):
+    """
+    What the post_save of a user does, for the changes made with a
+    queryset ``update()`` (that sends no signal): the user cached by the
+    async authentication is forgotten and the change is pushed.
+    """
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    forget_cached_user(User, user)
+    send_user_event('updated', user)
+
+
+def group_send(messages):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for group, message in messages:
+        async_to_sync(channel_layer.group_send)(group, message)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        # every login, nothing the clients show
+        return
+    if created:
+        send_user_event('created', instance)
+    elif instance.status:
+        send_user_event('updated', instance)
+    else:
+        # deleted by DeleteUserAcount, the user is not listed anymore
+        send_user_event('deleted', instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    if not instance.status:
+        # purged account, its deletion was already sent
+        return
+    send_user_event('deleted', instance)
@@ -0,0 +1,191 @@
+"""
+Work of the user views done out of the request by the Celery worker:
+emails, photo processing and the side effects of the account changes,
+and the purge of the deleted accounts.
+
+The tasks receive ids, not instances, and read the user again: it may have
+changed (or be gone) by the time the task runs.
+"""
+
+import datetime
+import io
+import logging
+import os
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.mail import send_mail
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework.authtoken.models import Token
+
+from apps.user.models import ArchivedUser, User, get_photo_thumbnail_name
+from apps.user.signals import user_updated
+from core.maintenance import maintenance_task
+from core.taskapp import app
+
+logger = logging.getLogger(__name__)
+
+# kind -> (subject, body)
+EMAILS = {
+    'welcome': (
+        _('Welcome'),
+        _('Hi {name}, your account {email} has been created.'),
+    ),
+    'password_changed': (
+        _('Your password has been changed'),
+        _('Hi {name}, the password of your account {email} has been '
+          'changed. If it was not you, contact us.'),
+    ),
+    'account_deleted': (
+        _('Your account has been deleted'),
+        _('Hi {name}, your account {email} has been deleted.'),
+    ),
+}
+
+
+@app.task(autoretry_for=(SMTPException, OSError), retry_backoff=True,
+          max_retries=5)
+def send_user_email(user_id, kind):
+    """
+    Send the ``kind`` email of EMAILS to the user.
+    """
+    # all_objects, account_deleted is sent to a deleted user
+    user = User.all_objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    subject, body = EMAILS[kind]
+    send_mail(
+        str(subject),
+        str(body).format(name=user.first_name or user.email,
+                         email=user.email),
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
+
+
+# extension -> Pillow format and options of the thumbnails
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def load_photo(photo_file, max_size):
+    """
+    Decode the photo at the smallest size that is still bigger than
+    ``max_size``: JPEGs are decoded at 1/2, 1/4 or 1/8 of their size (draft
+    mode), which is much faster and lighter than decoding them whole.
+    """
+    image = Image.open(photo_file)
+    image_format = image.format
+    image.draft('RGB', (max_size, max_size))
+    # rotated as the camera says, the orientation is dropped with the exif
+    image = ImageOps.exif_transpose(image)
+    return image, image_format
+
+
+def to_rgb(image):
+    if image.mode == 'RGB':
+        return image
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def encode(image, image_format, **options):
+    # no exif nor icc_profile is passed, the metadata is not written
+    output = io.BytesIO()
+    image.save(output, format=image_format, **options)
+    return ContentFile(output.getvalue())
+
+
+def save_file(storage, name, content):
+    # a thumbnail made again keeps its name, the urls are derived from it
+    # (a no-op for the content addressed storages, the thumbnail of a blob
+    # is the same)
+    storage.delete(name)
+    return storage.save(name, content)
+
+
+@app.task
+def process_user_photo(user_id):
+    """
+    Replace the photo of the user by a copy without metadata of at most
+    ``USER_PHOTO_MAX_SIZE`` pixels, and make its square thumbnails of
+    ``USER_PHOTO_SIZES`` in WebP and JPEG. The request only stored the
+    upload.
+    """
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or not user.photo:
+        return
+    max_size = settings.USER_PHOTO_MAX_SIZE
+    storage = user.photo.storage
+    try:
+        with storage.open(user.photo.name, 'rb') as photo_file:
+            image, image_format = load_photo(photo_file, max_size)
+        image.thumbnail((max_size, max_size))
+        # quality is ignored by the lossless formats
+        photo = encode(image, image_format, quality=90)
+    except (UnidentifiedImageError, OSError, ValueError):
+        logger.warning('The photo of the user %s is not an image.', user_id)
+        return
+
+    # a new name: the photo may be stored by its content, see
+    # core.storage_backends
+    name = storage.save(user.photo.field.generate_filename(
+        user, os.path.basename(user.photo.name)), photo)
+    image = to_rgb(image)
+    for size_name, size in settings.USER_PHOTO_SIZES.items():
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        for extension, (image_format, options) in THUMBNAIL_FORMATS.items():
+            save_file(storage,
+                      get_photo_thumbnail_name(name, size_name, extension),
+                      encode(thumbnail, image_format, **options))
+    # only if the photo was not changed meanwhile, the task of the new one
+    # makes its thumbnails
+    updated = User.objects.filter(pk=user_id, photo=user.photo.name).update(
+        photo=name, has_photo_thumbnails=True)
+    # the content addressed storages keep the blobs on delete, another
+    # user may have the same photo: purge_unused_blobs deletes them once
+    # unused. The other storages delete the file here.
+    if updated:
+        if name != user.photo.name:
+            storage.delete(user.photo.name)
+        user_updated(user_id)
+    elif name != user.photo.name:
+        # the copy is not used
+        storage.delete(name)
+
+
+@app.task
+def revoke_api_tokens(user_id):
+    """
+    Delete the DRF tokens of the user, its clients must log in again.
+    """
+    Token.objects.filter(user_id=user_id).delete()
+
+
+def archive_users(pks):
+    ArchivedUser.objects.bulk_create(
+        [ArchivedUser.from_user(user)
+         for user in User.all_objects.filter(pk__in=pks)],
+        # archived by a run that failed before the delete
+        ignore_conflicts=True)
+
+
+@maintenance_task
+def purge_deleted_users(run):
+    """
+    Delete the accounts deleted (``status=False``) more than
+    ``MAINTENANCE['DELETED_USER_RETENTION_DAYS']`` ago, copied to the
+    archive table first with ``MAINTENANCE['ARCHIVE_DELETED_USERS']``.
+    """
+    since = timezone.now() - datetime.timedelta(
+        days=run.config['DELETED_USER_RETENTION_DAYS'])
+    archive = archive_users if run.config['ARCHIVE_DELETED_USERS'] else None
+    return run.delete(
+        User.all_objects.filter(status=False, deleted_at__lt=since), archive)
@@ -0,0 +1,72 @@
+# Django
+from django.test import TestCase
+
+# Channels
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+
+# Django Rest Framework
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Models
+from apps.user.models import User
+
+from core.asgi import application
+
+
+class UserUpdatesConsumerTestCase(TestCase):
+    """Check the websocket that pushes the changes of the users"""
+
+    def setUp(self):
+        self.user = User.objects.create(
+            email='user@gmail.com', username='user')
+        self.other = User.objects.create(
+            email='other@gmail.com', username='other')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def connect(self, token=None):
+        # AllowedHostsOriginValidator rejects the connections without origin
+        headers = [(b'origin', b'http://localhost')]
+        if token is not None:
+            headers.append((b'authorization', f'Bearer {token}'.encode()))
+        return WebsocketCommunicator(application, '/ws/users/', headers)
+
+    def save(self, user):
+        # the events are sent once the transaction is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+
+    async def test_token_required(self):
+        for token in (None, 'invalid'):
+            communicator = self.connect(token)
+            connected, _ = await communicator.connect()
+            self.assertFalse(connected)
+
+    async def test_user_changes_pushed(self):
+        communicator = self.connect(self.token)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        self.other.first_name = 'Other'
+        await sync_to_async(self.save)(self.other)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['event'], 'updated')
+        self.assertEqual(message['id'], str(self.other.pk))
+        self.assertEqual(message['user']['first_name'], 'Other')
+
+        # the last login is not pushed
+        await sync_to_async(self.other.save)(update_fields=['last_login'])
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_closed_when_account_deleted(self):
+        communicator = self.connect(self.token)
+        await communicator.connect()
+
+        self.user.status = False
+        await sync_to_async(self.save)(self.user)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['event'], 'deleted')
+        self.assertIsNone(message['user'])
+        closed = await communicator.receive_output()
+        self.assertEqual(closed, {'type': 'websocket.close', 'code': 4403})
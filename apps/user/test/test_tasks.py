@@ -0,0 +1,138 @@
+# Django
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+# Python
+import datetime
+import io
+import tempfile
+
+from PIL import Image
+
+# Django Rest Framework
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+# Models
+from apps.jwt_custom_auth.async_authentication import get_user_cache_key
+from apps.user.models import ArchivedUser, User
+from apps.user.serializers import ListUserSerializer
+from apps.user.tasks import process_user_photo, purge_deleted_users
+
+
+class UserTasksTestCase(TestCase):
+    """Check the work the user views send to the worker"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_signup_sends_welcome_email(self):
+        self.client.force_authenticate(
+            User.objects.create(email='admin@gmail.com', username='admin'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/signup/', {
+                'email': 'new@gmail.com',
+                'password': 'rc{4@qHjR>!b`yAV',
+                'password2': 'rc{4@qHjR>!b`yAV',
+                'username': 'new',
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['new@gmail.com'])
+
+    def test_delete_account_side_effects(self):
+        user = User.objects.create(email='user@gmail.com', username='user')
+        Token.objects.create(user=user)
+        self.client.force_authenticate(user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get('/change_password/user/delete')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(Token.objects.filter(user=user).exists())
+        # soft deleted, until its purge
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        self.assertIsNotNone(User.all_objects.get(pk=user.pk).deleted_at)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(), USER_PHOTO_MAX_SIZE=50,
+                       USER_PHOTO_SIZES={'small': 16})
+    def test_process_user_photo(self):
+        content = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010f] = 'Camera maker'
+        Image.new('RGB', (200, 100)).save(content, format='JPEG', exif=exif)
+        user = User.objects.create(email='user@gmail.com', username='user')
+        user.photo.save('photo.jpg', ContentFile(content.getvalue()))
+        # the photo itself until the thumbnails are made
+        self.assertEqual(user.get_user_profile_photo('small'), user.photo.url)
+
+        cache_key = get_user_cache_key(user.pk)
+        cache.set(cache_key, user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            process_user_photo.delay(user.pk)
+
+        user.refresh_from_db()
+        self.assertTrue(user.has_photo_thumbnails)
+        # the async authentication reads the new photo
+        self.assertIsNone(cache.get(cache_key))
+        with user.photo.open('rb'), Image.open(user.photo) as image:
+            self.assertEqual(image.size, (50, 25))
+            self.assertNotIn('exif', image.info)
+        thumbnails = ListUserSerializer(user).data['photo_thumbnails']
+        root = user.photo.name.rsplit('.', 1)[0]
+        for extension, image_format in (('webp', 'WEBP'), ('jpg', 'JPEG')):
+            url = thumbnails['small'][extension]
+            self.assertEqual(url, f'/media/{root}_small.{extension}')
+            name = url[len('/media/'):]
+            with user.photo.storage.open(name) as thumbnail_file, \
+                    Image.open(thumbnail_file) as image:
+                self.assertEqual(image.format, image_format)
+                self.assertEqual(image.size, (16, 16))
+                self.assertNotIn('exif', image.info)
+
+
+@override_settings(MAINTENANCE={'BATCH_SIZE': 2, 'PAUSE': 0})
+class PurgeDeletedUsersTestCase(TestCase):
+    """Check the maintenance task of the deleted accounts"""
+
+    def setUp(self):
+        long_ago = timezone.now() - datetime.timedelta(days=31)
+        for i in range(5):
+            User.objects.create(email=f'deleted{i}@gmail.com',
+                                username=f'deleted{i}', status=False)
+        User.objects.create(email='recent@gmail.com', username='recent',
+                            status=False)
+        User.objects.create(email='active@gmail.com', username='active')
+        User.all_objects.filter(username__startswith='deleted').update(
+            deleted_at=long_ago)
+        User.all_objects.filter(username='recent').update(
+            deleted_at=timezone.now())
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command('run_maintenance', 'purge-deleted-users', stdout=output)
+
+        self.assertIn('purge-deleted-users: 5 rows processed.',
+                      output.getvalue())
+        self.assertEqual(
+            sorted(User.all_objects.values_list('username', flat=True)),
+            ['active', 'recent'])
+        self.assertEqual(
+            sorted(ArchivedUser.objects.values_list('username', flat=True)),
+            [f'deleted{i}' for i in range(5)])
+
+    def test_lock(self):
+        cache.add('maintenance-lock:purge_deleted_users', 'other run')
+        try:
+            self.assertIsNone(purge_deleted_users())
+        finally:
+            cache.delete('maintenance-lock:purge_deleted_users')
+        self.assertEqual(User.all_objects.count(), 7)
+        self.assertEqual(purge_deleted_users(), 5)
+        self.assertEqual(purge_deleted_users(), 0)
@@ -1,17 +1,28 @@
 # Django
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from unittest import mock
 
 # Python
 from PIL import Image
 import tempfile
 import json
+import uuid
+import warnings
 
 # Django Rest Framework
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
 
 # Models
+from apps.jwt_custom_auth.async_authentication import get_user_cache_key
 from apps.user.models import User
+from apps.user.views import UserViewSet
+
+# Monitoring
+from apps.monitoring.testing import QueryCountAssertionsMixin
+from core.testing import asgi_request
 
 
 from django.contrib.auth.hashers import make_password
@@ -79,3 +90,180 @@ class UserTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         result = json.loads(response.content)
         self.assertIn('access', result)
+
+
+class UserViewSetQueriesTestCase(QueryCountAssertionsMixin, TestCase):
+    """Check that listing users does not run a query per user"""
+
+    def setUp(self):
+        for index in range(10):
+            User.objects.create(
+                email=f'user{index}@gmail.com', username=f'user{index}')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.first())
+
+    def test_list_queries_constant_with_page_size(self):
+        """The number of queries must not grow with ?limit="""
+        self.assertQueriesConstant(
+            lambda size: self.client.get(f'/users/?limit={size}'),
+            sizes=(1, 5, 10))
+
+    def test_list_within_query_budget(self):
+        """The list of users must respect the budget of the view"""
+        self.assertQueriesAtMost(
+            UserViewSet.max_queries, self.client.get, '/users/?limit=10')
+
+
+class UserViewSetStreamingTestCase(TestCase):
+    """Check that big lists of users are streamed with the same JSON"""
+
+    def setUp(self):
+        for index in range(12):
+            User.objects.create(
+                email=f'user{index}@gmail.com', username=f'user{index}')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.first())
+
+    @mock.patch.object(UserViewSet, 'stream_chunk_size', 5)
+    def test_stream_same_json(self):
+        for url in ('/users/?limit=8&offset=2', '/users/?limit=100'):
+            with mock.patch.object(UserViewSet, 'stream_threshold', None):
+                response = self.client.get(url)
+            with mock.patch.object(UserViewSet, 'stream_threshold', 8):
+                streamed = self.client.get(url)
+
+            self.assertFalse(response.streaming)
+
+            self.assertTrue(streamed.streaming)
+            self.assertEqual(
+                json.loads(b''.join(streamed.streaming_content)),
+                json.loads(response.content))
+
+
+class UserViewSetAsgiStreamingTestCase(TransactionTestCase):
+    """Check that big lists of users are streamed under ASGI"""
+
+    def setUp(self):
+        # the handler runs the view in a thread of its own, outside of the
+        # transaction of a TestCase
+        for index in range(12):
+            User.objects.create(
+                email=f'user{index}@gmail.com', username=f'user{index}')
+        token = RefreshToken.for_user(User.objects.first()).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    @mock.patch.object(UserViewSet, 'stream_chunk_size', 5)
+    @mock.patch.object(UserViewSet, 'stream_threshold', 8)
+    async def test_stream_chunks(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            status_code, headers, chunks = await asgi_request(
+                'GET', '/users/', 'limit=100', self.headers)
+
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        # Django warns when it has to buffer a sync iterator
+        self.assertEqual(
+            [str(warning.message) for warning in caught
+             if 'synchronous iterators' in str(warning.message)], [])
+        # prefix, 3 chunks of rows and suffix
+        self.assertEqual(len([chunk for chunk in chunks if chunk]), 5)
+        page = json.loads(b''.join(chunks))
+        self.assertEqual(page['count'], 12)
+        self.assertEqual(len(page['results']), 12)
+
+
+class AsyncUserViewsTestCase(TestCase):
+    """Check the async views against the DRF ones"""
+
+    def setUp(self):
+        for index in range(12):
+            User.objects.create(
+                email=f'user{index}@gmail.com', username=f'user{index}')
+        self.user = User.objects.first()
+        self.user.set_password('F12345678@')
+        self.user.save()
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {'authorization': f'Bearer {token}'}
+
+    async def test_list_same_page(self):
+        url = '?limit=5&offset=2'
+        response = await self.async_client.get(
+            '/users/' + url, headers=self.headers)
+        async_response = await self.async_client.get(
+            '/api/async/users/' + url, headers=self.headers)
+
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        page, async_page = response.json(), async_response.json()
+        self.assertEqual(async_page['count'], page['count'])
+        self.assertEqual([user['id'] for user in async_page['results']],
+                         [user['id'] for user in page['results']])
+        self.assertIn('offset=7', async_page['next'])
+        self.assertNotIn('password', async_page['results'][0])
+
+    async def test_list_max_limit(self):
+        with mock.patch('apps.user.async_views.MAX_LIMIT', 5):
+            response = await self.async_client.get(
+                '/api/async/users/?limit=100000', headers=self.headers)
+        page = response.json()
+        self.assertEqual(len(page['results']), 5)
+        self.assertIn('limit=5', page['next'])
+
+    async def test_detail(self):
+        response = await self.async_client.get(
+            f'/api/async/users/{self.user.pk}/', headers=self.headers)
+        self.assertEqual(response.json()['email'], self.user.email)
+
+        response = await self.async_client.get(
+            f'/api/async/users/{uuid.uuid4()}/', headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_cached_user(self):
+        url = f'/api/async/users/{self.user.pk}/'
+        await self.async_client.get(url, headers=self.headers)
+        key = get_user_cache_key(self.user.pk)
+        cached = await cache.aget(key)
+        self.assertEqual(cached['email'], self.user.email)
+        # the password hash is not kept in the cache
+        self.assertNotIn('password', cached)
+        response = await self.async_client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cached_user_forgotten_on_commit(self):
+        key = get_user_cache_key(self.user.pk)
+        cache.set(key, {'email': self.user.email})
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.first_name = 'changed'
+            self.user.save()
+        # a request before the commit would cache the user as it was
+        self.assertIsNotNone(cache.get(key))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(key))
+
+    async def test_token_required(self):
+        response = await self.async_client.get('/api/async/users/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = await self.async_client.get(
+            '/api/async/users/', headers={'authorization': 'Bearer invalid'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+    async def test_login(self):
+        response = await self.async_client.post(
+            '/api/async/token/',
+            {'email': self.user.email, 'password': 'F12345678@'},
+            content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['user']['email'], self.user.email)
+
+        response = await self.async_client.get(
+            '/api/async/users/',
+            headers={'authorization': f'Bearer {response.json()["access"]}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = await self.async_client.post(
+            '/api/async/token/',
+            {'email': self.user.email, 'password': 'wrong'},
+            content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,6 +1,7 @@
 from django.urls import path
 from rest_framework import routers
 
+from apps.user.async_views import user_detail, user_list
 from apps.user.views import (
     CreateUser, UserViewSet, ChangePasswordView, DeleteUserAcount)
 
@@ -13,6 +14,10 @@ urlpatterns = [
          name='auth_change_password'),
     path('change_password/<str:username>/delete', DeleteUserAcount.as_view(),
          name='delete_account'),
+    # async views, served without thread hops under ASGI (core.asgi)
+    path('api/async/users/', user_list, name='async-user-list'),
+    path('api/async/users/<uuid:pk>/', user_detail,
+         name='async-user-detail'),
 ]
 
 urlpatterns += router.urls
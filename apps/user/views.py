@@ -13,13 +13,24 @@ from rest_framework.permissions import IsAuthenticated
 from apps.user.serializers import CreateUserSerializer, ListUserSerializer, ChangePasswordSerializer, DeleteAccount
 from apps.user.models import User
 from apps.commons import ListModelMixin
+from apps.monitoring.query_budget import query_budget
+from apps.monitoring.timing import ServerTimingMixin, get_timing
+from apps.user.tasks import (
+    process_user_photo, revoke_api_tokens, send_user_email)
+from core.idempotency import IdempotencyMixin
+from core.throttling import LOGIN_THROTTLES
+from core.taskapp import delay_on_commit
 
 
 ##
-class CreateUser(CreateAPIView):
-    """Api view for create an acount for one user"""
+class CreateUser(IdempotencyMixin, ServerTimingMixin, CreateAPIView):
+    """Api view for create an acount for one user, a retry with the same
+    Idempotency-Key gets the first response"""
 
     serializer_class = CreateUserSerializer
+    # per user and per email (core.throttling)
+    throttle_scope = 'signup'
+    throttle_classes = LOGIN_THROTTLES
 
     def create(self, request, *args, **kwargs):
         """
@@ -29,16 +40,21 @@ class CreateUser(CreateAPIView):
         serializer = CreateUserSerializer(
             data=request.data, context=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        user = serializer.save()
+
+        # the email and the photo are done by the worker
+        delay_on_commit(send_user_email, user.pk, 'welcome')
+        if user.photo:
+            delay_on_commit(process_user_photo, user.pk)
 
         # we should delete password for security
-        user_info = serializer.data
+        with get_timing(request).measure('serialize'):
+            user_info = serializer.data
         user_info.pop("password")
-        print(user_info)
         return Response(user_info, status=status.HTTP_201_CREATED)
 
 
-class ChangePasswordView(UpdateAPIView):
+class ChangePasswordView(ServerTimingMixin, UpdateAPIView):
     """Change password of an user"""
 
     # para buscar por username, see the next
@@ -57,8 +73,13 @@ class ChangePasswordView(UpdateAPIView):
         return user
     serializer_class = ChangePasswordSerializer
 
+    def perform_update(self, serializer):
+        user = serializer.save()
+        delay_on_commit(send_user_email, user.pk, 'password_changed')
+        delay_on_commit(revoke_api_tokens, user.pk)
+
 
-class DeleteUserAcount(RetrieveAPIView):
+class DeleteUserAcount(ServerTimingMixin, RetrieveAPIView):
     """Delete account of one user"""
 
     # para buscar por username, see the next
@@ -82,22 +103,23 @@ class DeleteUserAcount(RetrieveAPIView):
     def retrieve(self, request, username, pk=None):
         instance = self.get_object()
         # query = request.GET.get('query', None)  # read extra data
-        instance.status = False
-        instance.save()
+        instance.soft_delete()
+        delay_on_commit(send_user_email, instance.pk, 'account_deleted')
+        delay_on_commit(revoke_api_tokens, instance.pk)
         return Response(self.serializer_class(instance).data,
                         status=status.HTTP_200_OK)
 
 
-class UserViewSet(ListModelMixin, viewsets.GenericViewSet, viewsets.ViewSet):
+# authentication + count + page
+@query_budget(3)
+class UserViewSet(ServerTimingMixin, ListModelMixin, viewsets.GenericViewSet,
+                  viewsets.ViewSet):
     """
     List of users with active acounts . 
     """
     queryset = User.objects.all()
     serializer_class = CreateUserSerializer
-
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        # los usuarios con status son los usuarios con cuentas activas
-        return queryset.filter(status=True)
+    # internal consumers ask for big pages with ?limit=
+    stream_threshold = 100
 
     # permission_classes = [IsAdminUser]
@@ -0,0 +1,13 @@
+"""
+Urls of the admin site, included lazily by core.urls.
+
+The admin modules of the apps (apps.setup.admin registers every model) are
+imported here, the first time an admin url is used, instead of when Django
+starts (INSTALLED_APPS has SimpleAdminConfig, which does not autodiscover).
+"""
+
+from django.contrib import admin
+
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
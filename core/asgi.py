@@ -1,18 +1,33 @@
-import os
-from channels.routing import ProtocolTypeRouter
-from django.core.asgi import get_asgi_application
-
-from django.core.asgi import get_asgi_application
+"""
+ASGI config of the project, served by gunicorn with uvicorn workers
+(compose/production/django/start-asgi) or daphne.
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+HTTP requests go through core.handlers: the async views under
+``api/async/`` run on the event loop with an async middleware chain, the
+DRF views keep running in threads.
 
-application = get_asgi_application()
+Websockets (``ws/users/``) are authenticated with the access tokens of the
+API by apps.jwt_custom_auth.websocket, their Origin header must be one of
+the ALLOWED_HOSTS.
+"""
 
+import os
 
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import AllowedHostsOriginValidator
 
+from core.handlers import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
+django_application = get_asgi_application()
+
+# they import models, once the apps are loaded
+from apps.jwt_custom_auth.websocket import JWTAuthMiddleware  # noqa: E402
+from apps.user.routing import websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter({
-  'http': get_asgi_application(),
-})
\ No newline at end of file
+    'http': django_application,
+    'websocket': AllowedHostsOriginValidator(
+        JWTAuthMiddleware(URLRouter(websocket_urlpatterns))),
+})
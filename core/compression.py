@@ -0,0 +1,157 @@
+"""
+Compressors for the ``Content-Encoding`` of the responses.
+
+gzip is always available, brotli (``br``) and zstd only when the brotli and
+zstandard packages are installed.
+
+The gzip streams can carry ``padding`` bytes of file name in their header
+(as the GZipMiddleware of Django does): a random padding makes the length
+of the responses useless to guess the secrets they hold (BREACH). brotli
+and zstd have no such field.
+"""
+
+import struct
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class Compressor:
+    """
+    Compressor of a response, ``compress`` is called with each chunk of the
+    content and ``finish`` once at the end.
+    """
+    encoding = None
+    # whether the constructor takes a ``padding``
+    padded = False
+
+    @classmethod
+    def compress_all(cls, data, level, **options):
+        """
+        Compress the whole ``data`` at once.
+        """
+        compressor = cls(level, **options)
+        return compressor.compress(data) + compressor.finish()
+
+
+class GzipCompressor(Compressor):
+    encoding = 'gzip'
+    padded = True
+
+    def __init__(self, level, padding=0):
+        # raw deflate, the header (with the padding as file name) and the
+        # trailer are written here
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        flags = 0x08 if padding else 0
+        self.header = struct.pack('<BBBBIBB', 0x1f, 0x8b, zlib.DEFLATED,
+                                  flags, 0, 0, 255)
+        if padding:
+            self.header += b'a' * padding + b'\0'
+        self.crc = 0
+        self.size = 0
+
+    def write_header(self):
+        header, self.header = self.header, b''
+        return header
+
+    def compress(self, data):
+        """
+        Compress a chunk and flush it, so it can be sent (and decompressed)
+        before the next one.
+        """
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        return (self.write_header() + self.compressor.compress(data) +
+                self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def finish(self):
+        return (self.write_header() + self.compressor.flush() +
+                struct.pack('<II', self.crc, self.size & 0xffffffff))
+
+
+class BrotliCompressor(Compressor):
+    encoding = 'br'
+
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdCompressor(Compressor):
+    encoding = 'zstd'
+
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    @classmethod
+    def compress_all(cls, data, level):
+        # one frame with the content size in its header
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    def compress(self, data):
+        return (self.compressor.compress(data) +
+                self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK))
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+COMPRESSORS = {'gzip': GzipCompressor}
+if brotli is not None:
+    COMPRESSORS['br'] = BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS['zstd'] = ZstdCompressor
+
+
+def parse_accept_encoding(header):
+    """
+    Return a dict with the quality of each encoding of an
+    ``Accept-Encoding`` header.
+    """
+    qualities = {}
+    for item in header.lower().split(','):
+        encoding, _, params = item.partition(';')
+        encoding = encoding.strip()
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[encoding] = quality
+    return qualities
+
+
+def select_encoding(header, encodings):
+    """
+    Return the first of ``encodings`` (in order of preference of the
+    server) accepted by the ``Accept-Encoding`` header, or None.
+    """
+    qualities = parse_accept_encoding(header)
+    default = qualities.get('*', 0.0)
+    accepted = [
+        encoding for encoding in encodings
+        if encoding in COMPRESSORS and qualities.get(encoding, default) > 0
+    ]
+    if not accepted:
+        return None
+    # the client preference (quality) first, the server preference after
+    return max(accepted, key=lambda encoding: (
+        qualities.get(encoding, default), -encodings.index(encoding)))
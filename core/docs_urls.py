@@ -0,0 +1,23 @@
+"""
+Urls of the API documentation, included lazily by core.urls so drf_yasg is
+only imported by the workers that serve the documentation.
+"""
+
+from django.urls import path, re_path
+
+from core.openapi import (
+    FileReDocRenderer, FileSwaggerUIRenderer, schema_file_view, schema_view)
+
+urlpatterns = [
+    # the schema is generated by manage.py generate_openapi_schema
+    re_path(r'^swagger(?P<format>\.json|\.yaml)/$', schema_file_view,
+            name='schema-json'),
+    re_path(r'^swagger\.(?P<digest>[0-9a-f]{12})(?P<format>\.json|\.yaml)/$',
+            schema_file_view, name='schema-immutable'),
+    path('swagger/', schema_view.as_cached_view(
+         renderer_classes=(FileSwaggerUIRenderer,)),
+         name='schema-swagger-ui'),
+    path('redoc/', schema_view.as_cached_view(
+         renderer_classes=(FileReDocRenderer,)),
+         name='schema-redoc'),
+]
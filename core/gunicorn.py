@@ -0,0 +1,58 @@
+"""
+Gunicorn config for the production server.
+
+Used by compose/production/django/start with
+``gunicorn --config python:core.gunicorn``, and by start-asgi with the
+uvicorn workers (``core.asgi``).
+
+The application is loaded and warmed up (core.warmup) in the master, then
+the objects it created are moved out of the reach of the garbage collector
+with ``gc.freeze()``. A collection in a worker would otherwise write the
+headers of those objects and copy the memory pages shared with the master
+(copy on write). Workers are restarted after ``max_requests`` requests,
+with a jitter so they do not all restart at the same time.
+
+Every value can be changed with an environment variable ``GUNICORN_*``.
+"""
+
+import gc
+import multiprocessing
+import os
+
+from prometheus_client import multiprocess
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+workers = _env_int('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+
+def when_ready(server):
+    """
+    Warm up the application loaded by the master before the first fork.
+    """
+    if not server.cfg.preload_app:
+        return
+    from core.warmup import warm_up
+
+    warm_up()
+    # the garbage left by the warm-up is collected before freezing
+    gc.collect()
+    gc.freeze()
+    server.log.info('%d objects frozen before fork.', gc.get_freeze_count())
+
+
+def child_exit(server, worker):
+    """
+    Remove the samples of the live gauges of a worker that exited from the
+    Prometheus multiprocess directory.
+    """
+    multiprocess.mark_process_dead(worker.pid)
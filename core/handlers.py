@@ -0,0 +1,95 @@
+"""
+Request handlers that run a lean middleware chain for the token
+authenticated API.
+
+Requests whose path starts with one of ``settings.API_MIDDLEWARE_PREFIXES``
+go through ``settings.API_MIDDLEWARE`` (no sessions, csrf, messages...), the
+rest (admin, browsable API, swagger...) keep the full ``settings.MIDDLEWARE``.
+
+The async views (``settings.ASYNC_API_MIDDLEWARE_PREFIXES``) go through
+``settings.ASYNC_API_MIDDLEWARE``, where every middleware is async capable:
+under ASGI the whole request runs on the event loop, without a
+sync_to_async hop.
+"""
+
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+
+class PathDispatchMixin:
+    """
+    Handler mixin that loads the middleware chains of
+    ``settings.ASYNC_API_MIDDLEWARE`` and ``settings.API_MIDDLEWARE`` and
+    dispatches each request to one of the chains by its path.
+    """
+
+    def load_middleware(self, is_async=False):
+        super().load_middleware(is_async)
+        self.async_api_prefixes = tuple(settings.ASYNC_API_MIDDLEWARE_PREFIXES)
+        self.async_api_handler = self.load_chain(
+            settings.ASYNC_API_MIDDLEWARE, is_async)
+        self.api_prefixes = tuple(settings.API_MIDDLEWARE_PREFIXES)
+        self.api_handler = self.load_chain(settings.API_MIDDLEWARE, is_async)
+
+    @staticmethod
+    def load_chain(middleware, is_async):
+        handler = BaseHandler()
+        # BaseHandler only reads settings.MIDDLEWARE, it is swapped while the
+        # chain is built (once, when the process starts)
+        full_middleware = settings.MIDDLEWARE
+        settings.MIDDLEWARE = middleware
+        try:
+            handler.load_middleware(is_async)
+        finally:
+            settings.MIDDLEWARE = full_middleware
+        return handler
+
+    def get_chain(self, request):
+        """
+        Return the handler of the lean chain of ``request``, or None for the
+        full chain.
+        """
+        if request.path_info.startswith(self.async_api_prefixes):
+            return self.async_api_handler
+        if request.path_info.startswith(self.api_prefixes):
+            return self.api_handler
+        return None
+
+    def get_response(self, request):
+        handler = self.get_chain(request)
+        if handler is not None:
+            return handler.get_response(request)
+        return super().get_response(request)
+
+    async def get_response_async(self, request):
+        handler = self.get_chain(request)
+        if handler is not None:
+            return await handler.get_response_async(request)
+        return await super().get_response_async(request)
+
+
+class PathDispatchWSGIHandler(PathDispatchMixin, WSGIHandler):
+    pass
+
+
+def get_wsgi_application():
+    """
+    Same as django.core.wsgi.get_wsgi_application, with the path dispatch.
+    """
+    django.setup(set_prefix=False)
+    return PathDispatchWSGIHandler()
+
+
+class PathDispatchASGIHandler(PathDispatchMixin, ASGIHandler):
+    pass
+
+
+def get_asgi_application():
+    """
+    Same as django.core.asgi.get_asgi_application, with the path dispatch.
+    """
+    django.setup(set_prefix=False)
+    return PathDispatchASGIHandler()
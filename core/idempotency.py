@@ -0,0 +1,220 @@
+"""
+``Idempotency-Key`` header of the POST requests (see
+https://datatracker.ietf.org/doc/draft-ietf-httpapi-idempotency-key-header/).
+
+A client that retries a request after a timeout sends it with the same key:
+the first response is kept in the cache for ``IDEMPOTENCY['TTL']`` seconds
+(or the ``idempotency_ttl`` of the view) and the retries get it back (with
+``Idempotent-Replayed: true``) instead of running the view again, no second
+account and no second password hash. A retry that arrives while the first
+request is still running waits for its response up to
+``IDEMPOTENCY['WAIT']`` seconds (holding its worker), then gets a 409.
+
+With ATOMIC_REQUESTS the response is kept once the transaction of the
+request is committed, a retry never gets the response of changes that
+were rolled back: the key of a request whose transaction is rolled back is
+released, and runs again. A commit that fails leaves the in-progress
+marker until it expires (``IDEMPOTENCY['LOCK_TIMEOUT']``).
+
+The keys are per path and user (the anonymous ones share theirs), and a
+key is bound to the body it was first sent with: the same key with another
+body is refused with a 422, so a replayed response (a token pair) is only
+for who sent the same credentials. The bodies are only kept as an HMAC.
+The server errors (5xx) are not kept, their retries run again.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.crypto import salted_hmac
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+
+DEFAULTS = {
+    'CACHE': 'default',
+    # seconds the responses are replayed
+    'TTL': 24 * 60 * 60,
+    # seconds the in-progress marker lives, a request that dies does not
+    # hold its key longer
+    'LOCK_TIMEOUT': 30,
+    # seconds a concurrent retry waits for the response, and between its
+    # looks at the cache. The retry holds a worker meanwhile
+    'WAIT': 2,
+    'POLL_INTERVAL': 0.1,
+    'MAX_KEY_LENGTH': 255,
+}
+
+IN_PROGRESS = 'in-progress'
+DONE = 'done'
+# headers that describe the first request, not the response
+EXCLUDED_HEADERS = {'server-timing'}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+class IdempotencyError(APIException):
+
+    def __init__(self, detail, status_code):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+class Replay(Exception):
+    """
+    Raised in ``initial`` to answer with the kept ``response``.
+    """
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+def describe(value):
+    # the uploaded files of a multipart body, by their name and size
+    if isinstance(value, UploadedFile):
+        return [value.name, value.size]
+    return str(value)
+
+
+def get_fingerprint(request):
+    """
+    HMAC (with the SECRET_KEY) of the parsed body of ``request`` (a DRF
+    Request). The bodies have passwords: a plain hash of them kept in the
+    cache could be cracked offline.
+    """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps(data, sort_keys=True, default=describe)
+    return salted_hmac('core.idempotency.get_fingerprint', payload,
+                       algorithm='sha256').hexdigest()
+
+
+class IdempotentRequest:
+    """
+    The cache entry of an ``Idempotency-Key``: the in-progress marker of
+    the first request, then its response.
+    """
+
+    def __init__(self, request, key, ttl=None):
+        self.config = get_config()
+        self.ttl = self.config['TTL'] if ttl is None else ttl
+        self.cache = caches[self.config['CACHE']]
+        user = request.user.pk if request.user.is_authenticated else ''
+        scope = f'{request.method}:{request.path}:{user}:{key}'
+        self.key = 'idempotency:' + hashlib.sha256(scope.encode()).hexdigest()
+        self.fingerprint = get_fingerprint(request)
+
+    def acquire(self):
+        """
+        Take the key for this request and return None, or return the kept
+        response of the first one.
+        """
+        marker = {'state': IN_PROGRESS, 'fingerprint': self.fingerprint}
+        deadline = time.monotonic() + self.config['WAIT']
+        while True:
+            if self.cache.add(self.key, marker, self.config['LOCK_TIMEOUT']):
+                return None
+            record = self.cache.get(self.key)
+            if record is None:
+                # released (or expired) since the add, take it
+                continue
+            if record['fingerprint'] != self.fingerprint:
+                raise IdempotencyError(
+                    'This Idempotency-Key was used with another request.',
+                    status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record['state'] == DONE:
+                return self.get_response(record)
+            if time.monotonic() >= deadline:
+                raise IdempotencyError(
+                    'A request with this Idempotency-Key is in progress.',
+                    status.HTTP_409_CONFLICT)
+            time.sleep(self.config['POLL_INTERVAL'])
+
+    def complete(self, response):
+        """
+        Keep ``response`` for the retries once the transaction of the
+        request is committed, or release the key of a server error or a
+        rolled back transaction.
+        """
+        if response.status_code >= 500 or response.streaming:
+            self.release()
+            return
+        if transaction.get_connection().needs_rollback:
+            # ATOMIC_REQUESTS and an error response (DRF marks the rollback),
+            # the view did nothing
+            self.release()
+            return
+        if hasattr(response, 'render'):
+            response.render()
+        record = {
+            'state': DONE,
+            'fingerprint': self.fingerprint,
+            'status': response.status_code,
+            'headers': [(name, value) for name, value in response.items()
+                        if name.lower() not in EXCLUDED_HEADERS],
+            'content': response.content,
+        }
+        # right away without a transaction
+        transaction.on_commit(
+            lambda: self.cache.set(self.key, record, self.ttl))
+
+    def release(self):
+        self.cache.delete(self.key)
+
+    def get_response(self, record):
+        response = HttpResponse(record['content'], status=record['status'])
+        for name, value in record['headers']:
+            response[name] = value
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+
+class IdempotencyMixin:
+    """
+    APIView mixin that makes the ``idempotent_methods`` requests with an
+    ``Idempotency-Key`` header idempotent, see the module documentation.
+    """
+
+    idempotent_methods = ('POST',)
+    # seconds the responses are replayed, IDEMPOTENCY['TTL'] when None
+    idempotency_ttl = None
+    idempotent_request = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        key = request.headers.get('Idempotency-Key')
+        if key is None or request.method not in self.idempotent_methods:
+            return
+        if not key or len(key) > get_config()['MAX_KEY_LENGTH']:
+            raise ParseError('Invalid Idempotency-Key header.')
+        idempotent_request = IdempotentRequest(request, key,
+                                               self.idempotency_ttl)
+        response = idempotent_request.acquire()
+        if response is not None:
+            raise Replay(response)
+        self.idempotent_request = idempotent_request
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Replay):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except BaseException:
+            if self.idempotent_request is not None:
+                self.idempotent_request.release()
+            raise
+        if self.idempotent_request is not None:
+            self.idempotent_request.complete(response)
+        return response
@@ -0,0 +1,261 @@
+"""
+Queued email backend.
+
+``QueuedEmailBackend`` only puts the messages in a queue, the Celery worker
+(core.tasks) sends them in batches of ``EMAIL_QUEUE['BATCH_SIZE']`` over one
+connection of the real backend (``EMAIL_QUEUE['BACKEND']``). Messages that
+fail are retried with an exponential backoff, up to
+``EMAIL_QUEUE['MAX_RETRIES']`` times. A slow or unavailable mail server
+never blocks a request.
+
+The queue is a redis list when the ``EMAIL_QUEUE['CACHE']`` cache is redis
+(production), a list of the process otherwise (local with eager tasks). Its
+depth is the ``django_email_queue_depth`` metric.
+
+A batch taken from the queue is kept aside until it is acknowledged, once
+it is sent (or handed to its retry task). The batches of a worker that died
+are not acknowledged: they go back to the queue ``EMAIL_QUEUE['ACK_TIMEOUT']``
+seconds after they were taken, a message may then be sent twice but it is
+never lost.
+"""
+
+import base64
+import collections
+import logging
+import pickle
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.mail.backends.base import BaseEmailBackend
+from django_redis import get_redis_connection
+from django_redis.cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+    'CACHE': 'default',
+    'KEY': 'email-queue',
+    'BATCH_SIZE': 100,
+    # seconds the first message waits for the others of its batch
+    'FLUSH_DELAY': 2,
+    'MAX_RETRIES': 5,
+    # seconds before the first retry, doubled on each one
+    'RETRY_DELAY': 30,
+    # seconds after which a batch taken from the queue and not acknowledged
+    # (its worker died) is queued again, longer than the sending of a batch
+    'ACK_TIMEOUT': 300,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EMAIL_QUEUE', {})}
+
+
+def serialize(message):
+    """
+    Return ``message`` (any EmailMessage, with its attachments and the
+    attributes of anymail) as text, for the queue and the task arguments.
+    """
+    message.connection = None
+    return base64.b64encode(pickle.dumps(message)).decode()
+
+
+def deserialize(payload):
+    return pickle.loads(base64.b64decode(payload))
+
+
+class MemoryEmailQueue:
+    """
+    Queue of the process, only the tasks run in the same process (eager)
+    see its messages.
+    """
+
+    def __init__(self, ack_timeout):
+        self.ack_timeout = ack_timeout
+        self.messages = collections.deque()
+        # token -> (deadline, payloads) of the batches not acknowledged
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def push(self, payloads):
+        with self.lock:
+            self.messages.extend(payloads)
+
+    def pop(self, count):
+        """
+        Take up to ``count`` messages, return the token of their batch and
+        the messages.
+        """
+        token = uuid.uuid4().hex
+        with self.lock:
+            payloads = [self.messages.popleft()
+                        for _ in range(min(count, len(self.messages)))]
+            if payloads:
+                self.batches[token] = (
+                    time.monotonic() + self.ack_timeout, payloads)
+        return token, payloads
+
+    def ack(self, token):
+        with self.lock:
+            self.batches.pop(token, None)
+
+    def requeue_expired(self):
+        """
+        Put the batches not acknowledged in time back at the head of the
+        queue, return the number of messages.
+        """
+        now = time.monotonic()
+        count = 0
+        with self.lock:
+            for token, (deadline, payloads) in list(self.batches.items()):
+                if deadline <= now:
+                    del self.batches[token]
+                    self.messages.extendleft(reversed(payloads))
+                    count += len(payloads)
+        return count
+
+    def depth(self):
+        return len(self.messages)
+
+
+class RedisEmailQueue:
+    """
+    Queue in a redis list, shared by the web and worker processes. A batch
+    is moved to a list of its own (``<key>:processing:<token>``) and its
+    deadline kept in the sorted set ``<key>:processing``.
+    """
+
+    def __init__(self, alias, key, ack_timeout):
+        self.alias = alias
+        self.key = key
+        self.ack_timeout = ack_timeout
+        self.deadlines_key = f'{key}:processing'
+
+    @property
+    def client(self):
+        return get_redis_connection(self.alias)
+
+    def get_batch_key(self, token):
+        return f'{self.key}:processing:{token}'
+
+    def push(self, payloads):
+        self.client.rpush(self.key, *payloads)
+
+    def pop(self, count):
+        """
+        Move up to ``count`` messages to the list of a new batch, return its
+        token and the messages.
+        """
+        token = uuid.uuid4().hex
+        batch_key = self.get_batch_key(token)
+        # one transaction, two workers never get the same messages and a
+        # batch always has its deadline
+        pipeline = self.client.pipeline(transaction=True)
+        for _ in range(count):
+            pipeline.lmove(self.key, batch_key, 'LEFT', 'RIGHT')
+        pipeline.zadd(self.deadlines_key,
+                      {token: time.time() + self.ack_timeout})
+        payloads = [payload.decode() for payload in pipeline.execute()[:-1]
+                    if payload is not None]
+        if not payloads:
+            self.ack(token)
+        return token, payloads
+
+    def ack(self, token):
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.delete(self.get_batch_key(token))
+        pipeline.zrem(self.deadlines_key, token)
+        pipeline.execute()
+
+    def requeue_expired(self):
+        """
+        Move the messages of the batches not acknowledged in time back to
+        the head of the queue, return their number.
+        """
+        client = self.client
+        count = 0
+        for token in client.zrangebyscore(self.deadlines_key, '-inf',
+                                          time.time()):
+            token = token.decode()
+            # one at a time from the end, they keep their order; a message
+            # is moved once even when two workers requeue the batch
+            while client.lmove(self.get_batch_key(token), self.key,
+                               'RIGHT', 'LEFT') is not None:
+                count += 1
+            client.zrem(self.deadlines_key, token)
+        return count
+
+    def depth(self):
+        return self.client.llen(self.key)
+
+
+_queues = {}
+
+
+def get_email_queue():
+    config = get_config()
+    key = (config['CACHE'], config['KEY'])
+    if key not in _queues:
+        if isinstance(caches[config['CACHE']], RedisCache):
+            _queues[key] = RedisEmailQueue(*key, config['ACK_TIMEOUT'])
+        else:
+            _queues[key] = MemoryEmailQueue(config['ACK_TIMEOUT'])
+    return _queues[key]
+
+
+def schedule_flush(config):
+    """
+    Send a flush_email_queue task, unless one is already waiting: the
+    messages queued meanwhile are sent by it, in the same batch.
+    """
+    from core.tasks import flush_email_queue
+
+    flush_key = f'{config["KEY"]}:flush'
+    if caches[config['CACHE']].add(flush_key, 1, config['FLUSH_DELAY'] + 60):
+        flush_email_queue.apply_async(countdown=config['FLUSH_DELAY'])
+
+
+def send_batch(connection, payloads):
+    """
+    Send ``payloads`` over ``connection``, return the ``(payload,
+    error)`` of the messages that failed.
+    """
+    failed = []
+    for payload in payloads:
+        try:
+            # a no-op when it is open, send_messages would otherwise open
+            # and close a connection for each message
+            connection.open()
+            connection.send_messages([deserialize(payload)])
+        except Exception as error:
+            failed.append((payload, error))
+            # the connection may be broken, the next message opens another
+            connection.close()
+    return failed
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Email backend that queues the messages for the worker, see the module
+    documentation.
+    """
+
+    def send_messages(self, email_messages):
+        payloads = [serialize(message) for message in email_messages
+                    if message.recipients()]
+        if not payloads:
+            return 0
+        config = get_config()
+        try:
+            get_email_queue().push(payloads)
+            schedule_flush(config)
+        except Exception:
+            if not self.fail_silently:
+                raise
+            logger.exception('Could not queue %d emails.', len(payloads))
+            return 0
+        return len(payloads)
@@ -0,0 +1,137 @@
+"""
+Maintenance tasks: the periodic cleanups scheduled by Celery beat
+(``CELERY_BEAT_SCHEDULE``), also run by ``manage.py run_maintenance``.
+
+A maintenance task is a function decorated with ``maintenance_task`` that
+receives a ``MaintenanceRun`` and returns the number of rows (or keys) it
+processed. Only one run of each task happens at a time (a lock in the
+cache), the deletes are done in batches of ``MAINTENANCE['BATCH_SIZE']``
+with a pause between them so they do not hold locks or saturate the
+database, and a run stops after ``MAINTENANCE['MAX_DURATION']`` seconds.
+The tasks only delete what is already stale: running them again, or after
+a stopped run, continues where the previous one left off.
+"""
+
+import functools
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from core.taskapp import app
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,
+    # seconds between two batches
+    'PAUSE': 0.5,
+    # seconds after which a run stops, the next one continues
+    'MAX_DURATION': 300,
+    # cache of the locks, and the one purged by purge_stale_cache_keys
+    'CACHE': 'default',
+    # days the deleted accounts (status=False) are kept
+    'DELETED_USER_RETENTION_DAYS': 30,
+    # copy them to user_auth_archive before their delete
+    'ARCHIVE_DELETED_USERS': True,
+    # days the silk and monitoring profiles and slow queries are kept
+    'PROFILE_RETENTION_DAYS': 7,
+    # hours the unused blobs of the media storage are kept, the row of a
+    # file just stored may not be saved yet
+    'UNUSED_BLOB_RETENTION_HOURS': 24,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'MAINTENANCE', {})}
+
+
+@contextmanager
+def lock(name, timeout):
+    """
+    Hold the lock ``name`` of the cache, yield whether it was acquired.
+    The lock expires after ``timeout`` seconds if its holder dies.
+    """
+    cache = caches[get_config()['CACHE']]
+    key = f'maintenance-lock:{name}'
+    token = uuid.uuid4().hex
+    acquired = cache.add(key, token, timeout)
+    try:
+        yield acquired
+    finally:
+        # it may have expired and been taken by another run meanwhile
+        if acquired and cache.get(key) == token:
+            cache.delete(key)
+
+
+class MaintenanceRun:
+    """
+    Configuration and time budget of a run of a maintenance task.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.deadline = time.monotonic() + config['MAX_DURATION']
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.deadline
+
+    def pause(self):
+        time.sleep(self.config['PAUSE'])
+
+    def delete(self, queryset, before_delete=None):
+        """
+        Delete the rows of ``queryset`` (and the ones that cascade) in
+        batches, return the number of rows of its model deleted.
+        ``before_delete(pks)`` is called with each batch before its delete,
+        in the same transaction (to archive the rows, remove their files).
+        """
+        model = queryset.model
+        batch_size = self.config['BATCH_SIZE']
+        total = 0
+        while not self.expired:
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                if before_delete is not None:
+                    before_delete(pks)
+                _, deleted = model._base_manager.filter(pk__in=pks).delete()
+            total += deleted.get(model._meta.label, 0)
+            if len(pks) < batch_size:
+                break
+            self.pause()
+        return total
+
+
+def maintenance_task(func):
+    """
+    Make ``func(run)`` a Celery task that runs once at a time and logs the
+    number of rows it processed. The task returns that number, or None
+    when another run holds the lock.
+    """
+    config = get_config()
+    # the run stops by itself at MAX_DURATION, the limits are a safety net
+    time_limit = config['MAX_DURATION'] + 120
+
+    @app.task(name=f'{func.__module__}.{func.__name__}',
+              soft_time_limit=config['MAX_DURATION'] + 60,
+              time_limit=time_limit)
+    @functools.wraps(func)
+    def task():
+        with lock(func.__name__, time_limit) as acquired:
+            if not acquired:
+                logger.info('%s is already running, skipped.', func.__name__)
+                return None
+            start = time.monotonic()
+            count = func(MaintenanceRun(get_config()))
+            logger.info('%s processed %d rows in %.1f s.', func.__name__,
+                        count, time.monotonic() - start)
+            return count
+
+    return task
@@ -0,0 +1,202 @@
+import secrets
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from corsheaders.middleware import CorsMiddleware as BaseCorsMiddleware
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from apps.monitoring.timing import get_timing
+from core.compression import COMPRESSORS, select_encoding
+
+DEFAULTS = {
+    'ENABLED': True,
+    'ENCODINGS': ['zstd', 'br', 'gzip'],
+    'MIN_SIZE': 1024,
+    'LEVELS': {'gzip': 6, 'br': 4, 'zstd': 3},
+    # up to this many random bytes of padding in the gzip header (BREACH),
+    # 0 to disable it
+    'MAX_RANDOM_BYTES': 100,
+    'EXCLUDED_CONTENT_TYPES': (
+        'image/', 'video/', 'audio/', 'font/woff', 'application/zip',
+        'application/gzip', 'application/x-gzip', 'application/zstd',
+    ),
+}
+
+
+class CompressionMiddleware:
+    """
+    Middleware that compresses the responses with the encoding negotiated
+    from the ``Accept-Encoding`` header: zstd, brotli or gzip, in the order
+    of ``settings.COMPRESSION['ENCODINGS']`` when the client accepts more
+    than one with the same quality.
+
+    Responses smaller than ``MIN_SIZE`` bytes are not compressed (the
+    headers cost more than what is saved) and streaming responses are
+    compressed chunk by chunk, each chunk is flushed so the client gets it
+    without waiting for the next one. ``LEVELS`` is the level of each
+    encoding, higher levels use more CPU for smaller responses.
+
+    The gzip responses get up to ``MAX_RANDOM_BYTES`` of random padding
+    against BREACH, like the GZipMiddleware of Django. brotli and zstd
+    cannot carry it: the responses that may hold the secrets of a cookie
+    authenticated session (text/html, ``Cache-Control`` private or
+    no-store) are only compressed with gzip. The API responses are only
+    sent to a bearer token, a cross site request cannot get them.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.config = {**DEFAULTS, **getattr(settings, 'COMPRESSION', {})}
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.levels = {**DEFAULTS['LEVELS'], **self.config['LEVELS']}
+        self.excluded_content_types = tuple(
+            self.config['EXCLUDED_CONTENT_TYPES'])
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or (
+                response.has_header('Content-Range')):
+            return response
+        content_type = response.get('Content-Type', '').lower()
+        if content_type.startswith(self.excluded_content_types):
+            return response
+        if not response.streaming and (
+                len(response.content) < self.config['MIN_SIZE']):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        max_random_bytes = self.config['MAX_RANDOM_BYTES']
+        encodings = self.config['ENCODINGS']
+        if max_random_bytes and self.may_hold_secrets(response):
+            encodings = [encoding for encoding in encodings
+                         if encoding in COMPRESSORS and
+                         COMPRESSORS[encoding].padded]
+        encoding = select_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), encodings)
+        if encoding is None:
+            return response
+        compressor_class = COMPRESSORS[encoding]
+        level = self.levels[encoding]
+        options = {}
+        if max_random_bytes and compressor_class.padded:
+            options['padding'] = secrets.randbelow(max_random_bytes + 1)
+
+        if response.streaming:
+            compressor = compressor_class(level, **options)
+            if response.is_async:
+                response.streaming_content = self.compress_async_stream(
+                    compressor, response.streaming_content)
+            else:
+                response.streaming_content = self.compress_stream(
+                    compressor, response.streaming_content)
+            # the length is not known
+            del response.headers['Content-Length']
+        else:
+            with get_timing(request).measure('compress'):
+                compressed = compressor_class.compress_all(
+                    response.content, level, **options)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # the compressed body is not byte for byte the same
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def may_hold_secrets(response):
+        if response.get('Content-Type', '').lower().startswith('text/html'):
+            return True
+        directives = {directive.split('=')[0].strip() for directive in
+                      response.get('Cache-Control', '').lower().split(',')}
+        return bool(directives & {'private', 'no-store'})
+
+    @staticmethod
+    def compress_stream(compressor, chunks):
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    async def compress_async_stream(compressor, chunks):
+        async for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class CorsMiddleware(BaseCorsMiddleware):
+    """
+    django-cors-headers' CorsMiddleware, with an async ``process_view`` in
+    async chains: Django would run the sync one in a thread on each request.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            self.process_view = self.aprocess_view
+
+    async def aprocess_view(self, request, callback, callback_args,
+                            callback_kwargs):
+        return super().process_view(
+            request, callback, callback_args, callback_kwargs)
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Middleware that sends the rate limit of the request the closest to its
+    limit (core.throttling) in the ``RateLimit-Limit``,
+    ``RateLimit-Remaining`` and ``RateLimit-Reset`` (seconds) headers, see
+    https://datatracker.ietf.org/doc/draft-ietf-httpapi-ratelimit-headers/.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            response.headers['RateLimit-Limit'] = str(rate_limit['limit'])
+            response.headers['RateLimit-Remaining'] = str(
+                rate_limit['remaining'])
+            response.headers['RateLimit-Reset'] = str(rate_limit['reset'])
+        return response
@@ -0,0 +1,28 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+ANY_MEDIA_TYPE = ('', '*/*')
+
+
+class FastPathContentNegotiation(DefaultContentNegotiation):
+    """
+    Content negotiation that skips parsing and ordering the ``Accept`` header
+    for the usual API clients: a single media type selects the first renderer
+    of that type (``application/json``, ``application/msgpack``) and ``*/*``
+    (or no header) the first renderer, the same result
+    ``DefaultContentNegotiation`` gives.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        accept = request.META.get('HTTP_ACCEPT', '')
+        format_query_param = self.settings.URL_FORMAT_OVERRIDE
+        if format_suffix or (format_query_param and
+                             format_query_param in request.query_params):
+            return super().select_renderer(request, renderers, format_suffix)
+
+        if accept in ANY_MEDIA_TYPE and renderers:
+            return renderers[0], renderers[0].media_type
+        for renderer in renderers:
+            if renderer.media_type == accept:
+                return renderer, accept
+
+        return super().select_renderer(request, renderers, format_suffix)
@@ -0,0 +1,146 @@
+"""
+OpenAPI schema of the API, served from a file generated at build time.
+
+``manage.py generate_openapi_schema`` writes the schema (JSON and YAML) to
+``settings.OPENAPI_SCHEMA_DIR``, the views below serve those files without
+introspecting the views and serializers on each request:
+
+    * ``swagger.json/`` and ``swagger.yaml/`` with an ETag, revalidated by
+      the clients on every request (a 304 when it did not change).
+    * ``swagger.<digest>.json/`` (and yaml) with immutable caching, the URL
+      changes with the content. The swagger and redoc UIs load this one.
+
+When the files do not exist (development) the schema is generated once per
+process.
+"""
+
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+logger = logging.getLogger(__name__)
+
+API_INFO = openapi.Info(
+    title="Snippets API",
+    default_version='v1',
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+FORMATS = {
+    '.json': (OpenAPICodecJson, 'application/json'),
+    '.yaml': (OpenAPICodecYaml, 'application/yaml'),
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# format -> (content, digest), loaded once per process
+_schemas = {}
+
+
+def generate_schema(format):
+    """
+    Return the schema of every url of ``ROOT_URLCONF`` encoded in
+    ``format`` ('.json' or '.yaml').
+    """
+    codec_class, _ = FORMATS[format]
+    schema = OpenAPISchemaGenerator(API_INFO).get_schema(
+        request=None, public=True)
+    # the validation is done by generate_openapi_schema, not on each load
+    return codec_class(validators=[]).encode(schema)
+
+
+def get_schema_path(format):
+    return os.path.join(settings.OPENAPI_SCHEMA_DIR, f'swagger{format}')
+
+
+def get_schema(format):
+    """
+    Return the content and the digest of the schema in ``format``.
+    """
+    if format not in _schemas:
+        try:
+            with open(get_schema_path(format), 'rb') as schema_file:
+                content = schema_file.read()
+        except FileNotFoundError:
+            logger.warning('%s does not exist, run generate_openapi_schema.',
+                           get_schema_path(format))
+            content = generate_schema(format)
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        _schemas[format] = (content, digest)
+    return _schemas[format]
+
+
+def get_schema_url(format):
+    """
+    Return the immutable url of the current schema in ``format``.
+    """
+    _, digest = get_schema(format)
+    return reverse('schema-immutable',
+                   kwargs={'digest': digest, 'format': format})
+
+
+def schema_file_view(request, format, digest=None):
+    """
+    Serve the generated schema, with immutable caching when the url has the
+    digest of the content.
+    """
+    if format not in FORMATS:
+        raise Http404()
+    content, current_digest = get_schema(format)
+    if digest is not None and digest != current_digest:
+        # a schema of a previous version, it is not kept
+        return HttpResponseRedirect(reverse('schema-json',
+                                            kwargs={'format': format}))
+
+    etag = f'"{current_digest}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type=FORMATS[format][1])
+    response['ETag'] = etag
+    response['Cache-Control'] = IMMUTABLE if digest else 'no-cache'
+    return response
+
+
+class FileSwaggerUIRenderer(SwaggerUIRenderer):
+    """
+    Swagger UI that loads the generated schema.
+    """
+
+    def get_swagger_ui_settings(self):
+        data = super().get_swagger_ui_settings()
+        data['url'] = get_schema_url('.json')
+        return data
+
+
+class FileReDocRenderer(ReDocRenderer):
+    """
+    ReDoc that loads the generated schema.
+    """
+
+    def get_redoc_settings(self):
+        data = super().get_redoc_settings()
+        data['url'] = get_schema_url('.json')
+        return data
+
+
+# only renders the UIs, their schema is not generated (drf_yasg does not
+# introspect the urls for the UI renderers)
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
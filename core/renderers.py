@@ -0,0 +1,73 @@
+"""
+Fast renderers for the API.
+
+``FastJSONRenderer`` serializes with orjson when it is installed (UUID,
+datetime, date and time are native types there) and falls back to the DRF
+renderer, which uses the stdlib json module, when it is not.
+``MessagePackRenderer`` is meant for the internal services, its payloads are
+smaller and cheaper to decode than JSON.
+"""
+
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# types orjson and msgpack do not know (Decimal, timedelta, lazy strings,
+# querysets...) are converted like the DRF encoder does
+_drf_encoder = encoders.JSONEncoder()
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` that uses orjson if it is importable.
+
+    Indented output (``Accept: application/json; indent=4`` or the browsable
+    API) is still rendered by the stdlib, orjson only knows two spaces.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data, default=_drf_encoder.default, option=ORJSON_OPTIONS)
+
+        # escape U+2028 and U+2029 like JSONRenderer, so the output is still
+        # a strict javascript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+                b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renderer which serializes to MessagePack.
+
+    The values without a MessagePack type (UUID, datetime, Decimal...) are
+    converted like in the JSON output, so both formats carry the same data.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(
+            data, default=_drf_encoder.default, use_bin_type=True)
@@ -3,6 +3,7 @@ import datetime
 import os
 import environ
 import psycopg2.extensions
+from celery.schedules import crontab
 from corsheaders.defaults import default_headers
 from channels.routing import ProtocolTypeRouter
 from django.core.asgi import get_asgi_application
@@ -35,7 +36,8 @@ else:
 
 DJANGO_APPS = [
     # 'daphne', # is a HTTP, HTTP2 and WebSocket protocol
-    'django.contrib.admin',
+    # admin modules are imported on the first admin request, see core.admin_urls
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -83,10 +85,17 @@ CKEDITOR_CONFIGS = {
     }
 }
 CKEDITOR_UPLOAD_PATH = "/media/"
+# the uploader is not routed (core.urls). Its files would be blobs of the
+# media storage that no row uses, deleted by purge_unused_blobs: give it a
+# storage that is not content addressed (CKEDITOR_STORAGE_BACKEND) first
 
 
 MIDDLEWARE = [
-    'corsheaders.middleware.CorsMiddleware',
+    'apps.monitoring.middleware.ServerTimingMiddleware',
+    'apps.monitoring.middleware.MetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.CorsMiddleware',
+    'core.middleware.RateLimitHeadersMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -95,10 +104,69 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'social_django.middleware.SocialAuthExceptionMiddleware',
+    'apps.monitoring.middleware.ProfilingMiddleware',
+    'apps.monitoring.middleware.QueryBudgetMiddleware',
+    'apps.monitoring.middleware.SlowQueryMiddleware',
+]
+
+# Middleware that does nothing for the token authenticated API (no sessions,
+# cookies or html), core.handlers skips it for API_MIDDLEWARE_PREFIXES
+BROWSER_ONLY_MIDDLEWARE = [
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'social_django.middleware.SocialAuthExceptionMiddleware',
     'silk.middleware.SilkyMiddleware',
-    'social_django.middleware.SocialAuthExceptionMiddleware'
 ]
 
+API_MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in BROWSER_ONLY_MIDDLEWARE
+]
+
+API_MIDDLEWARE_PREFIXES = env.list('API_MIDDLEWARE_PREFIXES', default=[
+    '/api/',
+    '/users/',
+    '/signup/',
+    '/change_password/',
+    '/metrics',
+])
+
+# Middleware that wraps the database connection of the request thread, the
+# queries of the async views run in other threads: it would see none of them
+# and, being sync only, it would make the requests hop to a thread
+DATABASE_WRAPPER_MIDDLEWARE = [
+    'apps.monitoring.middleware.ProfilingMiddleware',
+    'apps.monitoring.middleware.QueryBudgetMiddleware',
+    'apps.monitoring.middleware.SlowQueryMiddleware',
+]
+
+# The chain of the async views (apps.*.async_views), all of it is async
+# capable: under ASGI only their queries leave the event loop (the async ORM
+# of Django 4.2 runs them in a thread)
+ASYNC_API_MIDDLEWARE = [
+    middleware for middleware in API_MIDDLEWARE
+    if middleware not in DATABASE_WRAPPER_MIDDLEWARE
+]
+
+ASYNC_API_MIDDLEWARE_PREFIXES = env.list(
+    'ASYNC_API_MIDDLEWARE_PREFIXES', default=['/api/async/'])
+
+# Paths resolved by core.warmup before gunicorn forks the workers (their
+# urls, views and serializers are loaded once, in the master)
+WARM_UP_PATHS = env.list('WARM_UP_PATHS', default=[
+    '/users/',
+    '/signup/',
+    '/change_password/warm-up/',
+    '/api/token/',
+    '/api/token/refresh/',
+    '/metrics',
+])
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -148,6 +216,32 @@ CORS_ORIGIN_WHITELIST = [
     'http://localhost:8000',
 ]
 
+# the headers of the resumable uploads (apps.files), of the idempotent
+# requests (core.idempotency) and of the rate limits (core.throttling)
+CORS_ALLOW_HEADERS = [
+    *default_headers,
+    'tus-resumable',
+    'upload-length',
+    'upload-metadata',
+    'upload-offset',
+    'idempotency-key',
+]
+CORS_EXPOSE_HEADERS = [
+    'location',
+    'tus-resumable',
+    'tus-version',
+    'tus-extension',
+    'tus-max-size',
+    'upload-expires',
+    'upload-length',
+    'upload-offset',
+    'idempotent-replayed',
+    'ratelimit-limit',
+    'ratelimit-remaining',
+    'ratelimit-reset',
+    'retry-after',
+]
+
 CSRF_TRUSTED_ORIGINS = [
     'http://localhost:3000',
     'http://localhost:8000',
@@ -206,15 +300,21 @@ STATIC_URL = '/static/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+# every file stored once, by its content (core.storage_backends)
+DEFAULT_FILE_STORAGE = 'core.storage_backends.ContentAddressedFileSystemStorage'
 
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'build/static')
 ]
 
+# OpenAPI schema written by manage.py generate_openapi_schema, see core.openapi
+OPENAPI_SCHEMA_DIR = env('OPENAPI_SCHEMA_DIR', default=os.path.join(BASE_DIR, 'build/openapi'))
+
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.FastJSONRenderer',
+        'core.renderers.MessagePackRenderer',
         'rest_framework.renderers.AdminRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
@@ -226,15 +326,34 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_PARSER_CLASSES': (
-        'rest_framework.parsers.JSONParser',
+        'core.parsers.FastJSONParser',
+        'core.parsers.MessagePackParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser'
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'core.negotiation.FastPathContentNegotiation',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    # sliding window counters in the cache (core.throttling)
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.AnonRateThrottle',
+        'core.throttling.UserRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': env('THROTTLE_RATE_ANON', default='120/min'),
+        'user': env('THROTTLE_RATE_USER', default='1200/min'),
+        # per IP (per user for signup/, it needs a login)
+        'login': env('THROTTLE_RATE_LOGIN', default='30/min'),
+        'signup': env('THROTTLE_RATE_SIGNUP', default='30/hour'),
+        # per account named in the body
+        'login_identifier': env('THROTTLE_RATE_LOGIN_IDENTIFIER', default='10/min'),
+        'signup_identifier': env('THROTTLE_RATE_SIGNUP_IDENTIFIER', default='5/hour'),
+    },
+    # proxies in front of the app, the client IP is taken from X-Forwarded-For
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=None),
 }
 
 
@@ -267,16 +386,193 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': datetime.timedelta(days=1),
 }
 
+# Seconds the async views (apps.jwt_custom_auth.async_authentication) keep
+# the user of a token in the cache, it is forgotten when the user is saved
+JWT_USER_CACHE_TIMEOUT = env.int('JWT_USER_CACHE_TIMEOUT', default=60)
+
+# Query budget
+# views declare the maximum number of queries per request with
+# apps.monitoring.query_budget.query_budget, see QueryBudgetMiddleware
+QUERY_BUDGET = {
+    'ENABLED': env.bool('QUERY_BUDGET_ENABLED', default=False),
+    'DEFAULT_MAX_QUERIES': None,
+    'ACTION': env('QUERY_BUDGET_ACTION', default='log'),
+}
+
+# Profiling
+# a sample of the requests is profiled by ProfilingMiddleware and saved in
+# batches, use `manage.py profiling_token` to profile a single request
+PROFILING = {
+    'ENABLED': env.bool('PROFILING_ENABLED', default=True),
+    'SAMPLE_RATE': env.float('PROFILING_SAMPLE_RATE', default=0.0),
+    'PATHS': env.list('PROFILING_PATHS', default=[]),
+    'PYTHON_PROFILER': env.bool('PROFILING_PYTHON_PROFILER', default=False),
+}
+
+# Compression
+# responses compressed with the encoding negotiated by Accept-Encoding (in
+# order of preference), LEVELS trade CPU for bandwidth, see
+# core.middleware.CompressionMiddleware
+COMPRESSION = {
+    'ENABLED': env.bool('COMPRESSION_ENABLED', default=True),
+    'ENCODINGS': env.list('COMPRESSION_ENCODINGS', default=['zstd', 'br', 'gzip']),
+    'MIN_SIZE': env.int('COMPRESSION_MIN_SIZE', default=1024),
+    'LEVELS': {
+        'gzip': env.int('COMPRESSION_GZIP_LEVEL', default=6),
+        'br': env.int('COMPRESSION_BROTLI_LEVEL', default=4),
+        'zstd': env.int('COMPRESSION_ZSTD_LEVEL', default=3),
+    },
+    # random padding of the gzip responses against BREACH, 0 disables it
+    'MAX_RANDOM_BYTES': env.int('COMPRESSION_MAX_RANDOM_BYTES', default=100),
+}
+
+# Server timing
+# phases of each request (auth, db, serialize, render...) in the
+# Server-Timing header and in a log line, see ServerTimingMiddleware
+SERVER_TIMING = {
+    'ENABLED': env.bool('SERVER_TIMING_ENABLED', default=False),
+    'HEADER': env.bool('SERVER_TIMING_HEADER', default=True),
+    'LOG': env.bool('SERVER_TIMING_LOG', default=True),
+}
+
+# Metrics
+# Prometheus metrics served on /metrics, only to requests with the
+# METRICS_TOKEN bearer token or from METRICS_ALLOWED_NETWORKS
+METRICS = {
+    'ENABLED': env.bool('METRICS_ENABLED', default=True),
+    'TOKEN': env('METRICS_TOKEN', default=None),
+    'ALLOWED_NETWORKS': env.list(
+        'METRICS_ALLOWED_NETWORKS', default=['127.0.0.1/32']),
+}
+
+# Slow queries
+# queries slower than SLOW_QUERIES_THRESHOLD_MS are saved with their view and
+# stack, see `manage.py slow_query_report`
+SLOW_QUERIES = {
+    'ENABLED': env.bool('SLOW_QUERIES_ENABLED', default=True),
+    'THRESHOLD_MS': env.int('SLOW_QUERIES_THRESHOLD_MS', default=200),
+    'EXPLAIN_SAMPLE_RATE': env.float(
+        'SLOW_QUERIES_EXPLAIN_SAMPLE_RATE', default=0.0),
+}
+
 FILE_UPLOAD_PERMISSIONS = 0o640
 
+# resumable uploads (apps.files), the directory is shared by the web and the
+# worker containers
+RESUMABLE_UPLOADS = {
+    'DIRECTORY': env('RESUMABLE_UPLOADS_DIRECTORY',
+                     default=os.path.join(BASE_DIR, 'uploads')),
+    'MAX_SIZE': env.int('RESUMABLE_UPLOADS_MAX_SIZE', default=1024 ** 3),
+    'EXPIRATION': env.int('RESUMABLE_UPLOADS_EXPIRATION', default=24 * 60 * 60),
+}
+
+# Media files behind the permission check of apps.files.views.MediaView, sent
+# by the front proxy: 'x-accel-redirect' with nginx and
+#   location /protected-media/ { internal; alias /app/core/media/; }
+# 'x-sendfile' with apache mod_xsendfile, 'django' streams them from the view
+MEDIA_SERVING = {
+    'BACKEND': env('MEDIA_SERVING_BACKEND', default='django'),
+    'INTERNAL_URL': env('MEDIA_SERVING_INTERNAL_URL', default='/protected-media/'),
+}
+
+# Celery (core.taskapp)
+CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://redis:6379/0')
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_SERIALIZER = 'json'
+# the tasks are fire and forget, nothing reads their results
+CELERY_TASK_IGNORE_RESULT = True
+# a task is acknowledged when it is done, a worker that dies does not lose it
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_SOFT_TIME_LIMIT = env.int('CELERY_TASK_SOFT_TIME_LIMIT', default=60)
+CELERY_TASK_TIME_LIMIT = env.int('CELERY_TASK_TIME_LIMIT', default=120)
+# the maintenance tasks (core.maintenance), at night, one after the other
+CELERY_BEAT_SCHEDULE = {
+    'purge-expired-tokens': {
+        'task': 'apps.jwt_custom_auth.tasks.purge_expired_tokens',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'purge-profiles': {
+        'task': 'apps.monitoring.tasks.purge_profiles',
+        'schedule': crontab(hour=3, minute=10),
+    },
+    'purge-deleted-users': {
+        'task': 'apps.user.tasks.purge_deleted_users',
+        'schedule': crontab(hour=3, minute=20),
+    },
+    'purge-stale-cache-keys': {
+        'task': 'core.tasks.purge_stale_cache_keys',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    # the abandoned uploads take disk space, every hour
+    'purge-expired-uploads': {
+        'task': 'apps.files.tasks.purge_expired_uploads',
+        'schedule': crontab(minute=40),
+    },
+    'purge-unused-blobs': {
+        'task': 'apps.files.tasks.purge_unused_blobs',
+        'schedule': crontab(hour=3, minute=50),
+    },
+    # the emails of the batches of the workers that died (core.mail)
+    'flush-email-queue': {
+        'task': 'core.tasks.flush_email_queue',
+        'schedule': crontab(minute='*/5'),
+    },
+}
+
+# core.maintenance
+MAINTENANCE = {
+    'BATCH_SIZE': env.int('MAINTENANCE_BATCH_SIZE', default=500),
+    'PAUSE': env.float('MAINTENANCE_PAUSE', default=0.5),
+    'MAX_DURATION': env.int('MAINTENANCE_MAX_DURATION', default=300),
+    'DELETED_USER_RETENTION_DAYS': env.int(
+        'DELETED_USER_RETENTION_DAYS', default=30),
+    'ARCHIVE_DELETED_USERS': env.bool('ARCHIVE_DELETED_USERS', default=True),
+    'PROFILE_RETENTION_DAYS': env.int('PROFILE_RETENTION_DAYS', default=7),
+    'UNUSED_BLOB_RETENTION_HOURS': env.int(
+        'UNUSED_BLOB_RETENTION_HOURS', default=24),
+}
+
+# core.idempotency, the Idempotency-Key of signup/ and api/token/
+IDEMPOTENCY = {
+    'TTL': env.int('IDEMPOTENCY_TTL', default=24 * 60 * 60),
+    # a retry of a running request waits for its response holding a sync
+    # worker (seconds), then gets a 409
+    'WAIT': env.float('IDEMPOTENCY_WAIT', default=2),
+}
+
+# the tasks run eagerly in the tests
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# the user photos are resized to this size (in pixels) by
+# apps.user.tasks.process_user_photo, which also makes their square
+# thumbnails of these sizes (name -> pixels)
+USER_PHOTO_MAX_SIZE = env.int('USER_PHOTO_MAX_SIZE', default=1024)
+USER_PHOTO_SIZES = {
+    'small': 64,
+    'medium': 256,
+}
+
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# core.mail.QueuedEmailBackend, the worker sends the messages with BACKEND
+EMAIL_QUEUE = {
+    'BACKEND': 'django.core.mail.backends.console.EmailBackend',
+    'BATCH_SIZE': env.int('EMAIL_QUEUE_BATCH_SIZE', default=100),
+    'FLUSH_DELAY': env.int('EMAIL_QUEUE_FLUSH_DELAY', default=2),
+    'MAX_RETRIES': env.int('EMAIL_QUEUE_MAX_RETRIES', default=5),
+    'RETRY_DELAY': env.int('EMAIL_QUEUE_RETRY_DELAY', default=30),
+    'ACK_TIMEOUT': env.int('EMAIL_QUEUE_ACK_TIMEOUT', default=300),
+}
+
 
 # configuración para aws
 if not DEBUG:
     DEFAULT_FROM_EMAIL = "Uridium <mail@uridium.network>"
     EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    EMAIL_QUEUE['BACKEND'] = EMAIL_BACKEND
     EMAIL_HOST = env('EMAIL_HOST')
     EMAIL_HOST_USER = env('EMAIL_HOST_USER')
     EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
@@ -311,9 +607,11 @@ if not DEBUG:
 # django channels settings
 ASGI_APPLICATION = 'core.asgi.application'
 
-# CHANNEL_LAYERS = {
-#     'default': {
-#         'BACKEND': 'channels_redis.core.RedisChannelLayer',
-#         'CONFIG': {'hosts': [('localhost', 6379)]},
-#     },
-# }
+# Channel layer of the websockets (apps.user.consumers), in memory: only the
+# connections of the same process get the messages (local, tests).
+# Production uses redis
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
@@ -21,11 +21,34 @@ if RENDER_EXTERNAL_HOSTNAME:
 # Cache
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'apps.monitoring.cache.InstrumentedLocMemCache',
         'LOCATION': ''
     }
 }
 
+# Query budget
+QUERY_BUDGET = {
+    'ENABLED': env.bool('QUERY_BUDGET_ENABLED', default=True),
+    'DEFAULT_MAX_QUERIES': None,
+    'ACTION': env('QUERY_BUDGET_ACTION', default='raise'),
+}
+
+# Server timing
+SERVER_TIMING = {
+    'ENABLED': env.bool('SERVER_TIMING_ENABLED', default=True),
+    'HEADER': True,
+    'LOG': env.bool('SERVER_TIMING_LOG', default=False),
+}
+
+# Silk
+# it saves every intercepted request inline, so it is only added on demand
+# and it follows the same sampling as ProfilingMiddleware
+if env.bool('SILK_ENABLED', default=False):
+    from apps.monitoring.sampling import should_profile
+
+    MIDDLEWARE += ['silk.middleware.SilkyMiddleware']  # noqa F405
+    SILKY_INTERCEPT_FUNC = should_profile
+
 # Templates
 TEMPLATES[0]['OPTIONS']['debug'] = DEBUG  # NOQA
 
@@ -34,6 +57,10 @@ EMAIL_BACKEND = env('DJANGO_EMAIL_BACKEND',
                     default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = 'localhost'
 EMAIL_PORT = 1025
+# with DJANGO_EMAIL_BACKEND=core.mail.QueuedEmailBackend the queued messages
+# are written to the console (the queue is in memory with locmem, the tasks
+# must run eagerly)
+EMAIL_QUEUE['BACKEND'] = 'django.core.mail.backends.console.EmailBackend'  # noqa F405
 
 # django-extensions
 # INSTALLED_APPS += ['django_extensions']  # noqa F405
@@ -15,7 +15,7 @@ DATABASES['default']['CONN_MAX_AGE'] = env.int('CONN_MAX_AGE', default=60)  # NO
 # Cache
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'apps.monitoring.cache.InstrumentedRedisCache',
         'LOCATION': env('REDIS_URL'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
@@ -24,6 +24,26 @@ CACHES = {
     }
 }
 
+# Channels
+# the websockets of every worker get the messages of the others
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [env('CHANNEL_LAYER_REDIS_URL',
+                          default=env('REDIS_URL'))],
+        },
+    },
+}
+
+# Django Rest Framework
+# JSON and MessagePack only, no browsable API or admin (HTML) renderers
+if not env.bool('DJANGO_API_HTML_RENDERERS', default=False):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (  # noqa F405
+        'core.renderers.FastJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+    )
+
 # Security
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 SECURE_SSL_REDIRECT = env.bool('DJANGO_SECURE_SSL_REDIRECT', default=True)
@@ -49,7 +69,8 @@ AWS_S3_OBJECT_PARAMETERS = {
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Media
-DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+# stored by their content in the bucket, with an immutable Cache-Control
+DEFAULT_FILE_STORAGE = 'core.storage_backends.MediaStore'
 MEDIA_URL = f'https://{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com/'
 
 # Templates
@@ -77,7 +98,9 @@ ADMIN_URL = env('DJANGO_ADMIN_URL')
 
 # Anymail (Mailgun)
 INSTALLED_APPS += ['anymail']  # noqa F405
-EMAIL_BACKEND = 'anymail.backends.mailgun.EmailBackend'
+# the requests only queue the messages, the worker sends them to mailgun
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+EMAIL_QUEUE['BACKEND'] = 'anymail.backends.mailgun.EmailBackend'  # noqa F405
 ANYMAIL = {
     'MAILGUN_API_KEY': env('MAILGUN_API_KEY'),
     'MAILGUN_SENDER_DOMAIN': env('MAILGUN_DOMAIN')
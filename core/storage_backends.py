@@ -0,0 +1,134 @@
+"""
+Storages of the media files (DEFAULT_FILE_STORAGE).
+
+They are content addressed: a file is stored once, under the sha256 of its
+content (``blobs/ab/cd/abcd...ef.jpg``), whatever the name it is saved
+with. The same photo uploaded twice is one file, and the content behind a
+name never changes, so its url can be cached forever (``cache_control``,
+set on the S3 objects).
+
+The names derived from a blob, its name with a suffix before the
+extension (the thumbnails ``<digest>_small.webp`` of the user photos, the
+``_thumb`` of ckeditor), are saved as they are: they are made from the
+blob, they do not change either. A blob may be used by several files,
+``delete`` keeps it: apps.files.tasks.purge_unused_blobs deletes the
+blobs no row uses anymore.
+"""
+
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+try:
+    from storages.backends.s3boto3 import S3Boto3Storage
+except ImproperlyConfigured:  # pragma: no cover
+    # boto3 is only installed in production
+    S3Boto3Storage = None
+
+BLOB_DIRECTORY = 'blobs'
+BLOB_NAME = re.compile(
+    rf'^{BLOB_DIRECTORY}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{64}}')
+
+
+def get_blob_name(digest, extension):
+    return f'{BLOB_DIRECTORY}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def get_blob_digest(name):
+    """
+    sha256 of the blob of ``name`` (a blob or a name derived from one),
+    None for the other names.
+    """
+    match = BLOB_NAME.match(name.replace('\\', '/'))
+    return match.group(0)[-64:] if match else None
+
+
+def is_content_addressed(name):
+    """
+    Whether ``name`` is a blob or a name derived from one.
+    """
+    return BLOB_NAME.match(name.replace('\\', '/')) is not None
+
+
+class ContentAddressedStorageMixin:
+    """
+    Content addressing over a storage, see the module documentation.
+    """
+
+    chunk_size = 64 * 1024
+    # a year, the content of a blob never changes
+    cache_control = 'public, max-age=31536000, immutable'
+
+    def get_digest(self, content):
+        """
+        sha256 of ``content``, read by chunks: an upload is never read
+        whole in memory.
+        """
+        digest = hashlib.sha256()
+        for chunk in content.chunks(self.chunk_size):
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+
+        if is_content_addressed(name):
+            stored_name = name
+        else:
+            extension = os.path.splitext(name)[1].lower()
+            stored_name = get_blob_name(self.get_digest(content), extension)
+        # already stored, by this upload or another one with that content
+        if self.exists(stored_name):
+            return stored_name
+        name = self._save(stored_name, content)
+        if name != stored_name:
+            # FileSystemStorage renames it when another process just stored
+            # the same blob
+            super().delete(name)
+        return stored_name
+
+    def delete(self, name):
+        if not is_content_addressed(name):
+            super().delete(name)
+
+    def delete_blob(self, name):
+        """
+        Delete the blob (or derived file) ``name``, it must not be used
+        anymore (purge_unused_blobs).
+        """
+        super().delete(name)
+
+
+class ContentAddressedFileSystemStorage(ContentAddressedStorageMixin,
+                                        FileSystemStorage):
+    """
+    Content addressed storage in MEDIA_ROOT.
+    """
+
+
+if S3Boto3Storage is not None:
+    class MediaStore(ContentAddressedStorageMixin, S3Boto3Storage):
+        """
+        Content addressed storage in the S3 bucket, under
+        ``PUBLIC_MEDIA_LOCATION``.
+        """
+
+        location = getattr(settings, 'PUBLIC_MEDIA_LOCATION', '')
+
+        def get_object_parameters(self, name):
+            params = super().get_object_parameters(name)
+            # the key of the object, with the location in front
+            if is_content_addressed(name[len(self.location):].lstrip('/')):
+                params['CacheControl'] = self.cache_control
+            return params
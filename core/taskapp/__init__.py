@@ -0,0 +1,3 @@
+from .celery import app, delay_on_commit
+
+__all__ = ('app', 'delay_on_commit')
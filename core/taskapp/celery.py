@@ -0,0 +1,30 @@
+"""
+Celery application of the project (``celery -A core.taskapp``).
+
+Its settings are the ``CELERY_*`` ones of core.settings, the tasks are the
+``tasks`` modules of the apps and of core. The views send the tasks with
+``delay_on_commit`` so the worker never reads rows the request did not
+commit yet. The tests run the tasks eagerly (core.test_runner).
+"""
+
+import os
+from functools import partial
+
+from celery import Celery
+from django.db import transaction
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+app = Celery('core')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+# core is not an app, core.tasks sends the queued emails
+app.autodiscover_tasks(['core'])
+
+
+def delay_on_commit(task, *args, **kwargs):
+    """
+    Send ``task`` once the current transaction is committed (at once
+    outside of a transaction).
+    """
+    transaction.on_commit(partial(task.delay, *args, **kwargs))
@@ -0,0 +1,127 @@
+"""
+Tasks of the project that do not belong to an app: the sending of the
+queued emails (core.mail) and the purge of the stale cache keys.
+"""
+
+import logging
+
+from django.core.cache import caches
+from django.core.mail import get_connection
+from django_redis import get_redis_connection
+from django_redis.cache import RedisCache
+
+from core.mail import get_config, get_email_queue, send_batch
+from core.maintenance import maintenance_task
+from core.taskapp import app
+
+logger = logging.getLogger(__name__)
+
+
+def retry_failed(config, failed, attempt):
+    """
+    Retry the failed messages with a backoff, or drop them after
+    ``MAX_RETRIES`` attempts.
+    """
+    if attempt > config['MAX_RETRIES']:
+        for _, error in failed:
+            logger.error('Email dropped after %d attempts: %r',
+                         attempt, error)
+        return
+    logger.warning('%d emails failed (%r), retry %d of %d.', len(failed),
+                   failed[0][1], attempt, config['MAX_RETRIES'])
+    retry_emails.apply_async(
+        ([payload for payload, _ in failed], attempt + 1),
+        countdown=config['RETRY_DELAY'] * 2 ** (attempt - 1))
+
+
+@app.task
+def flush_email_queue():
+    """
+    Send the queued emails in batches of ``BATCH_SIZE`` messages, all of
+    them over one connection, after queuing again the batches of the
+    workers that died. Also run by beat, for these batches. Return the
+    number of messages taken from the queue.
+    """
+    config = get_config()
+    # the messages queued from now on schedule another flush
+    caches[config['CACHE']].delete(f'{config["KEY"]}:flush')
+    queue = get_email_queue()
+    requeued = queue.requeue_expired()
+    if requeued:
+        logger.warning('%d emails of a batch not acknowledged queued again.',
+                       requeued)
+    connection = get_connection(config['BACKEND'], fail_silently=False)
+    total = 0
+    try:
+        while True:
+            token, payloads = queue.pop(config['BATCH_SIZE'])
+            if not payloads:
+                break
+            failed = send_batch(connection, payloads)
+            if failed:
+                retry_failed(config, failed, attempt=1)
+            # the failed ones are in the arguments of their retry task
+            queue.ack(token)
+            total += len(payloads)
+    finally:
+        connection.close()
+    return total
+
+
+@app.task
+def retry_emails(payloads, attempt):
+    config = get_config()
+    connection = get_connection(config['BACKEND'], fail_silently=False)
+    try:
+        failed = send_batch(connection, payloads)
+    finally:
+        connection.close()
+    if failed:
+        retry_failed(config, failed, attempt)
+
+
+def get_key_version(key, prefix):
+    """
+    Return the version of a key made by the default KEY_FUNCTION
+    (``prefix:version:key``), None for the keys it did not make.
+    """
+    if not key.startswith(f'{prefix}:'):
+        return None
+    version, separator, _ = key[len(prefix) + 1:].partition(':')
+    if not separator or not version.isdigit():
+        return None
+    return int(version)
+
+
+@maintenance_task
+def purge_stale_cache_keys(run):
+    """
+    Delete the keys of the previous versions of the cache (its VERSION is
+    raised to invalidate it all at once, the old keys stay until they
+    expire, forever for the ones without timeout). Only redis, the local
+    memory caches cull themselves.
+    """
+    alias = run.config['CACHE']
+    stale_cache = caches[alias]
+    if not isinstance(stale_cache, RedisCache):
+        return 0
+    client = get_redis_connection(alias)
+    prefix = stale_cache.key_prefix
+    batch_size = run.config['BATCH_SIZE']
+
+    total = 0
+    stale = []
+    for key in client.scan_iter(match=f'{prefix}:*', count=batch_size):
+        version = get_key_version(key.decode(), prefix)
+        if version is None or version == stale_cache.version:
+            continue
+        stale.append(key)
+        if len(stale) == batch_size:
+            total += client.delete(*stale)
+            stale = []
+            if run.expired:
+                return total
+            run.pause()
+    if stale:
+        total += client.delete(*stale)
+    return total
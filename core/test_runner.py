@@ -0,0 +1,15 @@
+from django.test.runner import DiscoverRunner
+
+from core.taskapp import app
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner that runs the Celery tasks in the test process when they
+    are sent, their exceptions are raised by ``delay``.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        app.conf.task_always_eager = True
+        app.conf.task_eager_propagates = True
@@ -0,0 +1,37 @@
+from asgiref.testing import ApplicationCommunicator
+
+from core.handlers import PathDispatchASGIHandler
+
+
+async def asgi_request(method, path, query_string='', headers=None):
+    """
+    Send a request through the ASGI handler of core.asgi (the one of the
+    servers, not the test client) and return its status, headers and the
+    list of the body messages as they were sent.
+
+    The handler runs the sync code of the request in a thread of its own,
+    the data it reads must be committed (TransactionTestCase).
+    """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'server': ('testserver', 80),
+        'path': path,
+        'query_string': query_string.encode(),
+        'headers': [(name.lower().encode(), value.encode())
+                    for name, value in (headers or {}).items()],
+    }
+    communicator = ApplicationCommunicator(PathDispatchASGIHandler(), scope)
+    await communicator.send_input({'type': 'http.request', 'body': b''})
+    start = await communicator.receive_output(timeout=5)
+    chunks = []
+    while True:
+        message = await communicator.receive_output(timeout=5)
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    await communicator.wait(timeout=5)
+    return start['status'], dict(start['headers']), chunks
@@ -0,0 +1,523 @@
+import datetime
+import decimal
+import gzip
+import io
+import json
+import tempfile
+import uuid
+from unittest import mock
+
+import brotli
+import msgpack
+import zstandard
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.user.models import User
+from apps.user.serializers import ListUserSerializer
+from apps.monitoring.metrics import EMAIL_QUEUE_COLLECTOR
+from core import mail as queued_mail
+from core import openapi
+from core.compression import select_encoding
+from core.idempotency import IdempotentRequest
+from core.middleware import CompressionMiddleware
+from core.negotiation import FastPathContentNegotiation
+from core.parsers import FastJSONParser, MessagePackParser
+from core.renderers import FastJSONRenderer, MessagePackRenderer
+from core.storage_backends import ContentAddressedFileSystemStorage
+from core.throttling import SlidingWindowRateThrottle, UserRateThrottle
+
+
+class FastJSONTestCase(TestCase):
+
+    def test_same_output_as_json_renderer(self):
+        User.objects.create(username='fast', email='fast@example.com',
+                            first_name='Fást', last_name='JSON')
+        data = ListUserSerializer(User.objects.all(), many=True).data
+
+        fast = FastJSONRenderer().render(data)
+        stdlib = JSONRenderer().render(data)
+
+        self.assertEqual(json.loads(fast), json.loads(stdlib))
+
+    def test_native_types(self):
+        value = uuid.uuid4()
+        data = {
+            'uuid': value,
+            'datetime': datetime.datetime(2023, 5, 1, 12, 30,
+                                          tzinfo=datetime.timezone.utc),
+            'decimal': decimal.Decimal('1.5'),
+            'separator': '\u2028',
+        }
+
+        rendered = FastJSONRenderer().render(data)
+
+        self.assertEqual(json.loads(rendered), {
+            'uuid': str(value),
+            'datetime': '2023-05-01T12:30:00Z',
+            'decimal': 1.5,
+            'separator': '\u2028',
+        })
+        self.assertIn(b'\\u2028', rendered)
+
+    def test_parser(self):
+        parser = FastJSONParser()
+
+        data = parser.parse(io.BytesIO('{"name": "Fást"}'.encode()))
+        self.assertEqual(data, {'name': 'Fást'})
+
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"name": '))
+
+    def test_negotiation_fast_path(self):
+        negotiation = FastPathContentNegotiation()
+        renderers = [BrowsableAPIRenderer(), FastJSONRenderer(),
+                     MessagePackRenderer()]
+        factory = APIRequestFactory()
+
+        for accept in ('application/json', 'application/msgpack', 'text/html'):
+            request = factory.get('/users/', HTTP_ACCEPT=accept)
+            request.query_params = request.GET
+            self.assertEqual(
+                negotiation.select_renderer(request, renderers)[1], accept)
+
+
+class MessagePackTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='msgpack@example.com', password='F12345678@',
+            username='msgpack', first_name='Mëssage', last_name='Pack')
+        self.client = APIClient()
+
+    def test_same_data_as_json(self):
+        data = ListUserSerializer(User.objects.all(), many=True).data
+
+        packed = MessagePackRenderer().render(data)
+
+        self.assertEqual(msgpack.unpackb(packed),
+                         json.loads(JSONRenderer().render(data)))
+        self.assertLess(len(packed), len(FastJSONRenderer().render(data)))
+
+    def test_list_users(self):
+        self.client.force_authenticate(self.user)
+
+        json_response = self.client.get('/users/')
+        response = self.client.get(
+            '/users/', HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content),
+                         json.loads(json_response.content))
+
+    def test_obtain_token(self):
+        response = self.client.post(
+            '/api/token/',
+            msgpack.packb({'email': 'msgpack@example.com',
+                           'password': 'F12345678@'}),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', msgpack.unpackb(response.content))
+
+    def test_parse_error(self):
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
+
+
+class CompressionMiddlewareTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.content = b'{"username": "compressed"}' * 100
+
+    def get(self, response, accept_encoding):
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(self.factory.get(
+            '/', HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def test_select_encoding(self):
+        encodings = ['zstd', 'br', 'gzip']
+        self.assertEqual(select_encoding('gzip, br, zstd', encodings), 'zstd')
+        self.assertEqual(select_encoding('gzip, br;q=0.5', encodings), 'gzip')
+        self.assertEqual(select_encoding('*', encodings), 'zstd')
+        self.assertEqual(select_encoding('identity', encodings), None)
+        self.assertEqual(select_encoding('zstd;q=0, gzip', encodings), 'gzip')
+
+    def test_compress(self):
+        decompress = {
+            'gzip': gzip.decompress,
+            'br': brotli.decompress,
+            'zstd': zstandard.ZstdDecompressor().decompress,
+        }
+        for encoding, decompress in decompress.items():
+            response = self.get(HttpResponse(
+                self.content, content_type='application/json'), encoding)
+
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            self.assertEqual(decompress(response.content), self.content)
+
+    def test_breach_padding(self):
+        sizes = set()
+        for _ in range(20):
+            response = self.get(HttpResponse(self.content), 'zstd, br, gzip')
+            # html, only gzip has the padding
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), self.content)
+            sizes.add(len(response.content))
+        self.assertGreater(len(sizes), 1)
+
+        response = HttpResponse(self.content, content_type='application/json')
+        response['Cache-Control'] = 'private, max-age=60'
+        self.assertEqual(self.get(response, 'zstd, gzip')['Content-Encoding'],
+                         'gzip')
+        response = HttpResponse(self.content, content_type='application/json')
+        self.assertEqual(self.get(response, 'zstd, gzip')['Content-Encoding'],
+                         'zstd')
+
+    def test_small_response(self):
+        response = self.get(HttpResponse(b'{}'), 'gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_response(self):
+        chunks = [self.content] * 3
+        response = self.get(StreamingHttpResponse(
+            iter(chunks), content_type='application/json'), 'zstd')
+
+        compressed = list(response.streaming_content)
+
+        self.assertEqual(response['Content-Encoding'], 'zstd')
+        # each chunk is sent as soon as it is compressed
+        self.assertEqual(len(compressed), len(chunks) + 1)
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        self.assertEqual(decompressor.decompress(b''.join(compressed)),
+                         b''.join(chunks))
+
+
+class OpenAPISchemaTestCase(TestCase):
+
+    def setUp(self):
+        schema_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(schema_dir.cleanup)
+        settings = override_settings(OPENAPI_SCHEMA_DIR=schema_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        openapi._schemas.clear()
+        self.addCleanup(openapi._schemas.clear)
+
+    def test_generate(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_openapi_schema', '--check', stdout=io.StringIO())
+
+        call_command('generate_openapi_schema', stdout=io.StringIO())
+        call_command('generate_openapi_schema', '--check', stdout=io.StringIO())
+
+        with open(openapi.get_schema_path('.json'), 'rb') as schema_file:
+            schema = json.load(schema_file)
+        self.assertIn('/users/', schema['paths'])
+
+    def test_serve_schema(self):
+        call_command('generate_openapi_schema', stdout=io.StringIO())
+
+        response = self.client.get('/swagger.json/')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertIn('/users/', json.loads(response.content)['paths'])
+
+        not_modified = self.client.get(
+            '/swagger.json/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        url = openapi.get_schema_url('.json')
+        immutable = self.client.get(url)
+        self.assertIn('immutable', immutable['Cache-Control'])
+        self.assertEqual(immutable.content, response.content)
+
+        ui = self.client.get('/swagger/')
+        self.assertContains(ui, url)
+
+
+class LazyUrlsTestCase(TestCase):
+
+    def test_resolve_and_reverse(self):
+        self.assertEqual(reverse('admin:index'), '/admin/')
+        self.assertEqual(reverse('schema-json', kwargs={'format': '.json'}),
+                         '/swagger.json/')
+        self.assertEqual(resolve('/redoc/').url_name, 'schema-redoc')
+        self.assertEqual(resolve('/metrics').url_name, 'metrics')
+
+
+class CountingEmailBackend(EmailBackend):
+    connections = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        CountingEmailBackend.connections += 1
+
+
+class FlakyEmailBackend(EmailBackend):
+    failures = 1
+
+    def send_messages(self, messages):
+        if FlakyEmailBackend.failures:
+            FlakyEmailBackend.failures -= 1
+            raise ConnectionError('mail server unavailable')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='core.mail.QueuedEmailBackend')
+class QueuedEmailBackendTestCase(TestCase):
+
+    def setUp(self):
+        queued_mail._queues.clear()
+        CountingEmailBackend.connections = 0
+        FlakyEmailBackend.failures = 1
+
+    def get_depth(self):
+        metric, = EMAIL_QUEUE_COLLECTOR.collect()
+        return metric.samples[0].value
+
+    @override_settings(EMAIL_QUEUE={
+        'BACKEND': 'core.tests.CountingEmailBackend', 'BATCH_SIZE': 2})
+    def test_batches_over_one_connection(self):
+        from core.tasks import flush_email_queue
+
+        messages = [mail.EmailMessage('Hi', 'Body', to=[f'{i}@example.com'])
+                    for i in range(5)]
+        queued_mail.get_email_queue().push(
+            [queued_mail.serialize(message) for message in messages])
+        self.assertEqual(self.get_depth(), 5)
+
+        flush_email_queue()
+
+        self.assertEqual(self.get_depth(), 0)
+        self.assertEqual(CountingEmailBackend.connections, 1)
+        self.assertEqual([message.to for message in mail.outbox],
+                         [[f'{i}@example.com'] for i in range(5)])
+
+    @override_settings(EMAIL_QUEUE={
+        'BACKEND': 'core.tests.CountingEmailBackend', 'ACK_TIMEOUT': 0})
+    def test_requeue_not_acknowledged(self):
+        from core.tasks import flush_email_queue
+
+        queue = queued_mail.get_email_queue()
+        queue.push([queued_mail.serialize(mail.EmailMessage(
+            'Hi', 'Body', to=[f'{i}@example.com'])) for i in range(3)])
+        # taken by a worker that died before sending them
+        _, payloads = queue.pop(2)
+        self.assertEqual(len(payloads), 2)
+        self.assertEqual(self.get_depth(), 1)
+
+        self.assertEqual(flush_email_queue(), 3)
+
+        self.assertEqual([message.to for message in mail.outbox],
+                         [[f'{i}@example.com'] for i in range(3)])
+        self.assertEqual(queue.requeue_expired(), 0)
+
+    @override_settings(EMAIL_QUEUE={
+        'BACKEND': 'core.tests.FlakyEmailBackend', 'RETRY_DELAY': 0})
+    def test_retry(self):
+        # the tasks are eager, the message is queued, sent and retried here
+        sent = mail.send_mail('Hi', 'Body', 'from@example.com',
+                              ['to@example.com'])
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(FlakyEmailBackend.failures, 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['to@example.com'])
+        self.assertEqual(self.get_depth(), 0)
+
+
+class ContentAddressedStorageTestCase(TestCase):
+
+    def setUp(self):
+        self.storage = ContentAddressedFileSystemStorage(
+            location=tempfile.mkdtemp(), base_url='/media/')
+
+    def test_deduplicate(self):
+        first = self.storage.save('photos/a/photo.JPG', ContentFile(b'photo'))
+        second = self.storage.save('photos/b/other.jpg', ContentFile(b'photo'))
+        other = self.storage.save('photos/a/photo.jpg', ContentFile(b'other'))
+
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}'
+                                r'\.jpg$')
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(self.storage.listdir(first.rsplit('/', 1)[0])[1]),
+                         1)
+        with self.storage.open(first) as stored:
+            self.assertEqual(stored.read(), b'photo')
+        self.assertEqual(self.storage.url(first), f'/media/{first}')
+
+    def test_derived_names(self):
+        blob = self.storage.save('photo.jpg', ContentFile(b'photo'))
+        thumbnail = blob.replace('.jpg', '_small.webp')
+
+        self.assertEqual(self.storage.save(thumbnail, ContentFile(b'small')),
+                         thumbnail)
+        # shared by every file with that content
+        self.storage.delete(blob)
+        self.assertTrue(self.storage.exists(blob))
+
+
+class IdempotencyTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create(email='admin@gmail.com', username='admin'))
+        self.data = {
+            'email': 'new@gmail.com',
+            'password': 'rc{4@qHjR>!b`yAV',
+            'password2': 'rc{4@qHjR>!b`yAV',
+            'username': 'new',
+        }
+
+    def signup(self, data, key='signup-1'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/signup/', data, format='json',
+                                    HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay(self):
+        first = self.signup(self.data)
+        self.assertEqual(first.status_code, 201)
+
+        retry = self.signup(self.data)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(User.objects.filter(username='new').count(), 1)
+        # the welcome email is not sent again
+        self.assertEqual(len(mail.outbox), 1)
+
+        other = self.signup({**self.data, 'username': 'other'})
+        self.assertEqual(other.status_code, 422)
+
+    def test_token(self):
+        User.objects.filter(username='admin').update(
+            password=make_password(self.data['password']))
+        client = APIClient()
+        credentials = {'email': 'admin@gmail.com',
+                       'password': self.data['password']}
+
+        def login(now):
+            with mock.patch('django.core.cache.backends.locmem.time.time',
+                            return_value=now), \
+                    self.captureOnCommitCallbacks(execute=True):
+                return client.post('/api/token/', credentials,
+                                   format='json',
+                                   HTTP_IDEMPOTENCY_KEY='login-1')
+
+        first = login(1000)
+        self.assertEqual(first.status_code, 200)
+        retry = login(1030)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        # the tokens are not replayed after the retries of a timeout
+        self.assertNotIn('Idempotent-Replayed', login(1061))
+
+    @override_settings(IDEMPOTENCY={'WAIT': 0})
+    def test_in_progress(self):
+        # the first request is still running: its marker stays
+        with mock.patch.object(IdempotentRequest, 'complete'):
+            self.signup(self.data)
+        self.assertEqual(self.signup(self.data).status_code, 409)
+
+    def test_kept_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post('/signup/', self.data, format='json',
+                             HTTP_IDEMPOTENCY_KEY='signup-1')
+        # not committed yet, the retry waits for it
+        with override_settings(IDEMPOTENCY={'WAIT': 0}):
+            self.assertEqual(self.signup(self.data).status_code, 409)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.signup(self.data)['Idempotent-Replayed'],
+                         'true')
+
+    def test_released_on_rollback(self):
+        # a rollback marked by DRF (ATOMIC_REQUESTS) on an error response
+        with mock.patch('rest_framework.views.set_rollback',
+                        lambda: transaction.set_rollback(True)):
+            with transaction.atomic():
+                response = self.signup({**self.data, 'password2': 'other'})
+        self.assertEqual(response.status_code, 400)
+        response = self.signup({**self.data, 'password2': 'other'})
+        self.assertNotIn('Idempotent-Replayed', response)
+
+
+class ThrottlingTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='user@gmail.com',
+                                        username='user')
+        self.user.set_password('rc{4@qHjR>!b`yAV')
+        self.user.save()
+
+    @mock.patch.object(SlidingWindowRateThrottle, 'THROTTLE_RATES',
+                       {'user': '10/min'})
+    def test_sliding_window(self):
+        request = Request(APIRequestFactory().get('/users/'))
+        request.user = self.user
+
+        def allow(now):
+            throttle = UserRateThrottle()
+            throttle.timer = lambda: now
+            return throttle.allow_request(request, None)
+
+        self.assertEqual([allow(30) for _ in range(11)],
+                         [True] * 10 + [False])
+        # half of the previous window is still in the last minute
+        self.assertEqual([allow(90) for _ in range(6)],
+                         [True] * 5 + [False])
+        self.assertEqual(request._request.rate_limit['remaining'], 0)
+
+    @mock.patch.object(SlidingWindowRateThrottle, 'THROTTLE_RATES',
+                       {'login': '100/min', 'login_identifier': '2/min'})
+    def test_login_identifier(self, path='/api/token/'):
+        def login(ip):
+            return APIClient().post(path, {
+                'email': 'user@gmail.com', 'password': 'wrong'},
+                format='json', REMOTE_ADDR=ip)
+
+        response = login('10.0.0.1')
+        self.assertEqual(response['RateLimit-Limit'], '2')
+        self.assertEqual(response['RateLimit-Remaining'], '1')
+        login('10.0.0.2')
+        # the same account from a third IP
+        response = login('10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['RateLimit-Remaining'], '0')
+        self.assertIn('Retry-After', response)
+
+    def test_async_login_identifier(self):
+        # the same counters, /api/async/token/ is not a way around them
+        self.test_login_identifier('/api/async/token/')
+
+    @mock.patch.object(SlidingWindowRateThrottle, 'THROTTLE_RATES',
+                       {'anon': '100/min', 'user': '1/min'})
+    def test_async_list(self):
+        token = RefreshToken.for_user(self.user).access_token
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(client.get('/api/async/users/').status_code, 200)
+        response = client.get('/api/async/users/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['RateLimit-Limit'], '1')
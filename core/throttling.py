@@ -0,0 +1,227 @@
+"""
+Rate limiting of the API: DEFAULT_THROTTLE_CLASSES, and the throttles of
+the login and signup views (``throttle_scope`` 'login' and 'signup').
+
+The throttles of DRF keep the time of every request of a key in the cache
+and rewrite the whole list on each request. These keep two counters per
+key, the requests of the current window of ``duration`` seconds and of the
+previous one, and estimate the requests of the last ``duration`` seconds
+as::
+
+    previous * (part of the previous window still in them) + current
+
+(a sliding window counter): fixed memory per key, and one atomic increment
+(INCR in Redis, under the lock of locmem) where a read-modify-write of a
+list loses the concurrent requests. The requests are assumed evenly spread
+over the previous window.
+
+The state of the throttle closest to its limit is set on the request and
+sent in the ``RateLimit-*`` headers by
+core.middleware.RateLimitHeadersMiddleware.
+
+The plain async views (apps.*.async_views) do not go through DRF, they run
+the same throttles with ``athrottle``.
+"""
+
+import hashlib
+import math
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from rest_framework import status, throttling
+from rest_framework.exceptions import Throttled
+
+from apps.commons import json_response
+
+DEFAULTS = {
+    'CACHE': 'default',
+    # fields of the body that identify the account of a login or a signup
+    'IDENTIFIER_FIELDS': ('email', 'username', 'phone'),
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'THROTTLING', {})}
+
+
+def record_rate_limit(request, limit, remaining, reset):
+    """
+    Keep on ``request`` (a DRF Request) the rate limit with the fewest
+    requests remaining, for the response headers.
+    """
+    request = request._request
+    current = getattr(request, 'rate_limit', None)
+    if current is None or remaining < current['remaining']:
+        request.rate_limit = {
+            'limit': limit, 'remaining': remaining, 'reset': reset}
+
+
+class SlidingWindowRateThrottle(throttling.SimpleRateThrottle):
+    """
+    SimpleRateThrottle with a sliding window counter, see the module
+    documentation.
+    """
+
+    @property
+    def cache(self):
+        return caches[get_config()['CACHE']]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, elapsed = divmod(self.now, self.duration)
+        self.elapsed = elapsed / self.duration
+        cache = self.cache
+        current_key = f'{self.key}:{int(window)}'
+        try:
+            # the counter lives through the next window, as its previous
+            cache.add(current_key, 0, self.duration * 2)
+            self.current = cache.incr(current_key)
+        except ValueError:
+            # evicted between the add and the incr
+            self.current = None
+        if self.current is None:
+            # the cache is down (IGNORE_EXCEPTIONS), do not refuse everything
+            return True
+        self.previous = cache.get(f'{self.key}:{int(window) - 1}', 0)
+
+        estimate = self.previous * (1 - self.elapsed) + self.current
+        allowed = estimate <= self.num_requests
+        if allowed:
+            remaining = int(self.num_requests - estimate)
+            reset = (1 - self.elapsed) * self.duration
+        else:
+            # the refused requests are not counted
+            self.current -= 1
+            try:
+                cache.decr(current_key)
+            except ValueError:
+                pass
+            remaining, reset = 0, self.wait()
+        record_rate_limit(request, self.num_requests, remaining,
+                          math.ceil(reset))
+        return allowed
+
+    def wait(self):
+        """
+        Seconds until the estimate leaves room for one more request.
+        """
+        count = self.current + 1
+        if count <= self.num_requests and self.previous:
+            # when enough of the previous window has slid out
+            target = 1 - (self.num_requests - count) / self.previous
+            return max(target - self.elapsed, 0) * self.duration
+        # in the next window, when enough of this one has slid out
+        wait = 1 - self.elapsed
+        if self.current:
+            wait += max(1 - (self.num_requests - 1) / self.current, 0)
+        return wait * self.duration
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle,
+                       SlidingWindowRateThrottle):
+    """
+    Requests of the anonymous users, per IP (scope 'anon').
+    """
+
+
+class UserRateThrottle(throttling.UserRateThrottle,
+                       SlidingWindowRateThrottle):
+    """
+    Requests per user, per IP for the anonymous ones (scope 'user').
+    """
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle,
+                         SlidingWindowRateThrottle):
+    """
+    Requests to the views of a ``throttle_scope`` per user, per IP for the
+    anonymous ones.
+    """
+
+
+class IdentifierRateThrottle(SlidingWindowRateThrottle):
+    """
+    Requests to the views of a ``throttle_scope`` per account they name in
+    their body (scope ``<throttle_scope>_identifier``): the attempts on one
+    account from many IPs, or the signups of one email.
+    """
+
+    def __init__(self):
+        # the scope comes from the view
+        pass
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        self.scope = f'{scope}_identifier'
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        data = request.data
+        for field in get_config()['IDENTIFIER_FIELDS']:
+            value = data.get(field) if hasattr(data, 'get') else None
+            if isinstance(value, str) and value.strip():
+                # the emails and phones are not kept in the cache keys
+                ident = hashlib.sha256(
+                    value.strip().lower().encode()).hexdigest()
+                return self.cache_format % {
+                    'scope': self.scope, 'ident': ident}
+        return None
+
+
+LOGIN_THROTTLES = (ScopedRateThrottle, IdentifierRateThrottle)
+
+
+class ThrottledRequest:
+    """
+    What the throttles read of a DRF Request, for an HttpRequest of a plain
+    view and its parsed body ``data``.
+    """
+
+    def __init__(self, request, data=None):
+        self._request = request
+        self.META = request.META
+        self.user = getattr(request, 'user', None) or AnonymousUser()
+        self.data = data if data is not None else {}
+
+
+def check_throttles(request, throttle_classes, scope=None, data=None):
+    """
+    APIView.check_throttles for the plain views: return None, or the
+    seconds to wait when a throttle refuses the request.
+    """
+    throttled_request = ThrottledRequest(request, data)
+    view = SimpleNamespace(throttle_scope=scope)
+    durations = []
+    for throttle_class in throttle_classes:
+        throttle = throttle_class()
+        if not throttle.allow_request(throttled_request, view):
+            durations.append(throttle.wait() or 0)
+    return max(durations) if durations else None
+
+
+async def athrottle(request, throttle_classes, scope=None, data=None):
+    """
+    Run the throttles of an async view (in a thread, the cache calls are
+    sync), return None or the 429 response DRF would have sent.
+    """
+    wait = await sync_to_async(check_throttles)(
+        request, throttle_classes, scope, data)
+    if wait is None:
+        return None
+    response = json_response({'detail': Throttled(wait).detail},
+                             status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
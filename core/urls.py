@@ -1,45 +1,31 @@
-from django.contrib import admin
-from django.urls import path, include
+import importlib.util
 
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from django.urls import URLResolver
+from django.urls.resolvers import RegexPattern, RoutePattern
 
 from django.conf import settings
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Snippets API",
-        default_version='v1',
-        description="Test description",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@snippets.local"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+
+def lazy_include(pattern, urlconf_name, namespace=None):
+    """
+    Like ``include()`` but the urlconf module is imported the first time a
+    url under ``pattern`` is resolved (or any url is reversed), not when this
+    urlconf is loaded.
+    """
+    return URLResolver(pattern, urlconf_name, app_name=namespace,
+                       namespace=namespace)
+
 
 urlpatterns = [
-    # swagger documentation
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0),
-         name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger',
-         cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc',
-                                       cache_timeout=0), name='schema-redoc'),
-
-    path('admin/', admin.site.urls),
+    # swagger documentation (swagger.json/, swagger/, redoc/...)
+    lazy_include(RegexPattern(r'^(?=swagger|redoc/)'), 'core.docs_urls'),
+
+    lazy_include(RoutePattern('admin/'), 'core.admin_urls', namespace='admin'),
     # path('', include('apps.user.urls')),
 ]
 
 # load urls from apps
 for app_name in settings.PROJECT_APPS:
-    # Intentamos cargar las URLs de la app si esta tiene el módulo urls.py
-    try:
-        app_urls = f"{app_name}.urls"
-        print(app_urls)
-        urlpatterns.append(path('', include(app_urls)))
-
-    except ImportError:
-        pass
+    # only the apps with a urls.py module
+    if importlib.util.find_spec(f'{app_name}.urls') is not None:
+        urlpatterns.append(lazy_include(RoutePattern(''), f'{app_name}.urls'))
@@ -0,0 +1,88 @@
+"""
+Warm-up of the application before gunicorn forks its workers.
+
+With ``preload_app`` the master loads the application, ``warm_up`` then
+fills the lazy parts (url resolvers, model metadata, serializer fields,
+DRF settings, translations...) so every worker shares those pages with the
+master instead of building its own copy on its first requests.
+"""
+
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.urls import Resolver404, get_resolver, resolve
+from django.utils import translation
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_urls(paths):
+    """
+    Resolve ``paths`` (it imports their urlconfs and views) and return the
+    views found.
+    """
+    views = []
+    for path in paths:
+        try:
+            match = resolve(path)
+        except Resolver404:
+            logger.warning('Warm-up path %s does not exist.', path)
+            continue
+        views.append(match.func)
+    # the reverse dicts of the urls already imported
+    get_resolver().reverse_dict
+    return views
+
+
+def warm_up_serializers(views):
+    """
+    Build the fields of the serializers of the views, it also fills the
+    metadata caches of their models.
+    """
+    for view in views:
+        view_class = getattr(view, 'cls', None) or getattr(
+            view, 'view_class', None)
+        serializer_class = getattr(view_class, 'serializer_class', None)
+        if serializer_class is None:
+            continue
+        try:
+            serializer_class().fields
+        except Exception:
+            logger.exception('Could not warm up %s', serializer_class)
+
+
+def warm_up():
+    """
+    Load everything the first requests of a worker would load, and close
+    the connections opened meanwhile (they cannot be shared by the
+    workers).
+    """
+    start = time.perf_counter()
+
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._meta._property_names
+
+    views = warm_up_urls(settings.WARM_UP_PATHS)
+    warm_up_serializers(views)
+
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES',
+                 'DEFAULT_AUTHENTICATION_CLASSES',
+                 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_PAGINATION_CLASS',
+                 'DEFAULT_CONTENT_NEGOTIATION_CLASS'):
+        getattr(api_settings, name)
+
+    # imports the cache backends, their connections are opened lazily
+    for alias in settings.CACHES:
+        caches[alias]
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.deactivate()
+
+    connections.close_all()
+    logger.info('Warm-up done in %.0f ms, %d views.',
+                (time.perf_counter() - start) * 1000, len(views))